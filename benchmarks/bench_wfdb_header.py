@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+microbenchmark of parsing WFDB header files (CPSC2018, CINC2020),
+comparing the shared parser `parse_wfdb_header` (with `parse_wfdb_lead_lines`, `parse_dx`)
+with the former implementation based on `pd.read_csv`
+
+usage:
+    python benchmarks/bench_wfdb_header.py [header_files ...] [-n NUMBER]
+if no header file is given, a synthetic 12-lead CINC2020 header is used
+"""
+import os, io, sys
+import argparse
+import timeit
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database_reader.base import parse_wfdb_header, parse_wfdb_lead_lines, parse_dx
+from database_reader.utils.utils_misc.cinc2020_aux_data import dx_mapping_all, dx_mapping_scored
+
+
+_SYNTHETIC_HEADER = "\n".join(
+    ["A0001 12 500 7500 05-Feb-2020 11:39:16"] + [
+        f"A0001.mat 16+24 1000/mV 16 0 {np.random.randint(-500, 500)} {np.random.randint(-30000, 30000)} 0 {lead}" \
+            for lead in ["I", "II", "III", "aVR", "aVL", "aVF", "V1", "V2", "V3", "V4", "V5", "V6",]
+    ] + [
+        "#Age: 74", "#Sex: Male", "#Dx: 59118001,164884008", "#Rx: Unknown", "#Hx: Unknown", "#Sx: Unknown",
+    ]
+)
+
+
+def former_parser(header_data:List[str]) -> dict:
+    """
+    the former implementation (of `CINC2020._load_ann_naive`), as baseline
+    """
+    from datetime import datetime
+    ann_dict = {}
+    ann_dict["rec_name"], ann_dict["nb_leads"], ann_dict["fs"], ann_dict["nb_samples"], ann_dict["datetime"], daytime = header_data[0].split(" ")
+    ann_dict["nb_leads"] = int(ann_dict["nb_leads"])
+    ann_dict["fs"] = int(ann_dict["fs"])
+    ann_dict["nb_samples"] = int(ann_dict["nb_samples"])
+    ann_dict["datetime"] = datetime.strptime(" ".join([ann_dict["datetime"], daytime]), "%d-%b-%Y %H:%M:%S")
+    for key, item in [("#Sex", "sex"), ("#Rx", "medical_prescription"), ("#Hx", "history"), ("#Sx", "symptom_or_surgery")]:
+        try:
+            ann_dict[item] = [l for l in header_data if l.startswith(key)][0].split(": ")[-1]
+        except:
+            ann_dict[item] = "Unknown"
+    try:
+        ann_dict["age"] = int([l for l in header_data if l.startswith("#Age")][0].split(": ")[-1])
+    except:
+        ann_dict["age"] = np.nan
+    l_Dx = [l for l in header_data if l.startswith("#Dx")][0].split(": ")[-1].split(",")
+    diag_dict, diag_scored_dict = {}, {}
+    try:
+        diag_dict["diagnosis_code"] = [item for item in l_Dx]
+        diag_dict["diagnosis_abbr"] = \
+            [ dx_mapping_all[dx_mapping_all["SNOMED CT Code"]==dc]["Abbreviation"].values[0] \
+                for dc in diag_dict["diagnosis_code"] ]
+        diag_dict["diagnosis_fullname"] = \
+            [ dx_mapping_all[dx_mapping_all["SNOMED CT Code"]==dc]["Dx"].values[0] \
+                for dc in diag_dict["diagnosis_code"] ]
+        scored_indices = np.isin(diag_dict["diagnosis_code"], dx_mapping_scored["SNOMED CT Code"].values)
+        for k in ["diagnosis_code", "diagnosis_abbr", "diagnosis_fullname"]:
+            diag_scored_dict[k] = [item for idx, item in enumerate(diag_dict[k]) if scored_indices[idx]]
+    except:
+        diag_dict["diagnosis_abbr"] = diag_dict["diagnosis_code"]
+        selection = dx_mapping_all["Abbreviation"].isin(diag_dict["diagnosis_abbr"])
+        diag_dict["diagnosis_fullname"] = dx_mapping_all[selection]["Dx"].tolist()
+    ann_dict["diagnosis"], ann_dict["diagnosis_scored"] = diag_dict, diag_scored_dict
+    df_leads = pd.read_csv(io.StringIO("\n".join(header_data[1:13])), sep=r"\s+", header=None)
+    df_leads.columns = ["filename", "fmt+byte_offset", "adc_gain+units", "adc_res", "adc_zero", "init_value", "checksum", "block_size", "lead_name",]
+    df_leads["fmt"] = df_leads["fmt+byte_offset"].apply(lambda s: s.split("+")[0])
+    df_leads["byte_offset"] = df_leads["fmt+byte_offset"].apply(lambda s: s.split("+")[1])
+    df_leads["adc_gain"] = df_leads["adc_gain+units"].apply(lambda s: s.split("/")[0])
+    df_leads["adc_units"] = df_leads["adc_gain+units"].apply(lambda s: s.split("/")[1])
+    for k in ["byte_offset", "adc_gain", "adc_res", "adc_zero", "init_value", "checksum",]:
+        df_leads[k] = df_leads[k].apply(lambda s: int(s))
+    df_leads["baseline"] = df_leads["adc_zero"]
+    ann_dict["df_leads"] = df_leads
+    return ann_dict
+
+
+def shared_parser(header_data:List[str], with_df_leads:bool=True) -> dict:
+    """
+    the shared parser, as used by `CINC2020._load_ann_naive` and `CPSC2018.load_ann`
+    """
+    header = parse_wfdb_header(header_data, parse_leads=False)
+    header["diagnosis"], header["diagnosis_scored"] = parse_dx(header["Dx"], dx_mapping_all, dx_mapping_scored)
+    if with_df_leads:
+        header["df_leads"] = pd.DataFrame(parse_wfdb_lead_lines(header_data[1:1+header["nb_leads"]]))
+    return header
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="microbenchmark of parsing WFDB header files")
+    parser.add_argument("header_files", nargs="*", help="header files to parse")
+    parser.add_argument("-n", "--number", type=int, default=1000, help="number of repetitions")
+    args = parser.parse_args()
+
+    if len(args.header_files) > 0:
+        headers = []
+        for fp in args.header_files:
+            with open(fp, "r") as f:
+                headers.append(f.read().splitlines())
+    else:
+        headers = [_SYNTHETIC_HEADER.splitlines()]
+
+    for name, func in [
+        ("former (read_csv)", former_parser),
+        ("shared parser", shared_parser),
+        ("shared parser, labels only", lambda h: shared_parser(h, with_df_leads=False)),
+    ]:
+        elapsed = timeit.timeit(lambda: [func(h) for h in headers], number=args.number)
+        print(f"{name:<30}{1e6 * elapsed / args.number / len(headers):10.1f} μs per header")
@@ -17,14 +17,19 @@ import pprint
 import logging
 import time
 import json
-from collections import namedtuple
-from typing import Union, Optional, Any, List, NoReturn
+import hashlib
+import threading
+from datetime import datetime
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Union, Optional, Any, List, Tuple, Dict, Callable, Sequence, NoReturn
 from numbers import Real
 
 import wfdb
 import numpy as np
 np.set_printoptions(precision=5, suppress=True)
 import pandas as pd
+import xmltodict as xtd
 from pyedflib import EdfReader
 
 from .utils.common import *
@@ -37,6 +42,16 @@ __all__ = [
     "AudioDataBase",
     "OtherDataBase",
     "ECGWaveForm",
+    "parse_wfdb_header",
+    "parse_wfdb_lead_lines",
+    "parse_dx",
+    "length_bucketed_batches",
+    "collate_padded",
+    "RhythmIndex",
+    "IntervalArray",
+    "compute_windowed_hrv",
+    "minmax_decimate",
+    "DecimatedSignalView",
 ]
 
 
@@ -69,6 +84,7 @@ class _DataBase(object):
         self.verbose = verbose
         self.logger = None
         self._all_records = None
+        self._header_index = None  # ref. `self.load_header_index`
         self._set_logger(prefix=type(self).__name__)
 
     def _ls_rec(self) -> NoReturn:
@@ -158,6 +174,129 @@ class _DataBase(object):
         """
         raise NotImplementedError
 
+    def load_header_index(self, use_cache:bool=True, nb_workers:int=8) -> pd.DataFrame:
+        """
+        index of the records, indexed by the record names, with (at least) columns "fs", "nb_samples",
+        to be implemented (via `self._load_header_index`) by databases with wfdb header files
+        """
+        raise NotImplementedError
+
+    def _load_header_index(self, recs:Sequence[str], header_filepath:Callable[[str], str], extra_columns:Optional[Dict[str, list]]=None, use_cache:bool=True, nb_workers:int=8) -> pd.DataFrame:
+        """ finished, checked,
+
+        load the index of the records from the record lines of their header files (read in a thread pool),
+        without opening the signal files,
+        which is kept in `self._header_index` and cached to a csv file in `self.working_dir`
+
+        Parameters:
+        -----------
+        recs: sequence of str,
+            names of all the records
+        header_filepath: callable,
+            maps a record name to the path of its header file
+        extra_columns: dict, optional,
+            other columns of the index, each a list aligned with `recs`,
+            placed before the columns "fs", "nb_samples"
+        use_cache: bool, default True,
+            whether or not to use (read and write) the cache file
+        nb_workers: int, default 8,
+            number of threads to read the header files
+
+        Returns:
+        --------
+        df_index: DataFrame,
+            indexed by the record names, with columns `extra_columns`, "fs", "nb_samples"
+        """
+        if self._header_index is not None:
+            return self._header_index
+        recs = list(recs)
+        cache_fp = os.path.join(self.working_dir, f"{self.db_name}_header_index.csv")
+        if use_cache and os.path.isfile(cache_fp):
+            df_index = pd.read_csv(cache_fp, index_col="rec")
+            if set(df_index.index) == set(recs):
+                self._header_index = df_index
+                return df_index
+
+        def _read_record_line(rec:str) -> List[str]:
+            with open(header_filepath(rec), "r") as f:
+                return f.readline().split()
+
+        with ThreadPoolExecutor(max_workers=nb_workers) as executor:
+            record_lines = list(executor.map(_read_record_line, recs))
+        df_index = pd.DataFrame({
+            "rec": recs,
+            **(extra_columns or {}),
+            "fs": [int(l[2]) for l in record_lines],
+            "nb_samples": [int(l[3]) for l in record_lines],
+        }).set_index("rec")
+        if use_cache:
+            df_index.to_csv(cache_fp)
+        self._header_index = df_index
+        return df_index
+
+    def get_batches(self, batch_size:int, recs:Optional[Sequence[str]]=None, fs:Optional[Real]=None, shuffle:bool=True, seed:Optional[int]=None) -> List[List[str]]:
+        """ finished, checked,
+
+        split records into batches of records of similar lengths (ref. `length_bucketed_batches`),
+        using the header index only (ref. `self.load_header_index`)
+
+        Parameters:
+        -----------
+        batch_size: int,
+            (maximum) number of records in each batch
+        recs: sequence of str, optional,
+            the records to split, defaults to all records
+        fs: real number, optional,
+            if not None, lengths of the records are those after resampling to this frequency,
+            which should be consistent with `fs` of `self.load_batch`
+        shuffle: bool, default True,
+            whether or not to shuffle records of equal lengths, and the order of the batches
+        seed: int, optional,
+            seed of the random number generator
+
+        Returns:
+        --------
+        batches: list of list of str,
+            names of the records of each batch
+        """
+        df_index = self.load_header_index()
+        if recs is not None:
+            df_index = df_index.loc[list(recs)]
+        lengths = df_index["nb_samples"].values
+        if fs is not None:
+            lengths = np.ceil(lengths * fs / df_index["fs"].values).astype(int)
+        batches = length_bucketed_batches(lengths, batch_size=batch_size, shuffle=shuffle, seed=seed)
+        batches = [df_index.index[b].tolist() for b in batches]
+        return batches
+
+    def _load_batch(self, recs:Sequence[str], nb_workers:int=8, **load_kw:Any) -> Tuple[np.ndarray, np.ndarray]:
+        """ finished, checked,
+
+        load the data (via `self.load_data`, which should be thread safe) of a batch of records using a thread pool,
+        padded (with zeros at the end) to the same length
+
+        Parameters:
+        -----------
+        recs: sequence of str,
+            names of the records
+        nb_workers: int, default 8,
+            number of threads to load the data
+        load_kw: dict,
+            key word arguments passed to `self.load_data`,
+            which should load the data in the "channel_first" format
+
+        Returns:
+        --------
+        data: ndarray,
+            the padded data, of shape (batch_size, nb_leads, max_length)
+        lengths: ndarray,
+            lengths of the records (before padding)
+        """
+        with ThreadPoolExecutor(max_workers=nb_workers) as executor:
+            arrays = list(executor.map(lambda rec: self.load_data(rec, **load_kw), recs))
+        data, lengths = collate_padded(arrays)
+        return data, lengths
+
 
 class PhysioNetDataBase(_DataBase):
     """
@@ -198,6 +337,10 @@ class PhysioNetDataBase(_DataBase):
         self.wfdb_ann = None
         self.device_id = None  # maybe data are imported into impala db, to facilitate analyzing
 
+        self._wfdb_headers = {}  # ref. `self.get_wfdb_header`
+        self._beat_ann_tables = {}  # ref. `self.get_beat_ann_table`
+        self.beat_ann_cache_dir = kwargs.get("beat_ann_cache_dir", os.path.join(self.working_dir, "beat_ann_cache"))
+
         if self.verbose <= 2:
             self.df_all_db_info = pd.DataFrame()
             return
@@ -467,6 +610,170 @@ class PhysioNetDataBase(_DataBase):
         raise NotImplementedError
 
 
+    def get_wfdb_header(self, rec:str, rec_path:Optional[str]=None) -> wfdb.Record:
+        """ finished, checked,
+
+        read (and cache) the header of the record `rec` via `wfdb.rdheader`,
+        without touching the signal files
+
+        Parameters:
+        -----------
+        rec: str,
+            record name
+        rec_path: str, optional,
+            path of the record (without file extension),
+            defaults to `rec` in `self.db_dir`
+
+        Returns:
+        --------
+        header: wfdb.Record,
+            the header, with no signal
+        """
+        rec_path = rec_path or os.path.join(self.db_dir, rec)
+        if rec_path not in self._wfdb_headers:
+            self._wfdb_headers[rec_path] = wfdb.rdheader(rec_path)
+        return self._wfdb_headers[rec_path]
+
+
+    def get_siglen(self, rec:str, rec_path:Optional[str]=None) -> int:
+        """ finished, checked,
+
+        get the length (number of samples) of the signals of the record `rec`,
+        from its (cached) header
+
+        Parameters:
+        -----------
+        rec: str,
+            record name
+        rec_path: str, optional,
+            path of the record (without file extension),
+            defaults to `rec` in `self.db_dir`
+
+        Returns:
+        --------
+        siglen: int,
+            length of the signals
+        """
+        siglen = self.get_wfdb_header(rec, rec_path).sig_len
+        return siglen
+
+
+    def get_beat_ann_table(self, rec:str, extension:str, sampfrom:Optional[int]=None, sampto:Optional[int]=None, rec_path:Optional[str]=None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """ finished, checked,
+
+        get the annotations of the record `rec` in the annotation file of `extension`,
+        in the columnar form of (sample, symbol code),
+        parsed (via `wfdb.rdann`) only once, and cached in memory and in `self.beat_ann_cache_dir`
+        (under `self.db_name`, and keyed by the record path, since `self.working_dir` may be shared by several databases),
+        lookups of windows being slices found by binary search
+
+        Parameters:
+        -----------
+        rec: str,
+            record name
+        extension: str,
+            extension of the annotation file
+        sampfrom: int, optional,
+            start index of the annotations to be loaded
+        sampto: int, optional,
+            end index (inclusive, as in `wfdb.rdann`) of the annotations to be loaded
+        rec_path: str, optional,
+            path of the record (without file extension),
+            defaults to `rec` in `self.db_dir`
+
+        Returns:
+        --------
+        samples: ndarray,
+            locations (indices) of the annotations in the window, sorted, NOT shifted by `sampfrom`
+        codes: ndarray,
+            symbol codes (of dtype uint8, or uint16 if there are more than 256 distinct symbols) of the annotations in the window,
+            indices into `symbols`
+        symbols: ndarray,
+            the (sorted) distinct symbols in the annotation file
+
+        NOTE: the returned `samples` and `codes` are read-only views of the cache
+        """
+        rec_path = rec_path or os.path.join(self.db_dir, rec)
+        key = (rec_path, extension)
+        if key not in self._beat_ann_tables:
+            ann_fp = f"{rec_path}.{extension}"
+            rec_path_digest = hashlib.md5(os.path.abspath(rec_path).encode("utf-8")).hexdigest()[:12]
+            cache_fp = os.path.join(
+                self.beat_ann_cache_dir, self.db_name,
+                f"{rec.replace(os.sep, '_')}_{rec_path_digest}.{extension}.npz",
+            )
+            if os.path.isfile(cache_fp) and os.path.getmtime(cache_fp) >= os.path.getmtime(ann_fp):
+                with np.load(cache_fp) as npz:
+                    table = (npz["samples"], npz["codes"], npz["symbols"])
+            else:
+                wfdb_ann = wfdb.rdann(rec_path, extension=extension)
+                order = np.argsort(wfdb_ann.sample, kind="stable")
+                symbols, codes = np.unique(np.array(wfdb_ann.symbol, dtype=str)[order], return_inverse=True)
+                code_dtype = np.uint8 if len(symbols) <= np.iinfo(np.uint8).max + 1 else np.uint16
+                table = (wfdb_ann.sample[order].astype(int), codes.ravel().astype(code_dtype), symbols)
+                os.makedirs(os.path.dirname(cache_fp), exist_ok=True)
+                np.savez(cache_fp, samples=table[0], codes=table[1], symbols=table[2])
+            for arr in table:
+                arr.flags.writeable = False
+            self._beat_ann_tables[key] = table
+        samples, codes, symbols = self._beat_ann_tables[key]
+        lo = np.searchsorted(samples, sampfrom or 0, side="left")
+        hi = np.searchsorted(samples, sampto, side="right") if sampto is not None else len(samples)
+        return samples[lo:hi], codes[lo:hi], symbols
+
+
+    def get_beat_ann_symbol_codes(self, symbols:np.ndarray, beat_types:Sequence[str]) -> np.ndarray:
+        """ finished, checked,
+
+        Parameters:
+        -----------
+        symbols: ndarray,
+            the (sorted) distinct symbols, as returned by `self.get_beat_ann_table`
+        beat_types: sequence of str,
+            the beat types (symbols)
+
+        Returns:
+        --------
+        codes: ndarray,
+            codes of `beat_types`, -1 for those not in `symbols`
+        """
+        beat_types = np.asarray(beat_types, dtype=str)
+        if len(symbols) == 0:
+            return np.full(len(beat_types), -1, dtype=int)
+        idx = np.minimum(np.searchsorted(symbols, beat_types), len(symbols)-1)
+        return np.where(symbols[idx] == beat_types, idx, -1)
+
+
+    def get_signal_shape(self, rec:str, data_format:str="channel_first", rec_path:Optional[str]=None) -> Tuple[int, int]:
+        """ finished, checked,
+
+        get the shape of the (multi-channel) signal of the record `rec`,
+        from its (cached) header
+
+        Parameters:
+        -----------
+        rec: str,
+            record name
+        data_format: str, default "channel_first",
+            format of the signal,
+            "channel_last" (alias "lead_last"), or
+            "channel_first" (alias "lead_first")
+        rec_path: str, optional,
+            path of the record (without file extension),
+            defaults to `rec` in `self.db_dir`
+
+        Returns:
+        --------
+        shape: tuple of int,
+            (nb_channels, siglen), or (siglen, nb_channels) for the "channel_last" format
+        """
+        header = self.get_wfdb_header(rec, rec_path)
+        shape = (header.n_sig, header.sig_len)
+        if data_format.lower() in ["channel_last", "lead_last"]:
+            shape = shape[::-1]
+        return shape
+
+
     def database_info(self, detailed:bool=False) -> NoReturn:
         """
         print the information about the database
@@ -604,6 +911,76 @@ class PhysioNetDataBase(_DataBase):
                         print(f"{k} stands for {a['('+k]}")
 
 
+    def _plot_rhythm_overview(self, rec:str, data:Optional[np.ndarray], ann:Optional[Dict[str, list]], leads:List[Union[str,int]], sampfrom:int, sampto:int, class_map:Dict[str, Any], excluded_classes:Sequence[str]=("N",), nb_bins:int=2000) -> "DecimatedSignalView":
+        """ finished, checked,
+
+        plot a long range of the signals in one figure,
+        with the signals min/max decimated (about one bin per pixel) and read lazily for the visible range,
+        along with the rhythm annotations, but without the (too dense) beat annotations
+
+        Parameters:
+        -----------
+        rec: str,
+            name of the record
+        data: ndarray, optional,
+            signal to plot, of the format "channel_first",
+            if given, data of `rec` will not be used
+        ann: dict, optional,
+            rhythm annotations (intervals relative to `sampfrom`) for `data`
+        leads: list,
+            the leads to plot, or the names of the channels of `data` if given
+        sampfrom: int,
+            start index of the range to plot
+        sampto: int,
+            end index of the range to plot
+        class_map: dict,
+            the rhythm classes (as keys), used when neither `data` nor `ann` is given
+        excluded_classes: sequence of str, default ("N",),
+            rhythm classes not to plot
+        nb_bins: int, default 2000,
+            number of bins for the visible range
+
+        Returns:
+        --------
+        view: DecimatedSignalView,
+            the view of the signals, updated on zooming and panning
+        """
+        import matplotlib.pyplot as plt
+        if data is None:
+            loader = lambda sf, st: self.load_data(
+                rec, leads=leads, sampfrom=sf, sampto=st, data_format="channel_first", units="μV",
+            )
+            _ann = self.load_ann(rec, sampfrom=sampfrom, sampto=sampto, fmt="interval", keep_original=False)
+        else:
+            units = self._auto_infer_units(data)
+            print(f"input data is auto detected to have units in {units}")
+            _data = 1000 * data if units.lower() == "mv" else data
+            loader = lambda sf, st: _data[..., sf-sampfrom: st-sampfrom]
+            _ann = ann or {k: [] for k in class_map.keys()}
+
+        fig, axes = plt.subplots(len(leads), 1, sharex=True, figsize=(20, 3*len(leads)))
+        axes = np.atleast_1d(axes)
+        view = DecimatedSignalView(axes, loader, self.fs, sampfrom, sampto, nb_bins=nb_bins)
+        for idx, ax in enumerate(axes):
+            for k, l_itv in _ann.items():
+                if k in excluded_classes or len(l_itv) == 0:
+                    continue
+                # one collection for all the episodes of the rhythm
+                ax.broken_barh(
+                    [(itv[0]/self.fs, (itv[1]-itv[0])/self.fs) for itv in l_itv], (0, 1),
+                    transform=ax.get_xaxis_transform(),
+                    color=self.palette[k], alpha=0.2, label=k,
+                )
+            ax.axhline(y=0, linestyle="-", linewidth="1.0", color="red")
+            ax.set_title(f"lead - {leads[idx]}", loc="left")
+            ax.legend(loc="upper left")
+            ax.set_ylabel("Voltage [μV]")
+        axes[-1].set_xlabel("Time [s]")
+        plt.subplots_adjust(hspace=0.2)
+        plt.show()
+        return view
+
+
 class NSRRDataBase(_DataBase):
     """
     https://sleepdata.org/
@@ -649,6 +1026,210 @@ class NSRRDataBase(_DataBase):
         )
         self.kwargs = kwargs
 
+        # cohort-wide csv annotation files (hrv, eeg, etc.) converted to columnar caches,
+        # ref. `self._load_partitioned_csv`
+        self.csv_cache_dir = kwargs.get("csv_cache_dir", os.path.join(self.working_dir, "csv_cache"))
+        self._csv_cache_index = {}
+
+        # paths of the psg data and the xml annotation files, to be set in `self.form_paths` of subclasses,
+        # files are located via `self.match_full_rec_path`
+        self.psg_data_path = None
+        self.event_ann_path = None
+        self.event_profusion_ann_path = None
+        self.rec_ext = {
+            "psg": ".edf",
+            "event": "-nsrr.xml",
+            "event_profusion": "-profusion.xml",
+        }
+        # standard channel names of the psg data, to be set by subclasses,
+        # if empty, channel names are checked against the edf headers when loading data
+        self.all_signals = []
+        # aliases (case insensitive) of channels, e.g. {"ECG": "EKG"}, to be set by subclasses
+        self.channel_name_map = {}
+
+        # edf headers are cached once read, parsed xml annotation files are cached for the latest `self.xml_cache_size` files
+        self._edf_headers = {}
+        self.xml_cache_size = kwargs.get("xml_cache_size", 16)
+        self._xml_docs = OrderedDict()
+        # the caches might be accessed from several threads simultaneously (e.g. the workers of `epoch_generator`)
+        self._cache_lock = threading.Lock()
+
+        # sleep stages, common to the NSRR databases
+        self.sleep_epoch_len_sec = 30
+        self.sleep_stage_keys = ["start_sec", "sleep_stage"]
+        self.ann_sleep_stages = [0,1,2,3,4,5,9]
+        """
+        0	--- Wake
+        1	--- sleep stage 1
+        2	--- sleep stage 2
+        3	--- sleep stage 3/4
+        4	--- sleep stage 3/4
+        5	--- REM stage
+        9	--- Movement/Wake or Unscored?
+        """
+        self.sleep_stage_protocol = kwargs.get("sleep_stage_protocol", "aasm")
+        self.all_sleep_stage_names = ["W", "R", "N1", "N2", "N3", "N4"]
+        self.sleep_stage_name_value_mapping = {
+            "W":0, "R":1, "N1":2, "N2":3, "N3":4, "N4":5
+        }
+        self.sleep_stage_names = []
+        self.update_sleep_stage_names()
+        self._to_simplified_states = {9:0, 0:0, 5:1, 1:2, 2:2, 3:3, 4:3}
+        """ 9 to nan?
+        0   --- awake
+        1   --- REM
+        2   --- N1 (NREM1/2), shallow sleep
+        3   --- N2 (NREM3/4), deep sleep
+        """
+        self._to_aasm_states = {9:0, 0:0, 5:1, 1:2, 2:3, 3:4, 4:4}
+        """ 9 to nan?
+        0   --- awake
+        1   --- REM
+        2   --- N1 (NREM1)
+        3   --- N2 (NREM2)
+        4   --- N3 (NREM3/4)
+        """
+        self._to_shhs_states = {9:0, 0:0, 5:1, 1:2, 2:3, 3:4, 4:5}
+
+
+    def __getstate__(self) -> dict:
+        """
+        the lock of the caches can not be pickled, hence is dropped, and re-created in `self.__setstate__`
+        """
+        state = self.__dict__.copy()
+        state.pop("_cache_lock", None)
+        return state
+
+
+    def __setstate__(self, state:dict) -> NoReturn:
+        """
+        """
+        self.__dict__.update(state)
+        self._cache_lock = threading.Lock()
+
+
+    def _build_partitioned_csv_cache(self, file_path:str, cache_dir:str, key:str) -> NoReturn:
+        """ finished, checked,
+
+        convert a cohort-wide csv file into a columnar cache partitioned by `key`,
+        each column is stored as a `.npy` file, with rows sorted (stably) by `key`,
+        so that rows of the same `key` value are contiguous,
+        and `offsets.npy` gives the start and end row of each value in `keys.npy`
+
+        Parameters:
+        -----------
+        file_path: str,
+            path of the csv file
+        cache_dir: str,
+            directory to store the cache
+        key: str,
+            name of the column to partition the rows
+        """
+        start = time.time()
+        self.logger.info(f"converting {file_path} into a columnar cache partitioned by \042{key}\042, which would be done only once...")
+        df = pd.read_csv(file_path)
+        order = np.argsort(df[key].values, kind="stable")
+        df = df.iloc[order].reset_index(drop=True)
+        keys, first_rows = np.unique(df[key].values, return_index=True)
+        offsets = np.append(first_rows, len(df)).astype(np.int64)
+
+        os.makedirs(cache_dir, exist_ok=True)
+        columns, object_columns = [], []
+        for idx, c in enumerate(df.columns):
+            values = df[c].to_numpy()
+            if values.dtype.kind not in "biufc":  # strings, etc., can not be memory-mapped
+                object_columns.append(c)
+                np.save(os.path.join(cache_dir, f"col_{idx}.npy"), values.astype(object), allow_pickle=True)
+            else:
+                np.save(os.path.join(cache_dir, f"col_{idx}.npy"), values)
+            columns.append(c)
+        np.save(os.path.join(cache_dir, "keys.npy"), keys)
+        np.save(os.path.join(cache_dir, "offsets.npy"), offsets)
+        stat = os.stat(file_path)
+        meta = {
+            "source": os.path.abspath(file_path),
+            "source_size": stat.st_size,
+            "source_mtime": stat.st_mtime,
+            "key": key,
+            "columns": columns,
+            "object_columns": object_columns,
+            "nb_rows": len(df),
+        }
+        # written last, so that an interrupted conversion is redone
+        with open(os.path.join(cache_dir, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        self.logger.info(f"Done in {time.time() - start:.3f} seconds!")
+
+
+    def _load_partitioned_csv(self, file_path:str, key:str="nsrrid", value:Optional[Real]=None) -> pd.DataFrame:
+        """ finished, checked,
+
+        load rows of a cohort-wide csv file (e.g. hrv, eeg summary files) whose `key` equals `value`,
+        via its columnar cache (built at the first call),
+        only the rows of `value` are read from the memory-mapped columns
+
+        Parameters:
+        -----------
+        file_path: str,
+            path of the csv file
+        key: str, default "nsrrid",
+            name of the column to partition the rows
+        value: real number, optional,
+            value of `key` of the rows to load,
+            if not specified, all rows (sorted by `key`) will be loaded
+
+        Returns:
+        --------
+        df, DataFrame,
+            the rows of the csv file with `key` equals `value`
+        """
+        if not os.path.isfile(file_path):
+            raise FileNotFoundError(f"No such file: {file_path}")
+        cache_dir = os.path.join(
+            self.csv_cache_dir,
+            f"{os.path.splitext(os.path.basename(file_path))[0]}-by-{key}",
+        )
+        index = self._csv_cache_index.get(cache_dir, None)
+        if index is None:
+            meta_fp = os.path.join(cache_dir, "meta.json")
+            meta = None
+            if os.path.isfile(meta_fp):
+                with open(meta_fp, "r") as f:
+                    meta = json.load(f)
+                stat = os.stat(file_path)
+                if meta["source_size"] != stat.st_size or meta["source_mtime"] != stat.st_mtime:
+                    meta = None  # the csv file has been updated
+            if meta is None:
+                self._build_partitioned_csv_cache(file_path, cache_dir, key)
+                with open(meta_fp, "r") as f:
+                    meta = json.load(f)
+            index = {
+                "columns": meta["columns"],
+                "keys": np.load(os.path.join(cache_dir, "keys.npy")),
+                "offsets": np.load(os.path.join(cache_dir, "offsets.npy")),
+                "data": [
+                    np.load(os.path.join(cache_dir, f"col_{idx}.npy"), allow_pickle=True) \
+                        if c in meta["object_columns"] else \
+                            np.load(os.path.join(cache_dir, f"col_{idx}.npy"), mmap_mode="r") \
+                        for idx, c in enumerate(meta["columns"])
+                ],
+            }
+            self._csv_cache_index[cache_dir] = index
+
+        if value is None:
+            rows = slice(0, index["offsets"][-1])
+        else:
+            pos = np.searchsorted(index["keys"], value)
+            if pos < len(index["keys"]) and index["keys"][pos] == value:
+                rows = slice(index["offsets"][pos], index["offsets"][pos+1])
+            else:
+                rows = slice(0, 0)
+        df = pd.DataFrame(
+            {c: np.array(d[rows]) for c, d in zip(index["columns"], index["data"])},
+            columns=index["columns"],
+        )
+        return df
+
 
     def safe_edf_file_operation(self, operation:str="close", full_file_path:Optional[str]=None) -> Union[EdfReader, NoReturn]:
         """ finished, checked,
@@ -677,210 +1258,529 @@ class NSRRDataBase(_DataBase):
             raise ValueError("Illegal operation")
         
 
-    def get_subject_id(self, rec:str) -> int:
+    def form_paths(self) -> NoReturn:
         """
-        Attach a `subject_id` to the record, in order to facilitate further uses
-
-        Parameters:
-        -----------
-        rec: str,
-            record name
-
-        Returns:
-        --------
-        int, a `subject_id` attached to the record `rec`
+        set `self.psg_data_path`, `self.event_ann_path`, `self.event_profusion_ann_path`, etc.
         """
         raise NotImplementedError
-        
-
-    def get_patient_id(self, rec:str) -> int:
-        """
-        synonym for func `self.get_subject_id`
-        """
-        return self.get_subject_id(rec=rec)
 
 
-    def show_rec_stats(self, rec:str) -> NoReturn:
-        """
-        print the statistics about the record `rec`
+    def _ls_rec(self) -> NoReturn:
+        """ finished, checked,
 
-        Parameters:
-        -----------
-        rec: str,
-            record name
+        find all records (names of the psg data files without extension, the subfolders excluded)
+        under `self.psg_data_path`, and save into `self._all_records` for further use
         """
-        raise NotImplementedError
+        self._all_records = []
+        if self.psg_data_path is None or not os.path.isdir(self.psg_data_path):
+            return
+        ext = self.rec_ext["psg"]
+        for _, _, filenames in os.walk(self.psg_data_path):
+            self._all_records += [fn[:-len(ext)] for fn in filenames if fn.endswith(ext)]
+        self._all_records = sorted(set(self._all_records))
 
 
-    def database_info(self, detailed:bool=False) -> NoReturn:
-        """
-        print the information about the database
+    def update_sleep_stage_names(self) -> NoReturn:
+        """ finished,
 
-        detailed: bool, default False,
-            if False, an short introduction of the database will be printed,
-            if True, then docstring of the class will be printed additionally
         """
-        raw_info = {
-            "What": "",
-            "Who": "",
-            "When": "",
-            "Funding": ""
-        }
+        self.sleep_stage_names = self._get_sleep_stage_names(self.sleep_stage_protocol)
 
-        print(raw_info)
-        
-        if detailed:
-            print(self.__doc__)
 
+    def _get_sleep_stage_names(self, sleep_stage_protocol:str) -> List[str]:
+        """ finished,
 
-    def helper(self, items:Union[List[str],str,type(None)]=None, **kwargs) -> NoReturn:
+        names of the sleep stages of the protocol `sleep_stage_protocol`,
+        without touching `self.sleep_stage_protocol` and `self.sleep_stage_names`
         """
-        """
-        pp = pprint.PrettyPrinter(indent=4)
-
-        attrs = vars(self)
-        methods = [func for func in dir(self) if callable(getattr(self, func)) and not (func.startswith("__") and func.endswith("__"))]
-
-        if items is None:
-            _items = ["attributes", "methods", ]
-        elif isinstance(items, str):
-            _items = [items]
+        if sleep_stage_protocol == "aasm":
+            nb_stages = 5
+        elif sleep_stage_protocol == "simplified":
+            nb_stages = 4
+        elif sleep_stage_protocol == "shhs":
+            nb_stages = 6
         else:
-            _items = items
+            raise ValueError(f"No stage protocol named {sleep_stage_protocol}")
+        
+        return self.all_sleep_stage_names[:nb_stages]
 
-        pp = pprint.PrettyPrinter(indent=4)
 
-        if "attributes" in _items:
-            print("--- helpler - attributes ---")
-            pp.pprint(attrs)
-        if "methods" in _items:
-            print("--- helpler - methods ---")
-            pp.pprint(methods)
+    def get_rec_subfolder(self, rec:str) -> str:
+        """
+        name of the subfolder (e.g. visit) in which the files of the record `rec` are stored,
+        empty string if the files are stored directly in `self.psg_data_path`, etc.
+        """
+        return ""
 
 
-class ImageDataBase(_DataBase):
-    """
+    def match_channel(self, channel:str) -> str:
+        """ finished,
 
-    """
-    def __init__(self, db_name:str, db_dir:str, working_dir:Optional[str]=None, verbose:int=2, **kwargs):
-        """
         Parameters:
         -----------
-        db_name: str,
-            name of the database
-        db_dir: str,
-            storage path of the database
-        working_dir: str, optional,
-            working directory, to store intermediate files and log file
-        verbose: int, default 2,
-        kwargs: dict,
+        channel: str,
+            channel name, or its alias in `self.channel_name_map`
+        
+        Returns:
+        --------
+        str, the standard channel name in the database
         """
-        super().__init__(db_name=db_name, db_dir=db_dir, working_dir=working_dir, verbose=verbose, **kwargs)
-        # self._set_logger(prefix=None)
+        for k, v in self.channel_name_map.items():
+            if k.lower() == channel.lower():
+                channel = v
+                break
+        if len(self.all_signals) == 0:
+            return channel
+        for sig in self.all_signals:
+            if sig.lower() == channel.lower():
+                return sig
+        raise ValueError(f"No channel named {channel}")
 
 
-    def helper(self, items:Union[List[str],str,type(None)]=None, **kwargs) -> NoReturn:
-        """
+    def match_full_rec_path(self, rec:str, rec_path:Optional[str]=None, rec_type:str="psg") -> str:
+        """ finished,
+
+        Parameters:
+        -----------
+        rec: str,
+            record name
+        rec_path: str, optional,
+            path of the file which contains the desired data,
+            if not given, default path will be used
+        rec_type: str, default "psg",
+            record type, data or annotations, ref. `self.rec_ext`
+        
+        Returns:
+        --------
+        rp: str,
+            path of the file
         """
-        pp = pprint.PrettyPrinter(indent=4)
+        if rec_path is not None:
+            return rec_path
+        folder = {
+            "psg": self.psg_data_path,
+            "event": self.event_ann_path,
+            "event_profusion": self.event_profusion_ann_path,
+        }[rec_type]
+        rp = os.path.join(folder, self.get_rec_subfolder(rec), rec+self.rec_ext[rec_type])
+        return rp
 
-        attrs = vars(self)
-        methods = [func for func in dir(self) if callable(getattr(self, func)) and not (func.startswith("__") and func.endswith("__"))]
 
-        if items is None:
-            _items = ["attributes", "methods", ]
-        elif isinstance(items, str):
-            _items = [items]
-        else:
-            _items = items
+    def get_edf_header(self, rec:str, rec_path:Optional[str]=None) -> dict:
+        """ finished,
 
-        pp = pprint.PrettyPrinter(indent=4)
+        header of the psg (edf) file of the record `rec`,
+        read once and then cached
 
-        if "attributes" in _items:
-            print("--- helpler - attributes ---")
-            pp.pprint(attrs)
-        if "methods" in _items:
-            print("--- helpler - methods ---")
-            pp.pprint(methods)
+        Parameters:
+        -----------
+        rec: str,
+            record name
+        rec_path: str, optional,
+            path of the file which contains the psg data,
+            if not given, default path will be used
 
+        Returns:
+        --------
+        header: dict,
+            with items "signal_labels", "fs", "nb_samples", "physical_dimension", "prefilter", "transducer",
+            each (except "signal_labels") is a dict with signal labels as keys
+        """
+        frp = self.match_full_rec_path(rec, rec_path, rec_type="psg")
+        with self._cache_lock:
+            header = self._edf_headers.get(frp, None)
+        if header is not None:
+            return header
+        reader = EdfReader(frp)
+        try:
+            signal_labels = reader.getSignalLabels()
+            nb_samples = reader.getNSamples()
+            header = {
+                "signal_labels": signal_labels,
+                "fs": {lb: reader.getSampleFrequency(chn) for chn, lb in enumerate(signal_labels)},
+                "nb_samples": {lb: int(nb_samples[chn]) for chn, lb in enumerate(signal_labels)},
+                "physical_dimension": {lb: reader.getPhysicalDimension(chn) for chn, lb in enumerate(signal_labels)},
+                "prefilter": {lb: reader.getPrefilter(chn) for chn, lb in enumerate(signal_labels)},
+                "transducer": {lb: reader.getTransducer(chn) for chn, lb in enumerate(signal_labels)},
+            }
+        finally:
+            reader._close()
+        with self._cache_lock:
+            self._edf_headers[frp] = header
+        return header
 
-class AudioDataBase(_DataBase):
-    """
 
-    """
-    def __init__(self, db_name:str, db_dir:str, working_dir:Optional[str]=None, verbose:int=2, **kwargs):
-        """
+    def get_fs(self, rec:str, sig:str="ECG", rec_path:Optional[str]=None) -> Real:
+        """ finished,
+
         Parameters:
         -----------
-        db_name: str,
-            name of the database
-        db_dir: str,
-            storage path of the database
-        working_dir: str, optional,
-            working directory, to store intermediate files and log file
-        verbose: int, default 2,
-        kwargs: dict,
+        rec: str,
+            record name
+        sig: str, default "ECG",
+            signal name
+        rec_path: str, optional,
+            path of the file which contains the psg data,
+            if not given, default path will be used
+
+        Returns:
+        --------
+        fs, real number,
+            the sampling frequency of the signal `sig` of the record `rec`
         """
-        super().__init__(db_name=db_name, db_dir=db_dir, working_dir=working_dir, verbose=verbose, **kwargs)
-        # self._set_logger(prefix=None)
+        header = self.get_edf_header(rec, rec_path)
+        fs = header["fs"][self._match_edf_channel(header, sig)]
+        return fs
 
+    
+    def get_chn_num(self, rec:str, sig:str="ECG", rec_path:Optional[str]=None) -> int:
+        """ finished,
 
-    def helper(self, items:Union[List[str],str,type(None)]=None, **kwargs) -> NoReturn:
+        Parameters:
+        -----------
+        rec: str,
+            record name
+        sig: str, default "ECG",
+            signal name
+        rec_path: str, optional,
+            path of the file which contains the psg data,
+            if not given, default path will be used
+
+        Returns:
+        --------
+        chn_num, int,
+            the number of channel of the signal `sig` of the record `rec`
         """
+        header = self.get_edf_header(rec, rec_path)
+        chn_num = header["signal_labels"].index(self._match_edf_channel(header, sig))
+        return chn_num
+
+
+    def _match_edf_channel(self, header:dict, channel:str) -> str:
+        """ finished,
+
+        match `channel` (via `self.match_channel`) to a signal label in the edf `header`
         """
-        pp = pprint.PrettyPrinter(indent=4)
+        chn = self.match_channel(channel)
+        for lb in header["signal_labels"]:
+            if lb.lower() == chn.lower():
+                return lb
+        raise ValueError(f"No channel named {channel}")
 
-        attrs = vars(self)
-        methods = [func for func in dir(self) if callable(getattr(self, func)) and not (func.startswith("__") and func.endswith("__"))]
 
-        if items is None:
-            _items = ["attributes", "methods", ]
-        elif isinstance(items, str):
-            _items = [items]
+    def read_edf_channels(self, rec:str, channels:Union[str,Sequence[str]]="all", rec_path:Optional[str]=None) -> Dict[str, np.ndarray]:
+        """ finished,
+
+        read (only) the channels `channels` from the psg (edf) file of the record `rec`,
+        an independent `EdfReader` is used (instead of `self.file_opened`),
+        so that this method can be called in several threads simultaneously
+
+        Parameters:
+        -----------
+        rec: str,
+            record name
+        channels: str, or sequence of str, default "all",
+            names of the channels of PSG to read,
+            if is "all", then all channels will be read
+        rec_path: str, optional,
+            path of the file which contains the psg data,
+            if not given, default path will be used
+
+        Returns:
+        --------
+        data_dict: dict,
+            with signal labels as keys and the signals as values
+        """
+        header = self.get_edf_header(rec, rec_path)
+        if isinstance(channels, str) and channels.lower() == "all":
+            _channels = header["signal_labels"]
         else:
-            _items = items
+            _channels = [channels] if isinstance(channels, str) else channels
+            _channels = [self._match_edf_channel(header, c) for c in _channels]
+        frp = self.match_full_rec_path(rec, rec_path, rec_type="psg")
+        reader = EdfReader(frp)
+        try:
+            data_dict = {c: reader.readSignal(header["signal_labels"].index(c)) for c in _channels}
+        finally:
+            reader._close()
+        return data_dict
 
-        pp = pprint.PrettyPrinter(indent=4)
 
-        if "attributes" in _items:
-            print("--- helpler - attributes ---")
-            pp.pprint(attrs)
-        if "methods" in _items:
-            print("--- helpler - methods ---")
-            pp.pprint(methods)
+    def show_rec_stats(self, rec:str, rec_path:Optional[str]=None) -> NoReturn:
+        """ finished,
 
+        Parameters:
+        -----------
+        rec: str,
+            record name
+        rec_path: str, optional,
+            path of the file which contains the psg data,
+            if not given, default path will be used
+        """
+        header = self.get_edf_header(rec, rec_path)
+        for lb in header["signal_labels"]:
+            print("SignalLabel:",lb)
+            print("Prefilter:",header["prefilter"][lb])
+            print("Transducer:",header["transducer"][lb])
+            print("PhysicalDimension:",header["physical_dimension"][lb])
+            print("SampleFrequency:",header["fs"][lb])
+            print("*"*40)
 
-class OtherDataBase(_DataBase):
-    """
 
-    """
-    def __init__(self, db_name:str, db_dir:str, working_dir:Optional[str]=None, verbose:int=2, **kwargs):
-        r"""
+    def load_psg_data(self, rec:str, channel:Union[str,Sequence[str]]="all", rec_path:Optional[str]=None) -> Dict[str, np.ndarray]:
+        """ finished,
+
         Parameters:
         -----------
-        db_name: str,
-            name of the database
-        db_dir: str,
-            storage path of the database
-        working_dir: str, optional,
-            working directory, to store intermediate files and log file
-        verbose: int, default 2,
-        kwargs: dict,
+        rec: str,
+            record name
+        channel: str, or sequence of str, default "all",
+            name(s) of the channel(s) of PSG,
+            if is "all", then all channels will be returned
+        rec_path: str, optional,
+            path of the file which contains the psg data,
+            if not given, default path will be used
+        
+        Returns:
+        --------
+        dict, psg data
+        """
+        return self.read_edf_channels(rec, channel, rec_path)
 
-        typical "db_dir":
-        ------------------
-            "E:\\notebook_dir\\ecg\\data\xxx\\"
-            "/export/algo/wenh06/ecg_data/xxx/"
+
+    def load_ecg_data(self, rec:str, rec_path:Optional[str]=None) -> np.ndarray:
+        """ finished,
+
+        Parameters:
+        -----------
+        rec: str,
+            record name
+        rec_path: str, optional,
+            path of the file which contains the ecg data,
+            if not given, default path will be used
+        
+        Returns:
+        --------
+        ndarray, the ECG data
         """
-        super().__init__(db_name=db_name, db_dir=db_dir, working_dir=working_dir, verbose=verbose, **kwargs)
-        # self._set_logger(prefix=None)
+        return list(self.load_psg_data(rec=rec, channel="ecg", rec_path=rec_path).values())[0]
 
-        self.fs = None
-        self._all_records = None
-        self.device_id = None  # maybe data are imported into impala db, to facilitate analyzing
+
+    def _parse_xml(self, file_path:str) -> dict:
+        """ finished,
+
+        parse the xml (annotation) file using `xmltodict`,
+        results are cached for the latest `self.xml_cache_size` files,
+        hence the returned dict should NOT be modified in place
+        """
+        with self._cache_lock:
+            doc = self._xml_docs.get(file_path, None)
+            if doc is not None:
+                self._xml_docs.move_to_end(file_path)
+                return doc
+        # parsed outside the lock, a file parsed simultaneously in several threads is cached only once
+        with open(file_path) as fd:
+            doc = xtd.parse(fd.read())
+        with self._cache_lock:
+            self._xml_docs[file_path] = doc
+            while len(self._xml_docs) > self.xml_cache_size:
+                self._xml_docs.popitem(last=False)
+        return doc
+
+
+    def load_event_ann(self, rec:str, event_ann_path:Optional[str]=None, simplify:bool=False) -> pd.DataFrame:
+        """ finished,
+
+        Parameters:
+        -----------
+        rec: str,
+            record name
+        event_ann_path: str, optional,
+            path of the file which contains the events-nsrr annotations,
+            if not given, default path will be used
+        simplify: bool, default False,
+            if True, "EventType" and "EventConcept" are simplified to the parts after "|"
         
-        self.kwargs = kwargs
+        Returns:
+        --------
+        df_events: DataFrame,
+            the scored events
+        """
+        file_path = self.match_full_rec_path(rec, event_ann_path, rec_type="event")
+        doc = self._parse_xml(file_path)
+        df_events = pd.DataFrame(doc["PSGAnnotation"]["ScoredEvents"]["ScoredEvent"][1:])
+        if simplify:
+            df_events["EventType"] = df_events["EventType"].str.split("|").str[1]
+            df_events["EventConcept"] = df_events["EventConcept"].str.split("|").str[1]
+        for c in ["Start", "Duration", "SpO2Nadir", "SpO2Baseline"]:
+            if c in df_events.columns:
+                df_events[c] = df_events[c].apply(self.str_to_real_number)
+
+        return df_events
+
+
+    def load_event_profusion_ann(self, rec:str, event_profusion_ann_path:Optional[str]=None) -> dict:
+        """ finished,
+
+        Parameters:
+        -----------
+        rec: str,
+            record name
+        event_profusion_ann_path: str, optional,
+            path of the file which contains the events-profusion annotations,
+            if not given, default path will be used
+        
+        Returns:
+        --------
+        dict, with items "sleep_stage_list" and "df_events"
+
+        TODO:
+            merge "sleep_stage_list" and "df_events" into one DataFrame
+        """
+        file_path = self.match_full_rec_path(rec, event_profusion_ann_path, rec_type="event_profusion")
+        doc = self._parse_xml(file_path)
+        sleep_stage_list = [int(ss) for ss in doc["CMPStudyConfig"]["SleepStages"]["SleepStage"]]
+        df_events = pd.DataFrame(doc["CMPStudyConfig"]["ScoredEvents"]["ScoredEvent"])
+        for c in ["Start", "Duration", "LowestSpO2", "Desaturation"]:
+            if c in df_events.columns:
+                df_events[c] = df_events[c].apply(self.str_to_real_number)
+        ret = {
+            "sleep_stage_list": sleep_stage_list,
+            "df_events": df_events
+        }
+
+        return ret
+
+
+    def _load_raw_sleep_stages(self, rec:str, source:str, sleep_stage_ann_path:Optional[str]=None) -> Tuple[np.ndarray, np.ndarray]:
+        """ finished,
+
+        load the sleep stages (in the raw codes, ref. `self.ann_sleep_stages`) of `rec`,
+        expanded into epochs of `self.sleep_epoch_len_sec` seconds
+
+        Parameters:
+        -----------
+        rec: str,
+            record name
+        source: str, can be "event", "event_profusion",
+            source of the annotations
+        sleep_stage_ann_path: str, optional,
+            path of the file which contains the sleep stage annotations,
+            if not given, default path will be used
+
+        Returns:
+        --------
+        start_sec: ndarray,
+            start (in seconds) of the epochs
+        sleep_stage: ndarray,
+            raw sleep stages of the epochs
+        """
+        if source.lower() == "event":
+            df_sleep_ann = self.load_event_ann(rec, event_ann_path=sleep_stage_ann_path, simplify=False)
+            df_tmp = df_sleep_ann[df_sleep_ann["EventType"]=="Stages|Stages"]
+            stages = df_tmp["EventConcept"].str.split("|").str[1].astype(int).values
+            starts = df_tmp["Start"].values.astype(float).astype(int)
+            durations = df_tmp["Duration"].values.astype(float).astype(int)
+            # equivalent to concatenating np.arange(start, start+duration, self.sleep_epoch_len_sec) of each stage event
+            nb_epochs = np.maximum(0, -(-durations // self.sleep_epoch_len_sec))
+            offsets = np.arange(nb_epochs.sum()) - np.repeat(np.cumsum(nb_epochs) - nb_epochs, nb_epochs)
+            start_sec = np.repeat(starts, nb_epochs) + self.sleep_epoch_len_sec * offsets
+            sleep_stage = np.repeat(stages, nb_epochs)
+            self.logger.info(f"record {rec} has {len(df_tmp)} raw sleep stage annotations")
+        elif source.lower() == "event_profusion":
+            sleep_stage = np.array(self.load_event_profusion_ann(rec, sleep_stage_ann_path)["sleep_stage_list"], dtype=int)
+            start_sec = self.sleep_epoch_len_sec * np.arange(len(sleep_stage))
+        else:
+            raise ValueError(f"source `{source}` contains no sleep stage annotations")
+        return start_sec, sleep_stage
+
+
+    def load_sleep_stage_ann(self, rec:str, source:str, sleep_stage_ann_path:Optional[str]=None, sleep_stage_protocol:str="aasm", with_stage_names:bool=True) -> pd.DataFrame:
+        """ finished,
+
+        Parameters:
+        -----------
+        rec: str,
+            record name
+        source: str, can be "event", "event_profusion" (and other sources supported by `self._load_raw_sleep_stages`),
+            source of the annotations
+        sleep_stage_ann_path: str, optional,
+            path of the file which contains the sleep stage annotations,
+            if not given, default path will be used
+        sleep_stage_protocol: str, default "aasm",
+            the protocol to classify sleep stages. currently can be "aasm", "simplified", "shhs"
+            the only difference lies in the number of different stages of the NREM periods
+        with_stage_names: bool, default True,
+            as the argument name implies
+
+        Returns:
+        --------
+        df_sleep_stage_ann, DataFrame,
+            all annotations on sleep stage of `rec`
+        """
+        self.sleep_stage_protocol = sleep_stage_protocol
+        self.update_sleep_stage_names()
+
+        return self._load_sleep_stage_ann(rec, source, sleep_stage_ann_path, sleep_stage_protocol, with_stage_names)
+
+
+    def _load_sleep_stage_ann(self, rec:str, source:str, sleep_stage_ann_path:Optional[str], sleep_stage_protocol:str, with_stage_names:bool) -> pd.DataFrame:
+        """ finished,
+
+        the same as `self.load_sleep_stage_ann`, but with the protocol passed explicitly,
+        without touching `self.sleep_stage_protocol` and `self.sleep_stage_names`,
+        so that it can be called in several threads simultaneously
+        """
+        sleep_stage_names = self._get_sleep_stage_names(sleep_stage_protocol)
+
+        start_sec, sleep_stage = self._load_raw_sleep_stages(rec, source, sleep_stage_ann_path)
+
+        mapping = {
+            "aasm": self._to_aasm_states,
+            "simplified": self._to_simplified_states,
+            "shhs": self._to_shhs_states,
+        }[sleep_stage_protocol]
+        # codes absent from `mapping` are looked up as -1, and rejected (as by a dict lookup)
+        lookup = np.full(max(mapping)+1, -1, dtype=int)
+        lookup[list(mapping.keys())] = list(mapping.values())
+        sleep_stage = np.asarray(sleep_stage).astype(int)
+        in_range = (sleep_stage >= 0) & (sleep_stage < len(lookup))
+        mapped = np.full(len(sleep_stage), -1, dtype=int)
+        mapped[in_range] = lookup[sleep_stage[in_range]]
+        if (mapped == -1).any():
+            raise KeyError(f"unknown sleep stage codes {np.unique(sleep_stage[mapped == -1]).tolist()} in the annotations of record {rec}")
+        df_sleep_stage_ann = pd.DataFrame(
+            {
+                "start_sec": start_sec,
+                "sleep_stage": mapped,
+            }
+        )
+
+        if with_stage_names:
+            df_sleep_stage_ann["sleep_stage_name"] = np.array(sleep_stage_names)[df_sleep_stage_ann["sleep_stage"].values]
         
+        self.logger.info(f"after being transformed (epoch_len = {self.sleep_epoch_len_sec}sec), record {rec} has {len(df_sleep_stage_ann)} sleep stage annotations")
+
+        return df_sleep_stage_ann
+
+
+    def str_to_real_number(self, s:Union[str,Real]) -> Real:
+        """ finished,
+
+        some columns in the annotations might incorrectly been converted from real number to string, using `xmltodict`.
+
+        Parameters:
+        -----------
+        s: str or real number (NaN)
+        """
+        if isinstance(s,str):
+            if "." in s:
+                return float(s)
+            else:
+                return int(s)
+        else:  # NaN case
+            return s
+
 
     def get_subject_id(self, rec:str) -> int:
         """
@@ -903,7 +1803,118 @@ class OtherDataBase(_DataBase):
         synonym for func `self.get_subject_id`
         """
         return self.get_subject_id(rec=rec)
-    
+
+
+    def run_over_records(self, func:Callable[..., Union[dict,pd.DataFrame]], output_path:str, recs:Optional[Sequence[str]]=None, checkpoint_dir:Optional[str]=None, nb_workers:Optional[int]=None, progress_interval:int=100, **func_kw:Any) -> dict:
+        """ finished,
+
+        apply `func` to each record in a process pool, e.g. for cohort-scale feature extraction,
+        the result of each record is checkpointed (in the worker) once computed,
+        so that a crashed (or interrupted) run resumes from the records not yet finished,
+        and finally all results are gathered (streamed, record by record) into one csv table
+
+        Parameters:
+        -----------
+        func: callable,
+            the function to apply, called as `func(rec, **func_kw)`,
+            should return a dict (one row) or a DataFrame (several rows),
+            and should be picklable (e.g. defined at the top level of a module)
+        output_path: str,
+            path of the csv file to store the gathered results,
+            a column "rec" (the record name) is prepended
+        recs: sequence of str, optional,
+            names of the records to process, defaults to `self.all_records`
+        checkpoint_dir: str, optional,
+            directory to store the per-record results,
+            defaults to a folder named after `output_path` in `self.working_dir`
+        nb_workers: int, optional,
+            number of worker processes, defaults to the number of cpus
+        progress_interval: int, default 100,
+            log progress and throughput every `progress_interval` finished records,
+            no progress logging if non-positive
+        func_kw: dict,
+            other key word arguments passed to `func`
+
+        Returns:
+        --------
+        stats: dict,
+            with items "nb_records", "nb_resumed", "nb_finished", "nb_failed",
+            "failed" (dict of record name to error message), "elapsed", "throughput" (records per second)
+        """
+        _recs = list(recs if recs is not None else self.all_records)
+        checkpoint_dir = checkpoint_dir or os.path.join(
+            self.working_dir, f"{os.path.splitext(os.path.basename(output_path))[0]}_checkpoints"
+        )
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        ckpt_fp = {rec: os.path.join(checkpoint_dir, f"{rec}.pkl") for rec in _recs}
+        todo = [rec for rec in _recs if not os.path.isfile(ckpt_fp[rec])]
+        stats = {
+            "nb_records": len(_recs),
+            "nb_resumed": len(_recs) - len(todo),
+            "nb_finished": 0,
+            "nb_failed": 0,
+            "failed": {},
+        }
+        self.logger.info(f"{stats['nb_resumed']} of {len(_recs)} records have been finished in previous runs, {len(todo)} records to process")
+
+        # at most `max_pending` tasks are submitted at a time, so that memory is bounded
+        max_pending = 2 * (nb_workers or os.cpu_count() or 1)
+        start = time.time()
+        with ProcessPoolExecutor(max_workers=nb_workers) as executor:
+            rec_iter = iter(todo)
+            pending = {}
+            while True:
+                while len(pending) < max_pending:
+                    rec = next(rec_iter, None)
+                    if rec is None:
+                        break
+                    future = executor.submit(_run_and_checkpoint, func, rec, ckpt_fp[rec], func_kw)
+                    pending[future] = rec
+                if len(pending) == 0:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    rec = pending.pop(future)
+                    try:
+                        future.result()
+                        stats["nb_finished"] += 1
+                    except Exception as e:
+                        stats["nb_failed"] += 1
+                        stats["failed"][rec] = repr(e)
+                        self.logger.warning(f"failed to process record {rec}: {repr(e)}")
+                    nb_processed = stats["nb_finished"] + stats["nb_failed"]
+                    if progress_interval > 0 and (nb_processed % progress_interval == 0 or nb_processed == len(todo)):
+                        elapsed = time.time() - start
+                        throughput = nb_processed / max(elapsed, 1e-6)
+                        self.logger.info(
+                            f"{nb_processed}/{len(todo)} records processed ({stats['nb_failed']} failed) "
+                            f"in {elapsed:.1f} seconds, {throughput:.2f} records/s, "
+                            f"ETA {(len(todo)-nb_processed)/max(throughput, 1e-6):.1f} seconds"
+                        )
+        stats["elapsed"] = time.time() - start
+        stats["throughput"] = stats["nb_finished"] / max(stats["elapsed"], 1e-6)
+
+        # gather the per-record results into one table, streamed record by record,
+        # the columns are collected in a first pass over the checkpoints,
+        # since results of different records might have different columns,
+        # then the records are appended to the output one at a time
+        finished = [rec for rec in _recs if os.path.isfile(ckpt_fp[rec])]
+        columns = []
+        for rec in finished:
+            rec_columns = pd.read_pickle(ckpt_fp[rec]).columns
+            columns += [c for c in rec_columns if c not in columns]
+        tmp_output_path = f"{output_path}.tmp"
+        with open(tmp_output_path, "w") as f:
+            pd.DataFrame(columns=["rec"]+columns).to_csv(f, index=False)
+            for rec in finished:
+                df = pd.read_pickle(ckpt_fp[rec]).reindex(columns=columns)
+                df.insert(0, "rec", rec)
+                df.to_csv(f, index=False, header=False)
+        os.replace(tmp_output_path, output_path)
+        self.logger.info(f"results of {len(finished)} records are written to {output_path}")
+
+        return stats
+
 
     def database_info(self, detailed:bool=False) -> NoReturn:
         """
@@ -913,7 +1924,12 @@ class OtherDataBase(_DataBase):
             if False, an short introduction of the database will be printed,
             if True, then docstring of the class will be printed additionally
         """
-        raw_info = {}
+        raw_info = {
+            "What": "",
+            "Who": "",
+            "When": "",
+            "Funding": ""
+        }
 
         print(raw_info)
         
@@ -925,7 +1941,7 @@ class OtherDataBase(_DataBase):
         """
         """
         pp = pprint.PrettyPrinter(indent=4)
-        
+
         attrs = vars(self)
         methods = [func for func in dir(self) if callable(getattr(self, func)) and not (func.startswith("__") and func.endswith("__"))]
 
@@ -946,6 +1962,1265 @@ class OtherDataBase(_DataBase):
             pp.pprint(methods)
 
 
+class ImageDataBase(_DataBase):
+    """
+
+    """
+    def __init__(self, db_name:str, db_dir:str, working_dir:Optional[str]=None, verbose:int=2, **kwargs):
+        """
+        Parameters:
+        -----------
+        db_name: str,
+            name of the database
+        db_dir: str,
+            storage path of the database
+        working_dir: str, optional,
+            working directory, to store intermediate files and log file
+        verbose: int, default 2,
+        kwargs: dict,
+        """
+        super().__init__(db_name=db_name, db_dir=db_dir, working_dir=working_dir, verbose=verbose, **kwargs)
+        # self._set_logger(prefix=None)
+
+
+    def helper(self, items:Union[List[str],str,type(None)]=None, **kwargs) -> NoReturn:
+        """
+        """
+        pp = pprint.PrettyPrinter(indent=4)
+
+        attrs = vars(self)
+        methods = [func for func in dir(self) if callable(getattr(self, func)) and not (func.startswith("__") and func.endswith("__"))]
+
+        if items is None:
+            _items = ["attributes", "methods", ]
+        elif isinstance(items, str):
+            _items = [items]
+        else:
+            _items = items
+
+        pp = pprint.PrettyPrinter(indent=4)
+
+        if "attributes" in _items:
+            print("--- helpler - attributes ---")
+            pp.pprint(attrs)
+        if "methods" in _items:
+            print("--- helpler - methods ---")
+            pp.pprint(methods)
+
+
+class AudioDataBase(_DataBase):
+    """
+
+    """
+    def __init__(self, db_name:str, db_dir:str, working_dir:Optional[str]=None, verbose:int=2, **kwargs):
+        """
+        Parameters:
+        -----------
+        db_name: str,
+            name of the database
+        db_dir: str,
+            storage path of the database
+        working_dir: str, optional,
+            working directory, to store intermediate files and log file
+        verbose: int, default 2,
+        kwargs: dict,
+        """
+        super().__init__(db_name=db_name, db_dir=db_dir, working_dir=working_dir, verbose=verbose, **kwargs)
+        # self._set_logger(prefix=None)
+
+
+    def helper(self, items:Union[List[str],str,type(None)]=None, **kwargs) -> NoReturn:
+        """
+        """
+        pp = pprint.PrettyPrinter(indent=4)
+
+        attrs = vars(self)
+        methods = [func for func in dir(self) if callable(getattr(self, func)) and not (func.startswith("__") and func.endswith("__"))]
+
+        if items is None:
+            _items = ["attributes", "methods", ]
+        elif isinstance(items, str):
+            _items = [items]
+        else:
+            _items = items
+
+        pp = pprint.PrettyPrinter(indent=4)
+
+        if "attributes" in _items:
+            print("--- helpler - attributes ---")
+            pp.pprint(attrs)
+        if "methods" in _items:
+            print("--- helpler - methods ---")
+            pp.pprint(methods)
+
+
+class OtherDataBase(_DataBase):
+    """
+
+    """
+    def __init__(self, db_name:str, db_dir:str, working_dir:Optional[str]=None, verbose:int=2, **kwargs):
+        r"""
+        Parameters:
+        -----------
+        db_name: str,
+            name of the database
+        db_dir: str,
+            storage path of the database
+        working_dir: str, optional,
+            working directory, to store intermediate files and log file
+        verbose: int, default 2,
+        kwargs: dict,
+
+        typical "db_dir":
+        ------------------
+            "E:\\notebook_dir\\ecg\\data\xxx\\"
+            "/export/algo/wenh06/ecg_data/xxx/"
+        """
+        super().__init__(db_name=db_name, db_dir=db_dir, working_dir=working_dir, verbose=verbose, **kwargs)
+        # self._set_logger(prefix=None)
+
+        self.fs = None
+        self._all_records = None
+        self.device_id = None  # maybe data are imported into impala db, to facilitate analyzing
+        
+        self.kwargs = kwargs
+        
+
+    def get_subject_id(self, rec:str) -> int:
+        """
+        Attach a `subject_id` to the record, in order to facilitate further uses
+
+        Parameters:
+        -----------
+        rec: str,
+            record name
+
+        Returns:
+        --------
+        int, a `subject_id` attached to the record `rec`
+        """
+        raise NotImplementedError
+        
+
+    def get_patient_id(self, rec:str) -> int:
+        """
+        synonym for func `self.get_subject_id`
+        """
+        return self.get_subject_id(rec=rec)
+    
+
+    def database_info(self, detailed:bool=False) -> NoReturn:
+        """
+        print the information about the database
+
+        detailed: bool, default False,
+            if False, an short introduction of the database will be printed,
+            if True, then docstring of the class will be printed additionally
+        """
+        raw_info = {}
+
+        print(raw_info)
+        
+        if detailed:
+            print(self.__doc__)
+
+
+    def helper(self, items:Union[List[str],str,type(None)]=None, **kwargs) -> NoReturn:
+        """
+        """
+        pp = pprint.PrettyPrinter(indent=4)
+        
+        attrs = vars(self)
+        methods = [func for func in dir(self) if callable(getattr(self, func)) and not (func.startswith("__") and func.endswith("__"))]
+
+        if items is None:
+            _items = ["attributes", "methods", ]
+        elif isinstance(items, str):
+            _items = [items]
+        else:
+            _items = items
+
+        pp = pprint.PrettyPrinter(indent=4)
+
+        if "attributes" in _items:
+            print("--- helpler - attributes ---")
+            pp.pprint(attrs)
+        if "methods" in _items:
+            print("--- helpler - methods ---")
+            pp.pprint(methods)
+
+
+def _run_and_checkpoint(func:Callable[..., Union[dict,pd.DataFrame]], rec:str, checkpoint_path:str, func_kw:dict) -> int:
+    """ finished,
+
+    worker of `NSRRDataBase.run_over_records`,
+    apply `func` to `rec` and save the result to `checkpoint_path`
+
+    Returns:
+    --------
+    nb_rows: int,
+        number of rows of the result
+    """
+    result = func(rec, **func_kw)
+    if isinstance(result, dict):
+        result = pd.DataFrame([result])
+    # write then rename, so that a crash never leaves a broken checkpoint
+    tmp_path = f"{checkpoint_path}.tmp"
+    pd.DataFrame(result).to_pickle(tmp_path)
+    os.replace(tmp_path, checkpoint_path)
+    return len(result)
+
+
+_WFDB_LEAD_FIELDS = [
+    "filename", "fmt", "byte_offset", "adc_gain", "adc_units", "adc_res", "adc_zero", "baseline", "init_value", "checksum", "block_size", "lead_name",
+]
+
+_WFDB_COMMENT_ITEMS = {
+    "Age": "age", "Sex": "sex", "Rx": "medical_prescription", "Hx": "history", "Sx": "symptom_or_surgery",
+}
+
+
+def parse_wfdb_header(header_data:List[str], parse_leads:bool=True) -> dict:
+    """ finished, checked,
+
+    parse the lines of a WFDB header file (with comments in the CINC2020 style, e.g. "#Age: 53")
+    using plain string operations,
+    shared by `CPSC2018` and `CINC2020`
+
+    Parameters:
+    -----------
+    header_data: list of str,
+        list of lines read directly from a header file
+    parse_leads: bool, default True,
+        whether or not to parse the lines of the leads (signals)
+
+    Returns:
+    --------
+    header: dict, with items
+        - "rec_name", "nb_leads", "fs", "nb_samples", "datetime": parsed from the record line
+        - "age", "sex", "medical_prescription", "history", "symptom_or_surgery": parsed from the comments,
+        with default values `np.nan` (age) and "Unknown" (others)
+        - "Dx": list of str, the raw diagnoses, empty if absent
+        - "comments": dict, all the comments (key-value pairs, values as raw str)
+        - "leads": dict of list, the fields (ref. `_WFDB_LEAD_FIELDS`) of the leads,
+        only if `parse_leads` is True
+    """
+    header = {}
+    header["rec_name"], nb_leads, fs, nb_samples, date, daytime = header_data[0].split(" ")
+    header["nb_leads"] = int(nb_leads)
+    header["fs"] = int(fs)
+    header["nb_samples"] = int(nb_samples)
+    header["datetime"] = datetime.strptime(f"{date} {daytime}", "%d-%b-%Y %H:%M:%S")
+
+    comments = {}
+    for l in header_data[1+header["nb_leads"]:]:
+        if l.startswith("#"):
+            comments.setdefault(l[1:].split(":")[0].strip(), l.split(": ")[-1])
+    header["comments"] = comments
+    try:
+        header["age"] = int(comments["Age"])
+    except:  # absent or "NaN"
+        header["age"] = np.nan
+    for k, item in _WFDB_COMMENT_ITEMS.items():
+        if item != "age":
+            header[item] = comments.get(k, "Unknown")
+    header["Dx"] = comments["Dx"].split(",") if "Dx" in comments else []
+
+    if parse_leads:
+        leads = parse_wfdb_lead_lines(header_data[1:1+header["nb_leads"]])
+        header["leads"] = leads
+    return header
+
+
+def parse_wfdb_lead_lines(l_leads_data:List[str]) -> Dict[str, list]:
+    """ finished, checked,
+
+    parse the lines of the leads (signals) of a WFDB header file
+
+    Parameters:
+    -----------
+    l_leads_data: list of str,
+        raw information of each lead, read from a header file
+
+    Returns:
+    --------
+    leads: dict of list,
+        the fields (ref. `_WFDB_LEAD_FIELDS`) of the leads
+    """
+    leads = {k: [] for k in _WFDB_LEAD_FIELDS}
+    for l in l_leads_data:
+        filename, fmt_offset, gain_units, adc_res, adc_zero, init_value, checksum, block_size, lead_name = l.split()
+        fmt, byte_offset = fmt_offset.split("+")
+        adc_gain, adc_units = gain_units.split("/")
+        leads["filename"].append(filename)
+        leads["fmt"].append(fmt)
+        leads["byte_offset"].append(int(byte_offset))
+        leads["adc_gain"].append(int(adc_gain))
+        leads["adc_units"].append(adc_units)
+        leads["adc_res"].append(int(adc_res))
+        leads["adc_zero"].append(int(adc_zero))
+        leads["baseline"].append(int(adc_zero))
+        leads["init_value"].append(int(init_value))
+        leads["checksum"].append(int(checksum))
+        leads["block_size"].append(int(block_size))
+        leads["lead_name"].append(lead_name)
+    return leads
+
+
+# lookup tables of `parse_dx`, keyed by the ids of the mapping tables,
+# the mapping tables themselves are kept in the values, so that their ids can not be reused
+_DX_LOOKUPS = {}
+
+
+def parse_dx(l_Dx:List[str], dx_mapping_all:pd.DataFrame, dx_mapping_scored:pd.DataFrame) -> Tuple[dict, dict]:
+    """ finished, checked,
+
+    parse the diagnoses (SNOMED CT Codes, or abbreviations for the old version) read from a header file,
+    via lookup tables built once from the mapping tables,
+    shared by `CPSC2018` and `CINC2020`
+
+    Parameters:
+    -----------
+    l_Dx: list of str,
+        raw information of diagnosis, read from a header file
+    dx_mapping_all: DataFrame,
+        mapping of all the diagnoses, with columns "SNOMED CT Code", "Abbreviation", "Dx"
+    dx_mapping_scored: DataFrame,
+        mapping of the scored diagnoses, with column "SNOMED CT Code"
+
+    Returns:
+    --------
+    diag_dict:, dict,
+        diagnosis, including SNOMED CT Codes, fullnames and abbreviations of each diagnosis
+    diag_scored_dict: dict,
+        the scored items in `diag_dict`,
+        empty for the old version
+    """
+    key = (id(dx_mapping_all), id(dx_mapping_scored))
+    cached = _DX_LOOKUPS.get(key, None)
+    if cached is None or cached[0] is not dx_mapping_all or cached[1] is not dx_mapping_scored:
+        code_to_abbr, code_to_fullname = {}, {}
+        for code, abbr, fullname in zip(dx_mapping_all["SNOMED CT Code"].values, dx_mapping_all["Abbreviation"].values, dx_mapping_all["Dx"].values):
+            code_to_abbr.setdefault(code, abbr)
+            code_to_fullname.setdefault(code, fullname)
+        cached = (dx_mapping_all, dx_mapping_scored, code_to_abbr, code_to_fullname, set(dx_mapping_scored["SNOMED CT Code"].values))
+        _DX_LOOKUPS[key] = cached
+    _, _, code_to_abbr, code_to_fullname, scored_codes = cached
+
+    diag_dict, diag_scored_dict = {}, {}
+    diag_dict["diagnosis_code"] = [item for item in l_Dx]
+    if all([dc in code_to_abbr for dc in l_Dx]):
+        diag_dict["diagnosis_abbr"] = [code_to_abbr[dc] for dc in l_Dx]
+        diag_dict["diagnosis_fullname"] = [code_to_fullname[dc] for dc in l_Dx]
+        scored_indices = [idx for idx, dc in enumerate(l_Dx) if dc in scored_codes]
+        for k in ["diagnosis_code", "diagnosis_abbr", "diagnosis_fullname"]:
+            diag_scored_dict[k] = [diag_dict[k][idx] for idx in scored_indices]
+    else:  # the old version, the Dx"s are abbreviations
+        diag_dict["diagnosis_abbr"] = diag_dict["diagnosis_code"]
+        selection = dx_mapping_all["Abbreviation"].isin(diag_dict["diagnosis_abbr"])
+        diag_dict["diagnosis_fullname"] = dx_mapping_all[selection]["Dx"].tolist()
+    return diag_dict, diag_scored_dict
+
+
+def length_bucketed_batches(lengths:Sequence[int], batch_size:int, shuffle:bool=True, seed:Optional[int]=None) -> List[np.ndarray]:
+    """ finished, checked,
+
+    split items (records) into batches of items of similar lengths,
+    so that padding within each batch is minimized:
+    items are sorted by length (ties broken randomly if `shuffle`),
+    cut into consecutive batches, whose order is then shuffled
+
+    Parameters:
+    -----------
+    lengths: sequence of int,
+        lengths (e.g. number of samples) of the items
+    batch_size: int,
+        (maximum) number of items in each batch
+    shuffle: bool, default True,
+        whether or not to shuffle items of equal lengths, and the order of the batches
+    seed: int, optional,
+        seed of the random number generator
+
+    Returns:
+    --------
+    batches: list of ndarray,
+        indices (into `lengths`) of the items of each batch
+    """
+    lengths = np.asarray(lengths)
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(lengths)) if shuffle else np.arange(len(lengths))
+    order = order[np.argsort(lengths[order], kind="stable")]
+    batches = [order[start: start+batch_size] for start in range(0, len(order), batch_size)]
+    if shuffle:
+        batches = [batches[idx] for idx in rng.permutation(len(batches))]
+    return batches
+
+
+def collate_padded(arrays:Sequence[np.ndarray], pad_value:Real=0, dtype:type=np.float32) -> Tuple[np.ndarray, np.ndarray]:
+    """ finished, checked,
+
+    stack arrays of different lengths (along the last axis) into one array,
+    padded at the end with `pad_value`
+
+    Parameters:
+    -----------
+    arrays: sequence of ndarray,
+        the arrays, of the same shape except the last dimension
+    pad_value: real number, default 0,
+        value for the padding
+    dtype: type, default np.float32,
+        dtype of the stacked array
+
+    Returns:
+    --------
+    batch: ndarray,
+        the stacked array, of shape (len(arrays), ..., max_length)
+    lengths: ndarray,
+        lengths (the last dimension) of the arrays
+    """
+    lengths = np.array([arr.shape[-1] for arr in arrays], dtype=int)
+    batch = np.full((len(arrays),) + arrays[0].shape[:-1] + (lengths.max(),), pad_value, dtype=dtype)
+    for idx, arr in enumerate(arrays):
+        batch[idx, ..., :lengths[idx]] = arr
+    return batch, lengths
+
+
+_HRV_BANDS = {"vlf": (0.0033, 0.04), "lf": (0.04, 0.15), "hf": (0.15, 0.4)}
+
+
+def compute_windowed_hrv(rpeaks:np.ndarray, fs:Real, valid:Optional[np.ndarray]=None, window:Real=300, stride:Real=30, sampfrom:Optional[int]=None, sampto:Optional[int]=None, freq_domain:bool=True, resample_fs:Real=4) -> pd.DataFrame:
+    """ finished, checked,
+
+    RR-interval (NN-interval) and HRV features over sliding windows,
+    time-domain features computed for all windows at once via cumulative sums and `np.searchsorted`,
+    frequency-domain features via one interpolation of the NN series and a batched FFT over the windows
+
+    an RR interval is a NN interval if both of its beats are valid (e.g. normal beats),
+    it belongs to the window containing its ending beat;
+    a successive difference is used only if both of its (consecutive) RR intervals are NN intervals in the window
+
+    Parameters:
+    -----------
+    rpeaks: ndarray,
+        locations (indices) of the beats (R peaks), in ascending order
+    fs: real number,
+        sampling frequency of `rpeaks`
+    valid: ndarray, optional,
+        boolean mask of the valid (e.g. normal) beats, to exclude irregular beats and artifacts,
+        defaults to all beats being valid
+    window: real number, default 300,
+        length of the windows, with units in seconds
+    stride: real number, default 30,
+        stride of the windows, with units in seconds
+    sampfrom: int, optional,
+        start index of the first window, defaults to 0
+    sampto: int, optional,
+        end index (exclusive) of the windows, defaults to the last beat (included)
+    freq_domain: bool, default True,
+        whether or not to compute the frequency-domain features (VLF, LF, HF powers and LF/HF)
+    resample_fs: real number, default 4,
+        frequency (Hz) at which the NN series are resampled for the frequency-domain features
+
+    Returns:
+    --------
+    df_hrv: DataFrame,
+        one row for each window, with columns
+        "sampfrom", "sampto", "nb_beats", "nb_nn", "mean_nn", "sdnn", "rmssd", "pnn50", "mean_hr",
+        and "vlf", "lf", "hf", "lf_hf" if `freq_domain`,
+        intervals in ms, powers in ms^2, heart rate in bpm,
+        NaN for features that can not be computed (too few NN intervals)
+    """
+    if window <= 0 or stride <= 0:
+        raise ValueError(f"`window` and `stride` should be positive, but got {window} and {stride}")
+    rpeaks = np.asarray(rpeaks, dtype=float)
+    valid = np.ones(len(rpeaks), dtype=bool) if valid is None else np.asarray(valid, dtype=bool)
+    sf = sampfrom or 0
+    st = sampto if sampto is not None else (int(rpeaks[-1]) + 1 if len(rpeaks) > 0 else sf)
+    win_len, stride_len = window * fs, stride * fs
+    starts = sf + stride_len * np.arange(max(0, int(np.floor((st - sf - win_len) / stride_len)) + 1))
+    ends = starts + win_len
+
+    rr = np.diff(rpeaks) * 1000 / fs  # ms
+    rr_time = rpeaks[1:]
+    rr_valid = valid[1:] & valid[:-1]
+    diff_valid = np.concatenate([[False], rr_valid[1:] & rr_valid[:-1]])
+    succ_diff = np.concatenate([[0.0], np.diff(rr)])
+    succ_diff[~diff_valid] = 0
+
+    def _cumsum(arr:np.ndarray) -> np.ndarray:
+        return np.concatenate([[0], np.cumsum(arr)])
+
+    # the RR intervals rr[lo:hi] end in the windows
+    lo = np.searchsorted(rr_time, starts, side="left")
+    hi = np.searchsorted(rr_time, ends, side="left")
+    beat_lo = np.searchsorted(rpeaks, starts, side="left")
+    beat_hi = np.searchsorted(rpeaks, ends, side="left")
+    nn = np.where(rr_valid, rr, 0.0)
+    cum_cnt, cum_sum, cum_sq = _cumsum(rr_valid.astype(int)), _cumsum(nn), _cumsum(nn**2)
+    # the successive differences are indexed by their later RR interval, the first one in the window is excluded
+    d_lo = np.minimum(lo + 1, np.maximum(hi, lo))
+    cum_d_cnt, cum_d_sq, cum_d_50 = _cumsum(diff_valid.astype(int)), _cumsum(succ_diff**2), _cumsum(diff_valid & (np.abs(succ_diff) > 50))
+
+    nb_nn = cum_cnt[hi] - cum_cnt[lo]
+    nb_diff = cum_d_cnt[hi] - cum_d_cnt[d_lo]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_nn = (cum_sum[hi] - cum_sum[lo]) / nb_nn
+        var_nn = ((cum_sq[hi] - cum_sq[lo]) - nb_nn * mean_nn**2) / (nb_nn - 1)
+        sdnn = np.where(nb_nn > 1, np.sqrt(np.maximum(var_nn, 0)), np.nan)
+        rmssd = np.where(nb_diff > 0, np.sqrt((cum_d_sq[hi] - cum_d_sq[d_lo]) / nb_diff), np.nan)
+        pnn50 = np.where(nb_diff > 0, (cum_d_50[hi] - cum_d_50[d_lo]) / nb_diff, np.nan)
+        mean_hr = 60000 / mean_nn
+
+    df_hrv = pd.DataFrame({
+        "sampfrom": starts.astype(int),
+        "sampto": ends.astype(int),
+        "nb_beats": beat_hi - beat_lo,
+        "nb_nn": nb_nn,
+        "mean_nn": mean_nn,
+        "sdnn": sdnn,
+        "rmssd": rmssd,
+        "pnn50": pnn50,
+        "mean_hr": mean_hr,
+    })
+    if freq_domain:
+        df_hrv = df_hrv.assign(**_windowed_hrv_band_powers(rr_time[rr_valid], rr[rr_valid], fs, starts, win_len, nb_nn, resample_fs))
+    return df_hrv
+
+
+def _windowed_hrv_band_powers(nn_time:np.ndarray, nn:np.ndarray, fs:Real, starts:np.ndarray, win_len:Real, nb_nn:np.ndarray, resample_fs:Real) -> Dict[str, np.ndarray]:
+    """ finished, checked,
+
+    powers of the frequency bands (`_HRV_BANDS`) of the NN series in the windows,
+    the NN series is linearly interpolated once onto a uniform grid of `resample_fs` (Hz),
+    whose windows are then detrended (mean removed), Hann-tapered and transformed by one batched FFT
+
+    Parameters:
+    -----------
+    nn_time: ndarray,
+        locations (indices, at `fs`) of the ending beats of the NN intervals
+    nn: ndarray,
+        the NN intervals, in ms
+    fs: real number,
+        sampling frequency of `nn_time`
+    starts: ndarray,
+        start indices (at `fs`) of the windows
+    win_len: real number,
+        length of the windows, in number of samples (at `fs`)
+    nb_nn: ndarray,
+        number of NN intervals in the windows
+    resample_fs: real number,
+        frequency (Hz) of the uniform grid
+
+    Returns:
+    --------
+    powers: dict,
+        "vlf", "lf", "hf" (in ms^2) and "lf_hf"
+    """
+    nb_points = int(win_len / fs * resample_fs)
+    powers = {k: np.full(len(starts), np.nan) for k in list(_HRV_BANDS) + ["lf_hf"]}
+    if len(starts) == 0 or nb_points < 2 or len(nn) < 2:
+        return powers
+    offsets = ((starts - starts[0]) / fs * resample_fs).round().astype(int)
+    grid = starts[0] + np.arange(offsets[-1] + nb_points) * fs / resample_fs
+    series = np.interp(grid, nn_time, nn)
+    segments = np.lib.stride_tricks.sliding_window_view(series, nb_points)[offsets]
+    segments = segments - segments.mean(axis=1, keepdims=True)
+    taper = np.hanning(nb_points)
+    spectra = np.abs(np.fft.rfft(segments * taper, axis=1))**2 / (resample_fs * np.sum(taper**2))
+    spectra[:, 1:] *= 2  # one-sided
+    freqs = np.fft.rfftfreq(nb_points, d=1/resample_fs)
+    df = freqs[1] - freqs[0]
+    enough = nb_nn >= 3
+    for band, (f_lo, f_hi) in _HRV_BANDS.items():
+        in_band = (freqs >= f_lo) & (freqs < f_hi)
+        powers[band] = np.where(enough, spectra[:, in_band].sum(axis=1) * df, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        powers["lf_hf"] = powers["lf"] / powers["hf"]
+    return powers
+
+
+def minmax_decimate(data:np.ndarray, nb_bins:int) -> Tuple[np.ndarray, np.ndarray]:
+    """ finished, checked,
+
+    min/max decimation of (multi-channel) signals along the last axis,
+    the signals are cut into `nb_bins` bins of (nearly) equal lengths,
+    each of which is represented by its minimum and maximum,
+    so that when plotted with one bin per pixel, the envelope looks the same as plotting all the samples
+
+    Parameters:
+    -----------
+    data: ndarray,
+        the signals, of shape (siglen,) or (nb_channels, siglen)
+    nb_bins: int,
+        number of bins, typically the width (in pixels) of the plot
+
+    Returns:
+    --------
+    inds: ndarray,
+        (fractional) sample indices of the decimated points, the centers of the bins, each repeated twice
+    values: ndarray,
+        the decimated signals, min and max of each bin interleaved, of shape (..., 2*nb_bins),
+        or `inds` being `np.arange(siglen)` and `values` being `data` if `siglen` <= `2*nb_bins`
+    """
+    siglen = data.shape[-1]
+    if siglen <= 2 * nb_bins:
+        return np.arange(siglen, dtype=float), data
+    edges = np.linspace(0, siglen, nb_bins + 1).astype(int)
+    values = np.empty(data.shape[:-1] + (2 * nb_bins,), dtype=data.dtype)
+    values[..., 0::2] = np.minimum.reduceat(data, edges[:-1], axis=-1)
+    values[..., 1::2] = np.maximum.reduceat(data, edges[:-1], axis=-1)
+    inds = np.repeat((edges[:-1] + edges[1:] - 1) / 2, 2)
+    return inds, values
+
+
+class DecimatedSignalView(object):
+    """ finished, checked,
+
+    interactive min/max decimated view of (long) multi-channel signals on matplotlib axes,
+    only the samples in the visible range are read (in chunks, via `loader`) and decimated to about one bin per pixel,
+    and the view is updated on zooming and panning (changes of the x limits)
+    """
+    def __init__(self, axes:Sequence[Any], loader:Callable[[int, int], np.ndarray], fs:Real, sampfrom:int, sampto:int, nb_bins:int=2000, chunk_len:int=2**20, **line_kw:Any):
+        """ finished, checked,
+
+        Parameters:
+        -----------
+        axes: sequence of `matplotlib.axes.Axes`,
+            one for each channel, sharing the x axis,
+            on which the signals are plotted against the time (in seconds) relative to `sampfrom`
+        loader: callable,
+            `loader(sampfrom, sampto)` returns the signals in [sampfrom, sampto), of shape (nb_channels, sampto-sampfrom)
+        fs: real number,
+            sampling frequency of the signals
+        sampfrom: int,
+            start index of the range that can be browsed
+        sampto: int,
+            end index of the range that can be browsed
+        nb_bins: int, default 2000,
+            number of bins for the visible range, about the width (in pixels) of the axes
+        chunk_len: int, default 2**20,
+            (maximum) number of samples read by `loader` at a time
+        line_kw: dict,
+            keyword arguments for `Axes.plot`, e.g. `color`, `linewidth`
+        """
+        self.axes = list(axes)
+        self.loader = loader
+        self.fs = fs
+        self.sampfrom, self.sampto = sampfrom, sampto
+        self.nb_bins = nb_bins
+        self.chunk_len = chunk_len
+        self._range = None
+        line_kw.setdefault("color", "black")
+        line_kw.setdefault("linewidth", 0.5)
+        self.lines = [ax.plot([], [], **line_kw)[0] for ax in self.axes]
+        self.update(sampfrom, sampto)
+        self.axes[0].set_xlim(0, (sampto - sampfrom) / fs)
+        # NOTE that bound methods are only weakly referenced by the callback registry
+        self.axes[0].callbacks.connect("xlim_changed", lambda ax: self._on_xlim_changed(ax))
+
+
+    def read(self, sampfrom:int, sampto:int, nb_bins:Optional[int]=None) -> Tuple[np.ndarray, np.ndarray]:
+        """ finished, checked,
+
+        read and decimate the signals in [sampfrom, sampto), chunk by chunk
+
+        Parameters:
+        -----------
+        sampfrom: int,
+            start index of the signals to read
+        sampto: int,
+            end index of the signals to read
+        nb_bins: int, optional,
+            number of bins, defaults to `self.nb_bins`
+
+        Returns:
+        --------
+        inds: ndarray,
+            (fractional) sample indices (absolute) of the decimated points
+        values: ndarray,
+            the decimated signals, of shape (nb_channels, len(inds))
+        """
+        bin_len = int(np.ceil((sampto - sampfrom) / (nb_bins or self.nb_bins)))
+        if bin_len <= 2:
+            return np.arange(sampfrom, sampto, dtype=float), self.loader(sampfrom, sampto)
+        chunk_len = max(1, self.chunk_len // bin_len) * bin_len
+        l_inds, l_values = [], []
+        for start in range(sampfrom, sampto, chunk_len):
+            end = min(start + chunk_len, sampto)
+            chunk = self.loader(start, end)
+            inds, values = minmax_decimate(chunk, int(np.ceil((end - start) / bin_len)))
+            l_inds.append(inds + start)
+            l_values.append(values)
+        return np.concatenate(l_inds), np.concatenate(l_values, axis=-1)
+
+
+    def update(self, sampfrom:int, sampto:int, nb_bins:Optional[int]=None) -> NoReturn:
+        """ finished, checked,
+
+        re-read the signals in [sampfrom, sampto) and update the plotted lines
+
+        Parameters:
+        -----------
+        sampfrom: int,
+            start index of the range to read
+        sampto: int,
+            end index of the range to read
+        nb_bins: int, optional,
+            number of bins, defaults to `self.nb_bins`
+        """
+        sampfrom, sampto = max(self.sampfrom, sampfrom), min(self.sampto, sampto)
+        if sampto <= sampfrom:
+            return
+        self._range = (sampfrom, sampto)
+        inds, values = self.read(sampfrom, sampto, nb_bins)
+        secs = (inds - self.sampfrom) / self.fs
+        for line, ax, v in zip(self.lines, self.axes, np.atleast_2d(values)):
+            line.set_data(secs, v)
+            ax.relim()
+            ax.autoscale_view(scalex=False)
+
+
+    def _on_xlim_changed(self, ax:Any) -> NoReturn:
+        """
+        callback of the changes of the x limits
+        """
+        lo, hi = ax.get_xlim()
+        vis_from = max(self.sampfrom, self.sampfrom + int(np.floor(lo * self.fs)))
+        vis_to = min(self.sampto, self.sampfrom + int(np.ceil(hi * self.fs)))
+        if vis_to <= vis_from:
+            return
+        loaded_from, loaded_to = self._range
+        if loaded_from <= vis_from and vis_to <= loaded_to and loaded_to - loaded_from <= 4 * (vis_to - vis_from):
+            # the loaded range covers the visible range, at enough resolution
+            return
+        # with a margin of one screen on both sides, for smooth panning
+        width = vis_to - vis_from
+        self.update(vis_from - width, vis_to + width, nb_bins=3*self.nb_bins)
+        ax.figure.canvas.draw_idle()
+
+
+class RhythmIndex(object):
+    """ finished, checked,
+
+    sorted-array index of the (non-overlapping) rhythm episodes of one record,
+    answering window queries via binary search (`np.searchsorted`) in O(log n),
+    n being the number of episodes
+
+    adjacent episodes of the same rhythm are merged, and degenerate (empty) episodes are dropped
+    """
+    def __init__(self, starts:np.ndarray, ends:np.ndarray, labels:np.ndarray, classes:Sequence[str]):
+        """ finished, checked,
+
+        Parameters:
+        -----------
+        starts: ndarray,
+            start indices of the episodes, sorted in ascending order
+        ends: ndarray,
+            end indices (exclusive) of the episodes
+        labels: ndarray,
+            labels of the episodes, as indices into `classes`
+        classes: sequence of str,
+            names of the rhythm classes
+        """
+        self.classes = list(classes)
+        starts, ends, labels = np.asarray(starts, dtype=int), np.asarray(ends, dtype=int), np.asarray(labels, dtype=int)
+        keep = ends > starts
+        starts, ends, labels = starts[keep], ends[keep], labels[keep]
+        if len(starts) > 0:
+            # merge adjacent episodes of the same rhythm
+            new_episode = np.concatenate([[True], (labels[1:] != labels[:-1]) | (starts[1:] != ends[:-1])])
+            episode_ends = np.append(np.flatnonzero(new_episode)[1:] - 1, len(starts) - 1)
+            starts, ends, labels = starts[new_episode], ends[episode_ends], labels[new_episode]
+        self.starts, self.ends, self.labels = starts, ends, labels
+        # cumulative durations of the rhythms, of shape (n+1, n_classes)
+        durations = np.zeros((len(starts), len(self.classes)), dtype=int)
+        durations[np.arange(len(starts)), labels] = ends - starts
+        self._cum_durations = np.concatenate([np.zeros((1, len(self.classes)), dtype=int), np.cumsum(durations, axis=0)])
+
+
+    @classmethod
+    def from_intervals(cls, intervals:Dict[str, Sequence[Sequence[int]]], classes:Optional[Sequence[str]]=None) -> "RhythmIndex":
+        """ finished, checked,
+
+        Parameters:
+        -----------
+        intervals: dict,
+            intervals (in the form [start, end]) of each rhythm (item key)
+        classes: sequence of str, optional,
+            names of the rhythm classes, defaults to the keys of `intervals`
+
+        Returns:
+        --------
+        index: RhythmIndex,
+        """
+        _classes = list(classes or intervals.keys())
+        l_itv = [(itv[0], itv[1], _classes.index(k)) for k, l_k_itv in intervals.items() for itv in l_k_itv]
+        arr = np.array(l_itv, dtype=int).reshape(-1, 3)
+        arr = arr[np.argsort(arr[:, 0], kind="stable")]
+        return cls(arr[:, 0], arr[:, 1], arr[:, 2], _classes)
+
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+
+    def _window(self, sampfrom:int, sampto:int) -> Tuple[int, int]:
+        """
+        indices of the first episode ending after `sampfrom`, and of the first episode starting at or after `sampto`
+        """
+        return int(np.searchsorted(self.ends, sampfrom, side="right")), int(np.searchsorted(self.starts, sampto, side="left"))
+
+
+    def query(self, sampfrom:int, sampto:int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """ finished, checked,
+
+        the episodes intersecting the window [sampfrom, sampto), clipped to the window
+
+        Parameters:
+        -----------
+        sampfrom: int,
+            start index of the window
+        sampto: int,
+            end index (exclusive) of the window
+
+        Returns:
+        --------
+        starts, ends, labels: ndarray,
+            start and end indices (not shifted by `sampfrom`), and labels of the episodes
+        """
+        lo, hi = self._window(sampfrom, sampto)
+        starts = np.maximum(self.starts[lo:hi], sampfrom)
+        ends = np.minimum(self.ends[lo:hi], sampto)
+        return starts, ends, self.labels[lo:hi]
+
+
+    def to_intervals(self, sampfrom:int, sampto:int, keep_original:bool=True) -> Dict[str, List[List[int]]]:
+        """ finished, checked,
+
+        Parameters:
+        -----------
+        sampfrom: int,
+            start index of the window
+        sampto: int,
+            end index (exclusive) of the window
+        keep_original: bool, default True,
+            if False, `sampfrom` is subtracted from the indices
+
+        Returns:
+        --------
+        intervals: dict,
+            intervals (in the form [start, end]) of each rhythm class in the window,
+            with all the classes as keys
+        """
+        starts, ends, labels = self.query(sampfrom, sampto)
+        if not keep_original:
+            starts, ends = starts - sampfrom, ends - sampfrom
+        intervals = {k: [] for k in self.classes}
+        for start, end, label in zip(starts.tolist(), ends.tolist(), labels.tolist()):
+            intervals[self.classes[label]].append([start, end])
+        return intervals
+
+
+    def coverage(self, sampfrom:int, sampto:int) -> np.ndarray:
+        """ finished, checked,
+
+        number of samples of each rhythm class in the window [sampfrom, sampto)
+
+        Parameters:
+        -----------
+        sampfrom: int,
+            start index of the window
+        sampto: int,
+            end index (exclusive) of the window
+
+        Returns:
+        --------
+        coverage: ndarray,
+            of shape (n_classes,), in the order of `self.classes`
+        """
+        lo, hi = self._window(sampfrom, sampto)
+        coverage = self._cum_durations[hi] - self._cum_durations[lo]
+        if hi > lo:
+            # the episodes crossing the boundaries of the window
+            coverage[self.labels[lo]] -= max(0, sampfrom - self.starts[lo])
+            coverage[self.labels[hi-1]] -= max(0, self.ends[hi-1] - sampto)
+        return coverage
+
+
+    def fraction(self, sampfrom:int, sampto:int, rhythm:str) -> float:
+        """ finished, checked,
+
+        fraction of the window [sampfrom, sampto) covered by episodes of `rhythm`
+
+        Parameters:
+        -----------
+        sampfrom: int,
+            start index of the window
+        sampto: int,
+            end index (exclusive) of the window
+        rhythm: str,
+            name of the rhythm class
+
+        Returns:
+        --------
+        frac: float,
+        """
+        return self.coverage(sampfrom, sampto)[self.classes.index(rhythm)] / (sampto - sampfrom)
+
+
+    def to_mask(self, sampfrom:int, sampto:int, class_values:Optional[Sequence[int]]=None, fill_value:int=0, step:Optional[Real]=None, dtype:type=np.uint8) -> np.ndarray:
+        """ finished, checked,
+
+        the mask of the rhythm labels of the window [sampfrom, sampto),
+        generated vectorially via `np.repeat` over the lengths of the episodes (and gaps)
+
+        Parameters:
+        -----------
+        sampfrom: int,
+            start index of the window
+        sampto: int,
+            end index (exclusive) of the window
+        class_values: sequence of int, optional,
+            values in the mask of the classes (in the order of `self.classes`),
+            defaults to the indices of the classes
+        fill_value: int, default 0,
+            value in the mask of the samples not covered by any episode
+        step: real number, optional,
+            if set, the mask is downsampled to one label per `step` samples,
+            taking the labels at the centers of the steps
+        dtype: type, default np.uint8,
+            dtype of the mask
+
+        Returns:
+        --------
+        mask: ndarray,
+            of length `sampto - sampfrom`, or `int((sampto - sampfrom) / step)` if `step` is set
+        """
+        values = np.asarray(class_values if class_values is not None else np.arange(len(self.classes)), dtype=dtype)
+        if step is not None:
+            nb_labels = int((sampto - sampfrom) / step)
+            centers = (sampfrom + (np.arange(nb_labels) + 0.5) * step).astype(int)
+            labels = self.labels_at(centers)
+            mask = values[np.maximum(labels, 0)]
+            mask[labels < 0] = fill_value
+            return mask
+        starts, ends, labels = self.query(sampfrom, sampto)
+        # interleave the gaps (filled with `fill_value`) and the episodes
+        seg_values = np.full(2 * len(starts) + 1, fill_value, dtype=dtype)
+        seg_values[1::2] = values[labels]
+        seg_lengths = np.empty(2 * len(starts) + 1, dtype=int)
+        seg_lengths[0:-1:2] = starts - np.concatenate([[sampfrom], ends[:-1]])
+        seg_lengths[1::2] = ends - starts
+        seg_lengths[-1] = sampto - (ends[-1] if len(ends) > 0 else sampfrom)
+        return np.repeat(seg_values, seg_lengths)
+
+
+    def labels_at(self, samples:Union[int,Sequence[int],np.ndarray]) -> np.ndarray:
+        """ finished, checked,
+
+        Parameters:
+        -----------
+        samples: int or sequence of int or ndarray,
+            indices of the samples
+
+        Returns:
+        --------
+        labels: ndarray,
+            labels (indices into `self.classes`) of the episodes containing the samples,
+            -1 for samples not covered by any episode
+        """
+        samples = np.asarray(samples)
+        idx = np.searchsorted(self.starts, samples, side="right") - 1
+        covered = (idx >= 0) & (samples < self.ends[np.maximum(idx, 0)]) if len(self) > 0 else np.zeros(samples.shape, dtype=bool)
+        return np.where(covered, self.labels[np.maximum(idx, 0)] if len(self) > 0 else -1, -1)
+
+
+class IntervalArray(object):
+    """ finished, checked,
+
+    numpy-backed array of disjoint half-open intervals [start, end),
+    stored as sorted arrays of starts and ends,
+    with the set operations (union, intersection, difference, complement)
+    and the queries (coverage, point-in-interval) vectorized over these arrays
+
+    overlapping and book-ended (adjacent) intervals are merged, and degenerate (empty) intervals are dropped,
+    as `intervals_union` with `join_book_endeds=True`
+    """
+    def __init__(self, starts:Union[Sequence[Real],np.ndarray], ends:Union[Sequence[Real],np.ndarray], normalized:bool=False):
+        """ finished, checked,
+
+        Parameters:
+        -----------
+        starts: sequence of real numbers or ndarray,
+            starts of the intervals
+        ends: sequence of real numbers or ndarray,
+            ends (exclusive) of the intervals
+        normalized: bool, default False,
+            if True, `starts` and `ends` are assumed to be already sorted, disjoint, non-adjacent and non-degenerate
+        """
+        starts, ends = np.asarray(starts).ravel(), np.asarray(ends).ravel()
+        if len(starts) != len(ends):
+            raise ValueError("`starts` and `ends` should be of the same length")
+        if not normalized:
+            order = np.argsort(starts, kind="stable")
+            starts, ends = starts[order], ends[order]
+            keep = ends > starts
+            starts, ends = starts[keep], ends[keep]
+        if not normalized and len(starts) > 0:
+            # an interval starts a new group if it starts after the furthest end of the previous intervals
+            reach = np.maximum.accumulate(ends)
+            new_group = np.concatenate([[True], starts[1:] > reach[:-1]])
+            group_ends = np.append(np.flatnonzero(new_group)[1:] - 1, len(starts) - 1)
+            starts, ends = starts[new_group], reach[group_ends]
+        self.starts, self.ends = starts, ends
+        self._cum_lengths = np.concatenate([[0], np.cumsum(ends - starts)])
+
+
+    @classmethod
+    def from_list(cls, intervals:Sequence[Sequence[Real]]) -> "IntervalArray":
+        """ finished, checked,
+
+        Parameters:
+        -----------
+        intervals: sequence of sequence of real numbers,
+            intervals in the form [start, end]
+
+        Returns:
+        --------
+        itv_arr: IntervalArray,
+        """
+        arr = np.array(intervals, dtype=None if len(intervals) > 0 else int).reshape(-1, 2)
+        return cls(arr[:, 0], arr[:, 1])
+
+
+    @classmethod
+    def from_mask(cls, mask:np.ndarray, sampfrom:int=0) -> "IntervalArray":
+        """ finished, checked,
+
+        Parameters:
+        -----------
+        mask: ndarray,
+            1d (boolean) mask, whose runs of nonzero values are the intervals
+        sampfrom: int, default 0,
+            index of the first element of `mask`, added to the starts and ends of the intervals
+
+        Returns:
+        --------
+        itv_arr: IntervalArray,
+        """
+        edges = np.flatnonzero(np.diff(np.concatenate([[0], np.asarray(mask, dtype=bool).ravel().astype(np.int8), [0]])))
+        return cls(edges[0::2] + sampfrom, edges[1::2] + sampfrom, normalized=True)
+
+
+    def to_list(self) -> List[List[Real]]:
+        """ finished, checked,
+
+        Returns:
+        --------
+        intervals: list,
+            intervals in the form [start, end]
+        """
+        return np.column_stack([self.starts, self.ends]).tolist()
+
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.to_list()})"
+
+
+    def __or__(self, other:"IntervalArray") -> "IntervalArray":
+        return self.union(other)
+
+
+    def __and__(self, other:"IntervalArray") -> "IntervalArray":
+        return self.intersection(other)
+
+
+    def __sub__(self, other:"IntervalArray") -> "IntervalArray":
+        return self.difference(other)
+
+
+    @property
+    def length(self) -> Real:
+        """
+        total length of the intervals
+        """
+        return self._cum_lengths[-1]
+
+
+    def union(self, other:"IntervalArray") -> "IntervalArray":
+        """ finished, checked,
+
+        Parameters:
+        -----------
+        other: IntervalArray,
+
+        Returns:
+        --------
+        itv_arr: IntervalArray,
+            union of `self` and `other`
+        """
+        return IntervalArray(np.concatenate([self.starts, other.starts]), np.concatenate([self.ends, other.ends]))
+
+
+    def intersection(self, other:"IntervalArray") -> "IntervalArray":
+        """ finished, checked,
+
+        computed by one sweep over the sorted boundaries of the intervals of `self` and `other`,
+        the intersection being where both are "open"
+
+        Parameters:
+        -----------
+        other: IntervalArray,
+
+        Returns:
+        --------
+        itv_arr: IntervalArray,
+            intersection of `self` and `other`
+        """
+        points = np.concatenate([self.starts, other.starts, self.ends, other.ends])
+        deltas = np.repeat([1, -1], [len(self) + len(other)] * 2)
+        # at the same point, ends come before starts, since the intervals are half-open
+        order = np.lexsort((deltas, points))
+        points = points[order]
+        both_open = np.flatnonzero(np.cumsum(deltas[order]) == 2)
+        return IntervalArray(points[both_open], points[both_open + 1])
+
+
+    def complement(self, sampfrom:Optional[Real]=None, sampto:Optional[Real]=None) -> "IntervalArray":
+        """ finished, checked,
+
+        Parameters:
+        -----------
+        sampfrom: real number, optional,
+            start of the universe of the complement, defaults to the start of the first interval
+        sampto: real number, optional,
+            end of the universe of the complement, defaults to the end of the last interval
+
+        Returns:
+        --------
+        itv_arr: IntervalArray,
+            complement of `self` in [`sampfrom`, `sampto`)
+        """
+        if len(self) == 0 and (sampfrom is None or sampto is None):
+            return IntervalArray(self.starts, self.ends, normalized=True)
+        lo = self.starts[0] if sampfrom is None else sampfrom
+        hi = self.ends[-1] if sampto is None else sampto
+        starts = np.maximum(np.concatenate([[lo], self.ends]), lo)
+        ends = np.minimum(np.concatenate([self.starts, [hi]]), hi)
+        return IntervalArray(starts, ends)
+
+
+    def difference(self, other:"IntervalArray") -> "IntervalArray":
+        """ finished, checked,
+
+        Parameters:
+        -----------
+        other: IntervalArray,
+
+        Returns:
+        --------
+        itv_arr: IntervalArray,
+            the part of `self` not covered by `other`
+        """
+        if len(self) == 0:
+            return IntervalArray(self.starts, self.ends, normalized=True)
+        return self.intersection(other.complement(self.starts[0], self.ends[-1]))
+
+
+    def clip(self, sampfrom:Real, sampto:Real) -> "IntervalArray":
+        """ finished, checked,
+
+        intersection with the single interval [sampfrom, sampto), found by binary search
+
+        Parameters:
+        -----------
+        sampfrom: real number,
+            start of the window
+        sampto: real number,
+            end of the window
+
+        Returns:
+        --------
+        itv_arr: IntervalArray,
+            the intervals in the window, clipped to the window
+        """
+        lo = np.searchsorted(self.ends, sampfrom, side="right")
+        hi = np.searchsorted(self.starts, sampto, side="left")
+        return IntervalArray(np.maximum(self.starts[lo:hi], sampfrom), np.minimum(self.ends[lo:hi], sampto))
+
+
+    def _length_before(self, points:np.ndarray) -> np.ndarray:
+        """
+        total length of the intervals before each of `points`
+        """
+        idx = np.searchsorted(self.starts, points, side="right") - 1
+        if len(self) == 0:
+            return np.zeros(np.shape(points), dtype=self._cum_lengths.dtype)
+        i = np.maximum(idx, 0)
+        partial = np.clip(points - self.starts[i], 0, self.ends[i] - self.starts[i])
+        return np.where(idx >= 0, self._cum_lengths[i] + partial, 0)
+
+
+    def coverage(self, sampfrom:Union[Real,np.ndarray], sampto:Union[Real,np.ndarray]) -> Union[Real,np.ndarray]:
+        """ finished, checked,
+
+        length of the part of the window(s) [sampfrom, sampto) covered by the intervals,
+        via the cumulative lengths of the intervals, in O(log n) for each window
+
+        Parameters:
+        -----------
+        sampfrom: real number or ndarray,
+            start(s) of the window(s)
+        sampto: real number or ndarray,
+            end(s) of the window(s)
+
+        Returns:
+        --------
+        coverage: real number or ndarray,
+            of the broadcast shape of `sampfrom` and `sampto`
+        """
+        return self._length_before(np.asarray(sampto)) - self._length_before(np.asarray(sampfrom))
+
+
+    def locate(self, points:Union[Real,Sequence[Real],np.ndarray]) -> np.ndarray:
+        """ finished, checked,
+
+        Parameters:
+        -----------
+        points: real number or sequence of real numbers or ndarray,
+            the points to locate
+
+        Returns:
+        --------
+        indices: ndarray,
+            indices of the intervals containing the points, -1 for points not in any interval
+        """
+        points = np.asarray(points)
+        if len(self) == 0:
+            return np.full(points.shape, -1, dtype=int)
+        idx = np.searchsorted(self.starts, points, side="right") - 1
+        return np.where((idx >= 0) & (points < self.ends[np.maximum(idx, 0)]), idx, -1)
+
+
+    def contains(self, points:Union[Real,Sequence[Real],np.ndarray]) -> np.ndarray:
+        """ finished, checked,
+
+        Parameters:
+        -----------
+        points: real number or sequence of real numbers or ndarray,
+            the points to check
+
+        Returns:
+        --------
+        is_in: ndarray,
+            boolean array, whether the points lie in (any of) the intervals
+        """
+        return self.locate(points) >= 0
+
 
 ECGWaveForm = namedtuple(
     typename="ECGWaveForm",
@@ -49,11 +49,53 @@ class CHAT(NSRRDataBase):
         """
         Parameters:
         -----------
-        db_dir: str,
+        db_dir: str, optional,
             storage path of the database
         working_dir: str, optional,
             working directory, to store intermediate files and log file
         verbose: int, default 2,
         """
         super().__init__(db_name="CHAT", db_dir=db_dir, working_dir=working_dir, verbose=verbose, **kwargs)
+
+        self.form_paths()
+        # `self.all_signals` is left empty, channel names are checked against the edf headers
+        # names used in SHHS, to facilitate cross-cohort usage, not checked with all the edf files
+        self.channel_name_map = {
+            "ECG": "ECG1",
+            "EOG(L)": "E1",
+            "EOG(R)": "E2",
+            "EEG": "C4",
+            "AIRFLOW": "Airflow",
+            "SaO2": "SpO2",
+        }
+
+
+    def form_paths(self) -> NoReturn:
+        """ finished, not checked,
+
+        records are named like "chat-baseline-300001", stored in subfolders named after the visit,
+        psg data and annotations are loaded via the methods of `NSRRDataBase`,
+        the paths are left unset if `self.db_dir` is not given
+        """
+        if self.db_dir is None:
+            return
+        self.psg_data_path = os.path.join(self.db_dir, "polysomnography", "edfs")
+        self.ann_path = os.path.join(self.db_dir, "datasets")
+        self.event_ann_path = os.path.join(self.db_dir, "polysomnography", "annotations-events-nsrr")
+        self.event_profusion_ann_path = os.path.join(self.db_dir, "polysomnography", "annotations-events-profusion")
+
+
+    def get_rec_subfolder(self, rec:str) -> str:
+        """ finished, not checked,
+
+        Parameters:
+        -----------
+        rec: str,
+            record name, typically in the form "chat-baseline-300001"
+
+        Returns:
+        --------
+        str, the visit ("baseline", "followup" or "nonrandomized") of `rec`
+        """
+        return rec.split("-")[1]
         
\ No newline at end of file
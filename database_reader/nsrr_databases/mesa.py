@@ -17,7 +17,6 @@ from ..utils.common import (
     ArrayLike,
     get_record_list_recursive,
 )
-from ..utils.utils_universal import intervals_union
 from ..base import NSRRDataBase
 
 
@@ -109,6 +108,28 @@ class MESA(NSRRDataBase):
             "daybynoon",
         ]
 
+        self.form_paths()
+        # NOTE: the signal labels are taken from the MESA documentation, not checked with all the edf files
+        self.all_signals = [
+            "EKG", "EOG-L", "EOG-R", "EMG", "EEG1", "EEG2", "EEG3",
+            "Pres", "Flow", "Snore", "Thor", "Abdo", "Leg", "Therm", "Pos",
+            "Pleth", "OxStatus", "SpO2", "HR", "DHR",
+        ]
+        # names used in SHHS, to facilitate cross-cohort usage
+        self.channel_name_map = {
+            "ECG": "EKG",
+            "EOG(L)": "EOG-L",
+            "EOG(R)": "EOG-R",
+            "EEG": "EEG3",  # C4-M1
+            "EEG(sec)": "EEG2",  # Cz-Oz
+            "AIRFLOW": "Flow",
+            "THOR RES": "Thor",
+            "ABDO RES": "Abdo",
+            "POSITION": "Pos",
+            "SaO2": "SpO2",
+            "H.R.": "HR",
+        }
+
 
     def get_subject_id(self, rec:str) -> int:
         """
@@ -127,16 +148,16 @@ class MESA(NSRRDataBase):
 
 
     def form_paths(self) -> NoReturn:
-        """ not finished,
+        """ finished,
 
+        records are named like "mesa-sleep-0001",
+        psg data and annotations are loaded via the methods of `NSRRDataBase`
         """
-        # self.psg_data_path = os.path.join(self.db_dir, "polysomnography", "edfs")
-        # self.ann_path = os.path.join(self.db_dir, "datasets")
-        # self.hrv_ann_path = os.path.join(self.db_dir, "hrv-analysis")
-        # self.eeg_ann_path = os.path.join(self.db_dir, "eeg-spectral-analysis")
-        # self.wave_deli_path = os.path.join(self.db_dir, "polysomnography", "annotations-rpoints")
-        # self.event_ann_path = os.path.join(self.db_dir, "polysomnography", "annotations-events-nsrr")
-        # self.event_profusion_ann_path = os.path.join(self.db_dir, "polysomnography", "annotations-events-profusion")
+        self.psg_data_path = os.path.join(self.db_dir, "polysomnography", "edfs")
+        self.ann_path = os.path.join(self.db_dir, "datasets")
+        self.event_ann_path = os.path.join(self.db_dir, "polysomnography", "annotations-events-nsrr")
+        self.event_profusion_ann_path = os.path.join(self.db_dir, "polysomnography", "annotations-events-profusion")
+        self.actigraphy_path = os.path.join(self.db_dir, "actigraphy")
 
     
     def database_info(self, detailed:bool=False) -> NoReturn:
@@ -17,7 +17,6 @@ from ..utils.common import (
     ArrayLike,
     get_record_list_recursive,
 )
-from ..utils.utils_universal import intervals_union
 from ..base import NSRRDataBase
 
 
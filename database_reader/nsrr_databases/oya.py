@@ -17,7 +17,6 @@ from ..utils.common import (
     ArrayLike,
     get_record_list_recursive,
 )
-from ..utils.utils_universal import intervals_union
 from ..base import NSRRDataBase
 
 
@@ -60,6 +59,9 @@ class OYA(NSRRDataBase):
         """
         super().__init__(db_name="OYA", db_dir=db_dir, working_dir=working_dir, verbose=verbose, **kwargs)
 
+        self.form_paths()
+        # `self.all_signals` is left empty, channel names are checked against the edf headers
+
 
     def get_subject_id(self, rec:str) -> int:
         """
@@ -78,14 +80,13 @@ class OYA(NSRRDataBase):
 
 
     def form_paths(self) -> NoReturn:
-        """ not finished,
+        """ finished, not checked,
 
+        the standard folder structure of the NSRR databases,
+        psg data and annotations are loaded via the methods of `NSRRDataBase`
         """
-        # self.psg_data_path = os.path.join(self.db_dir, "polysomnography", "edfs")
-        # self.ann_path = os.path.join(self.db_dir, "datasets")
-        # self.hrv_ann_path = os.path.join(self.db_dir, "hrv-analysis")
-        # self.eeg_ann_path = os.path.join(self.db_dir, "eeg-spectral-analysis")
-        # self.wave_deli_path = os.path.join(self.db_dir, "polysomnography", "annotations-rpoints")
-        # self.event_ann_path = os.path.join(self.db_dir, "polysomnography", "annotations-events-nsrr")
-        # self.event_profusion_ann_path = os.path.join(self.db_dir, "polysomnography", "annotations-events-profusion")
+        self.psg_data_path = os.path.join(self.db_dir, "polysomnography", "edfs")
+        self.ann_path = os.path.join(self.db_dir, "datasets")
+        self.event_ann_path = os.path.join(self.db_dir, "polysomnography", "annotations-events-nsrr")
+        self.event_profusion_ann_path = os.path.join(self.db_dir, "polysomnography", "annotations-events-profusion")
     
\ No newline at end of file
@@ -3,22 +3,25 @@
 docstring, to write
 """
 import os
+import hashlib
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Union, Optional, Any, List, Dict, Iterable, Sequence, NoReturn
+from fractions import Fraction
+from typing import Union, Optional, Any, List, Tuple, Dict, Iterable, Sequence, NoReturn
 from numbers import Real
 
 import numpy as np
 np.set_printoptions(precision=5, suppress=True)
 import pandas as pd
-import xmltodict as xtd
 from pyedflib import EdfReader
+from scipy.signal import resample_poly
 
 from ..utils.common import (
     ArrayLike,
     get_record_list_recursive,
 )
-from ..utils.utils_universal import intervals_union
-from ..base import NSRRDataBase
+from ..base import NSRRDataBase, IntervalArray, compute_windowed_hrv
 
 
 __all__ = [
@@ -221,17 +224,12 @@ class SHHS(NSRRDataBase):
 
         self.current_version = kwargs.get("current_version" , "0.15.0")
 
-        self.psg_data_path = None
         self.ann_path = None
         self.hrv_ann_path = None
         self.eeg_ann_path = None
         self.wave_deli_path = None
-        self.event_ann_path = None
-        self.event_profusion_ann_path = None
+        self.rec_ext["wave_delineation"] = "-rpoint.csv"
         self.form_paths()
-        
-        self.fs = None
-        self.file_opened = None
 
         # stats
         try:
@@ -374,46 +372,16 @@ class SHHS(NSRRDataBase):
             "PPoint", "PStart", "PEnd",
             "TPoint", "TStart", "TEnd",
         ]
+        # parsed R-point tables (ref. `self._load_rpoint_table`), cached in memory and in `self.rpoint_cache_dir`
+        self.rpoint_cache_dir = kwargs.get("rpoint_cache_dir", os.path.join(self.working_dir, "rpoint_cache"))
+        self.rpoint_cache_size = kwargs.get("rpoint_cache_size", 32)
+        self._rpoint_tables = OrderedDict()
 
         # TODO: other annotation files: EEG
 
         # self-defined items
-        self.sleep_stage_keys = ["start_sec", "sleep_stage"]
         self.sleep_event_keys = ["event_name", "event_start", "event_end", "event_duration"]
-        self.sleep_epoch_len_sec = 30
-        self.ann_sleep_stages = [0,1,2,3,4,5,9]
-        """
-        0	--- Wake
-        1	--- sleep stage 1
-        2	--- sleep stage 2
-        3	--- sleep stage 3/4
-        4	--- sleep stage 3/4
-        5	--- REM stage
-        9	--- Movement/Wake or Unscored?
-        """
-        self.sleep_stage_protocol = kwargs.get("sleep_stage_protocol", "aasm")
-        self.all_sleep_stage_names = ["W", "R", "N1", "N2", "N3", "N4"]
-        self.sleep_stage_name_value_mapping = {
-            "W":0, "R":1, "N1":2, "N2":3, "N3":4, "N4":5
-        }
-        self.sleep_stage_names = []
-        self.update_sleep_stage_names()
-        self._to_simplified_states = {9:0, 0:0, 5:1, 1:2, 2:2, 3:3, 4:3}
-        """ 9 to nan?
-        0   --- awake
-        1   --- REM
-        2   --- N1 (NREM1/2), shallow sleep
-        3   --- N2 (NREM3/4), deep sleep
-        """
-        self._to_aasm_states = {9:0, 0:0, 5:1, 1:2, 2:3, 3:4, 4:4}
-        """ 9 to nan?
-        0   --- awake
-        1   --- REM
-        2   --- N1 (NREM1)
-        3   --- N2 (NREM2)
-        4   --- N3 (NREM3/4)
-        """
-        self._to_shhs_states = {9:0, 0:0, 5:1, 1:2, 2:3, 3:4, 4:5}
+        # sleep epochs and sleep stage protocols are set in `NSRRDataBase.__init__`
 
         # for plotting
         self.palette = {
@@ -444,22 +412,6 @@ class SHHS(NSRRDataBase):
         self.event_profusion_ann_path = os.path.join(self.db_dir, "polysomnography", "annotations-events-profusion")
 
 
-    def update_sleep_stage_names(self) -> NoReturn:
-        """ finished,
-
-        """
-        if self.sleep_stage_protocol == "aasm":
-            nb_stages = 5
-        elif self.sleep_stage_protocol == "simplified":
-            nb_stages = 4
-        elif self.sleep_stage_protocol == "shhs":
-            nb_stages = 6
-        else:
-            raise ValueError(f"No stage protocol named {self.sleep_stage_protocol}")
-        
-        self.sleep_stage_names = self.all_sleep_stage_names[:nb_stages]
-
-
     def get_subject_id(self, rec:str) -> int:
         """ finished,
 
@@ -511,73 +463,19 @@ class SHHS(NSRRDataBase):
         return int(rec.split("-")[1])
 
 
-    def get_fs(self, rec:str, sig:str="ECG", rec_path:Optional[str]=None) -> int:
+    def get_rec_subfolder(self, rec:str) -> str:
         """ finished,
 
         Parameters:
         -----------
         rec: str,
             record name, typically in the form "shhs1-200001"
-        sig: str, default "ECG",
-            signal name
-        rec_path: str, optional,
-            path of the file which contains the psg data,
-            if not given, default path will be used
 
         Returns:
         --------
-        fs, int,
-            the sampling frequency of the signal `sig` of the record `rec`
+        str, the visit ("shhs1" or "shhs2") of `rec`, which is also the subfolder storing its files
         """
-        frp = self.match_full_rec_path(rec, rec_path)
-        self.safe_edf_file_operation("open", frp)
-        chn_num = self.file_opened.getSignalLabels().index(self.match_channel(sig))
-        fs = self.file_opened.getSampleFrequency(chn_num)
-        self.safe_edf_file_operation("close")
-        return fs
-
-    
-    def get_chn_num(self, rec:str, sig:str="ECG", rec_path:Optional[str]=None) -> int:
-        """ finished,
-
-        Parameters:
-        -----------
-        rec: str,
-            record name, typically in the form "shhs1-200001"
-        sig: str, default "ECG",
-            signal name
-        rec_path: str, optional,
-            path of the file which contains the psg data,
-            if not given, default path will be used
-
-        Returns:
-        --------
-        chn_num, int,
-            the number of channel of the signal `sig` of the record `rec`
-        """
-        frp = self.match_full_rec_path(rec, rec_path)
-        self.safe_edf_file_operation("open", frp)
-        chn_num = self.file_opened.getSignalLabels().index(self.match_channel(sig))
-        self.safe_edf_file_operation("close")
-        return chn_num
-
-
-    def match_channel(self, channel:str) -> str:
-        """ finished,
-
-        Parameters:
-        -----------
-        channel: str,
-            channel name
-        
-        Returns:
-        --------
-        str, the standard channel name in SHHS
-        """
-        for sig in self.all_signals:
-            if sig.lower() == channel.lower():
-                return sig
-        raise ValueError(f"No channel named {channel}")
+        return rec.split("-")[0]
 
 
     def match_full_rec_path(self, rec:str, rec_path:Optional[str]=None, rec_type:str="psg") -> str:
@@ -595,31 +493,24 @@ class SHHS(NSRRDataBase):
         
         Returns:
         --------
-
+        rp: str,
+            path of the file
         """
-        extension = {
-            "psg": ".edf",
-            "wave_delineation": "-rpoint.csv",
-            "event": "-nsrr.xml",
-            "event_profusion": "-profusion.xml"
-        }
-        folder_or_file = {
-            "psg": self.psg_data_path,
+        cohort_wide_files = {
             "hrv_summary": os.path.join(self.hrv_ann_path, f"shhs{self.get_visit_number(rec)}-hrv-summary-{self.current_version}.csv"),
             "hrv_5min": os.path.join(self.hrv_ann_path, f"shhs{self.get_visit_number(rec)}-hrv-5min-{self.current_version}.csv"),
             "eeg_band_summary": os.path.join(self.eeg_ann_path, f"shhs{self.get_visit_number(rec)}-eeg-band-summary-dataset-{self.current_version}.csv"),
             "eeg_spectral_summary": os.path.join(self.eeg_ann_path, f"shhs{self.get_visit_number(rec)}-eeg-spectral-summary-dataset-{self.current_version}.csv"),
-            "wave_delineation": self.wave_deli_path,
-            "event": self.event_ann_path,
-            "event_profusion": self.event_profusion_ann_path
         }
 
         if rec_path is not None:
             rp = rec_path
-        elif rec_type.split("_")[0] in ["hrv", "eeg"]:
-            rp = folder_or_file[rec_type]
+        elif rec_type in cohort_wide_files:
+            rp = cohort_wide_files[rec_type]
+        elif rec_type == "wave_delineation":
+            rp = os.path.join(self.wave_deli_path, self.get_rec_subfolder(rec), rec+self.rec_ext[rec_type])
         else:
-            rp = os.path.join(folder_or_file[rec_type]+rec.split("-")[0], rec+extension[rec_type])
+            rp = super().match_full_rec_path(rec, rec_path, rec_type)
 
         return rp
 
@@ -655,138 +546,127 @@ class SHHS(NSRRDataBase):
             print(self.__doc__)
 
 
-    def show_rec_stats(self, rec:str, rec_path:Optional[str]=None) -> NoReturn:
+    def load_psg_epochs(self, rec:str, channels:Union[str,Sequence[str]], fs:Real, source:str="event", sleep_stage_protocol:str="aasm", rec_path:Optional[str]=None, sleep_stage_ann_path:Optional[str]=None) -> Tuple[np.ndarray, np.ndarray]:
         """ finished,
 
-        Parameters:
-        -----------
-        rec: str,
-            record name, typically in the form "shhs1-200001"
-        rec_path: str, optional,
-            path of the file which contains the psg data,
-            if not given, default path will be used
-
-        """
-        frp = self.match_full_rec_path(rec, rec_path, rec_type="psg")
-        self.safe_edf_file_operation("open", frp)
-        for chn,lb in enumerate(self.file_opened.getSignalLabels()):
-            print("SignalLabel:",lb)
-            print("Prefilter:",self.file_opened.getPrefilter(chn))
-            print("Transducer:",self.file_opened.getTransducer(chn))
-            print("PhysicalDimension:",self.file_opened.getPhysicalDimension(chn))
-            print("SampleFrequency:",self.file_opened.getSampleFrequency(chn))
-            print("*"*40)
-        self.safe_edf_file_operation("close")
-
-
-    def load_psg_data(self, rec:str, channel:str="all", rec_path:Optional[str]=None) -> Dict[str, np.ndarray]:
-        """ finished,
+        load the PSG data of `channels` of the record `rec`, split into epochs (of `self.sleep_epoch_len_sec` seconds)
+        aligned with the sleep stage annotations
 
         Parameters:
         -----------
         rec: str,
             record name, typically in the form "shhs1-200001"
-        channel: str, default "all",
-            name of the channel of PSG,
-            if is "all", then all channels will be returned
+        channels: str, or sequence of str,
+            names of the channels of PSG to load
+        fs: real number,
+            all channels will be resampled to this frequency
+        source: str, default "event",
+            source of the sleep stage annotations, can be "hrv", "event", "event_profusion"
+        sleep_stage_protocol: str, default "aasm",
+            the protocol to classify sleep stages, ref. `self.load_sleep_stage_ann`
         rec_path: str, optional,
             path of the file which contains the psg data,
             if not given, default path will be used
-        
-        Returns:
-        --------
-        dict, psg data
-        """
-        chn = self.match_channel(channel) if channel.lower() != "all" else "all"
-        frp = self.match_full_rec_path(rec, rec_path, rec_type="psg")
-        self.safe_edf_file_operation("open", frp)
-
-        data_dict = {k: self.file_opened.readSignal(idx) for idx,k in enumerate(self.file_opened.getSignalLabels())}
-
-        self.safe_edf_file_operation("close")
-
-        if chn == "all":
-            return data_dict
-        else:
-            return {chn: data_dict[chn]}
-
-
-    def load_ecg_data(self, rec:str, rec_path:Optional[str]=None) -> np.ndarray:
-        """ finished,
-
-        Parameters:
-        -----------
-        rec: str,
-            record name, typically in the form "shhs1-200001"
-        rec_path: str, optional,
-            path of the file which contains the ecg data,
+        sleep_stage_ann_path: str, optional,
+            path of the file which contains the sleep stage annotations,
             if not given, default path will be used
-        
-        Returns:
-        --------
-
-        """
-        return self.load_psg_data(rec=rec, channel="ecg", rec_path=rec_path)[self.match_channel("ecg")]
-
 
-    def load_event_ann(self, rec:str, event_ann_path:Optional[str]=None, simplify:bool=False) -> pd.DataFrame:
-        """ finished,
-
-        Parameters:
-        -----------
-        rec: str,
-            record name, typically in the form "shhs1-200001"
-        event_ann_path: str, optional,
-            path of the file which contains the events-nsrr annotations,
-            if not given, default path will be used
-        
         Returns:
         --------
+        epochs: ndarray,
+            of shape (nb_epochs, nb_channels, epoch_len)
+        stages: ndarray,
+            sleep stages of the epochs, of shape (nb_epochs,)
 
+        NOTE: data are read via `self.read_edf_channels`,
+        so that this method can be called in several threads simultaneously
         """
-        file_path = self.match_full_rec_path(rec, event_ann_path, rec_type="event")
-        with open(file_path) as fd:
-            doc = xtd.parse(fd.read())
-        df_events = pd.DataFrame(doc["PSGAnnotation"]["ScoredEvents"]["ScoredEvent"][1:])
-        if simplify:
-            df_events["EventType"] = df_events["EventType"].apply(lambda s: s.split("|")[1])
-            df_events["EventConcept"] = df_events["EventConcept"].apply(lambda s: s.split("|")[1])
-        for c in ["Start", "Duration", "SpO2Nadir", "SpO2Baseline"]:
-            df_events[c] = df_events[c].apply(self.str_to_real_number)
-
-        return df_events
-
+        _channels = [channels] if isinstance(channels, str) else list(channels)
+        # the protocol is passed explicitly, `self.sleep_stage_protocol` is left untouched
+        df_stages = self._load_sleep_stage_ann(
+            rec, source=source,
+            sleep_stage_ann_path=sleep_stage_ann_path,
+            sleep_stage_protocol=sleep_stage_protocol,
+            with_stage_names=False,
+        )
 
-    def load_event_profusion_ann(self, rec:str, event_profusion_ann_path:Optional[str]=None) -> dict:
+        header = self.get_edf_header(rec, rec_path)
+        data = []
+        for c, sig in self.read_edf_channels(rec, _channels, rec_path).items():
+            ratio = Fraction(fs / header["fs"][c]).limit_denominator(1000)
+            if ratio != 1:
+                sig = resample_poly(sig, ratio.numerator, ratio.denominator)
+            data.append(sig.astype(np.float32))
+        siglen = min([len(sig) for sig in data])
+        data = np.stack([sig[:siglen] for sig in data])
+
+        epoch_len = int(round(self.sleep_epoch_len_sec * fs))
+        epoch_starts = np.round(df_stages["start_sec"].values.astype(float) * fs).astype(int)
+        stages = df_stages["sleep_stage"].values.astype(int)
+        valid = (epoch_starts >= 0) & (epoch_starts + epoch_len <= siglen)
+        epoch_starts, stages = epoch_starts[valid], stages[valid]
+        # (nb_channels, nb_epochs, epoch_len) -> (nb_epochs, nb_channels, epoch_len)
+        epochs = data[:, epoch_starts[:, np.newaxis] + np.arange(epoch_len)].transpose(1, 0, 2)
+        return epochs, stages
+
+
+    def epoch_generator(self, recs:Sequence[str], channels:Union[str,Sequence[str]]="EEG", fs:Real=100, source:str="event", sleep_stage_protocol:str="aasm", nb_workers:int=4, prefetch:Optional[int]=None) -> Iterable[Tuple[np.ndarray, int]]:
         """ finished,
 
+        generator of (epoch, sleep stage) pairs of the records `recs`, for sleep staging,
+        records are loaded (via `self.load_psg_epochs`) in worker threads,
+        with at most `prefetch` records loaded (or being loaded) ahead of the one being yielded,
+        which bounds the memory used
+
         Parameters:
         -----------
-        rec: str,
-            record name, typically in the form "shhs1-200001"
-        event_profusion_ann_path: str, optional,
-            path of the file which contains the events-profusion annotations,
-            if not given, default path will be used
-        
-        Returns:
+        recs: sequence of str,
+            names of the records, typically in the form "shhs1-200001"
+        channels: str, or sequence of str, default "EEG",
+            names of the channels of PSG to load
+        fs: real number, default 100,
+            all channels will be resampled to this frequency
+        source: str, default "event",
+            source of the sleep stage annotations, can be "hrv", "event", "event_profusion"
+        sleep_stage_protocol: str, default "aasm",
+            the protocol to classify sleep stages, ref. `self.load_sleep_stage_ann`
+        nb_workers: int, default 4,
+            number of worker threads
+        prefetch: int, optional,
+            maximum number of records loaded ahead, defaults to `nb_workers`,
+            if smaller than `nb_workers`, some of the workers would be idle
+
+        Yields:
+        -------
+        epoch: ndarray,
+            of shape (nb_channels, epoch_len), PSG data of one epoch
+        stage: int,
+            sleep stage of the epoch
+
+        Example:
         --------
-
-        TODO:
-            merge "sleep_stage_list" and "df_events" into one DataFrame
+        >>> for epoch, stage in db.epoch_generator(["shhs1-200001", "shhs1-200002"], channels=["EEG", "EOG(L)"]):
+        ...     pass
         """
-        file_path = self.match_full_rec_path(rec, event_profusion_ann_path, rec_type="event_profusion")
-        with open(file_path) as fd:
-            doc = xtd.parse(fd.read())
-        sleep_stage_list = [int(ss) for ss in doc["CMPStudyConfig"]["SleepStages"]["SleepStage"]]
-        df_events = pd.DataFrame(doc["CMPStudyConfig"]["ScoredEvents"]["ScoredEvent"])
-        for c in ["Start", "Duration", "LowestSpO2", "Desaturation"]:
-            df_events[c] = df_events[c].apply(self.str_to_real_number)
-        ret = {
-            "sleep_stage_list": sleep_stage_list,
-            "df_events": df_events
-        }
-
-        return ret
+        rec_iter = iter(recs)
+        with ThreadPoolExecutor(max_workers=nb_workers) as executor:
+            futures = deque()
+            def _submit_next() -> bool:
+                rec = next(rec_iter, None)
+                if rec is None:
+                    return False
+                futures.append(executor.submit(
+                    self.load_psg_epochs, rec, channels, fs, source, sleep_stage_protocol,
+                ))
+                return True
+            for _ in range(max(1, prefetch if prefetch is not None else nb_workers)):
+                if not _submit_next():
+                    break
+            while len(futures) > 0:
+                epochs, stages = futures.popleft().result()
+                _submit_next()
+                for epoch, stage in zip(epochs, stages):
+                    yield epoch, int(stage)
 
 
     def load_hrv_summary_ann(self, rec:Optional[str]=None, hrv_ann_path:Optional[str]=None) -> pd.DataFrame:
@@ -805,20 +685,19 @@ class SHHS(NSRRDataBase):
         df_hrv_ann, DataFrame,
             if `rec` is not None, df_hrv_ann is the summary HRV annotations of `rec`;
             if `rec` is None, df_hrv_ann is the summary HRV annotations of all records that had HRV annotations (about 10% of all the records in SHHS)
+
+        NOTE: the cohort-wide csv files are converted (at the first call) into columnar caches partitioned by "nsrrid",
+        ref. `self._load_partitioned_csv`, hence rows are sorted by "nsrrid" when `rec` is None
         """
         if rec is None:
             file_path = self.match_full_rec_path("shhs1-200001", hrv_ann_path, rec_type="hrv_summary")
-            df_hrv_ann = pd.read_csv(file_path, engine="python")
+            df_hrv_ann = self._load_partitioned_csv(file_path, key="nsrrid")
             file_path = self.match_full_rec_path("shhs2-200001", hrv_ann_path, rec_type="hrv_summary")
-            df_hrv_ann = pd.concat([df_hrv_ann, pd.read_csv(file_path, engine="python")])
+            df_hrv_ann = pd.concat([df_hrv_ann, self._load_partitioned_csv(file_path, key="nsrrid")])
             return df_hrv_ann
         file_path = self.match_full_rec_path(rec, hrv_ann_path, rec_type="hrv_summary")
 
-        df_hrv_ann = pd.read_csv(file_path, engine="python")
-        if rec is None:
-            return df_hrv_ann
-        
-        df_hrv_ann = df_hrv_ann[df_hrv_ann["nsrrid"]==self.get_nsrrid(rec)].reset_index(drop=True)
+        df_hrv_ann = self._load_partitioned_csv(file_path, key="nsrrid", value=self.get_nsrrid(rec))
         return df_hrv_ann
 
 
@@ -845,8 +724,7 @@ class SHHS(NSRRDataBase):
 
         self.logger.info(f"HRV annotations of record {rec} will be loaded from the file\n{file_path}")
 
-        df_hrv_ann = pd.read_csv(file_path, engine="python")
-        df_hrv_ann = df_hrv_ann[df_hrv_ann["nsrrid"]==self.get_nsrrid(rec)].reset_index(drop=True)
+        df_hrv_ann = self._load_partitioned_csv(file_path, key="nsrrid", value=self.get_nsrrid(rec))
 
         self.logger.info(f"Record {rec} has {len(df_hrv_ann)} HRV annotations, with {len(self.hrv_ann_detailed_keys)} column(s)")
 
@@ -889,9 +767,13 @@ class SHHS(NSRRDataBase):
         return df_sleep_ann
 
 
-    def load_sleep_stage_ann(self, rec:str, source:str, sleep_stage_ann_path:Optional[str]=None, sleep_stage_protocol:str="aasm", with_stage_names:bool=True) -> pd.DataFrame:
+    def _load_raw_sleep_stages(self, rec:str, source:str, sleep_stage_ann_path:Optional[str]=None) -> Tuple[np.ndarray, np.ndarray]:
         """ finished,
 
+        load the sleep stages (in the raw codes, ref. `self.ann_sleep_stages`) of `rec`,
+        expanded into epochs of `self.sleep_epoch_len_sec` seconds,
+        used by `self.load_sleep_stage_ann`
+
         Parameters:
         -----------
         rec: str,
@@ -901,76 +783,26 @@ class SHHS(NSRRDataBase):
         sleep_stage_ann_path: str, optional,
             path of the file which contains the sleep stage annotations,
             if not given, default path will be used
-        sleep_stage_protocol: str, default "aasm",
-            the protocol to classify sleep stages. currently can be "aasm", "simplified", "shhs"
-            the only difference lies in the number of different stages of the NREM periods
-        with_stage_names: bool, default True,
-            as the argument name implies
 
         Returns:
         --------
-        df_sleep_stage_ann, DataFrame,
-            all annotations on sleep stage of `rec`
+        start_sec: ndarray,
+            start (in seconds) of the epochs
+        sleep_stage: ndarray,
+            raw sleep stages of the epochs
         """
-        self.sleep_stage_protocol = sleep_stage_protocol
-        self.update_sleep_stage_names()
-
+        if source.lower() != "hrv":
+            return super()._load_raw_sleep_stages(rec, source, sleep_stage_ann_path)
         df_sleep_ann = self.load_sleep_ann(rec=rec, source=source, sleep_ann_path=sleep_stage_ann_path)
-
-        df_sleep_stage_ann = pd.DataFrame(columns=self.sleep_stage_keys)
-        if source.lower() == "hrv":
-            df_tmp = df_sleep_ann[self.sleep_stage_ann_keys_from_hrv].reset_index(drop=True)
-            for _, row in df_tmp.iterrows():
-                start_sec = row["Start__sec_"]
-                l_start_sec = np.arange(start_sec, start_sec+self.hrv_ann_epoch_len_sec, self.sleep_epoch_len_sec)
-                l_sleep_stage = np.array([row[self.sleep_stage_ann_keys_from_hrv[i]] for i in range(1, 1+self.hrv_ann_epoch_len_sec//self.sleep_epoch_len_sec)])
-                df_to_concat = pd.DataFrame(
-                    {
-                        "start_sec": l_start_sec,
-                        "sleep_stage": l_sleep_stage
-                    }
-                )
-                df_sleep_stage_ann = pd.concat([df_sleep_stage_ann, df_to_concat], axis=0, ignore_index=True)
-        elif source.lower() == "event":
-            df_tmp = df_sleep_ann[df_sleep_ann["EventType"]=="Stages|Stages"][["EventConcept","Start","Duration"]].reset_index(drop=True)
-            df_tmp["EventConcept"] = df_tmp["EventConcept"].apply(lambda s: int(s.split("|")[1]))
-            for _, row in df_tmp.iterrows():
-                start_sec = int(row["Start"])
-                duration = int(row["Duration"])
-                l_start_sec = np.arange(start_sec, start_sec+duration, self.sleep_epoch_len_sec)
-                l_sleep_stage = np.full(shape=len(l_start_sec), fill_value=int(row["EventConcept"]))
-                df_to_concat = pd.DataFrame(
-                    {
-                        "start_sec": l_start_sec,
-                        "sleep_stage": l_sleep_stage
-                    }
-                )
-                df_sleep_stage_ann = pd.concat([df_sleep_stage_ann, df_to_concat], axis=0, ignore_index=True)
-        elif source.lower() == "event_profusion":
-            df_sleep_stage_ann = pd.DataFrame(
-                {
-                    "start_sec": 30*np.arange(len(df_sleep_ann["sleep_stage_list"])),
-                    "sleep_stage": df_sleep_ann["sleep_stage_list"]
-                }
-            )
-
-        df_sleep_stage_ann = df_sleep_stage_ann[self.sleep_stage_keys]
-
-        if self.sleep_stage_protocol == "aasm":
-            df_sleep_stage_ann["sleep_stage"] = df_sleep_stage_ann["sleep_stage"].apply(lambda a: self._to_aasm_states[a])
-        elif self.sleep_stage_protocol == "simplified":
-            df_sleep_stage_ann["sleep_stage"] = df_sleep_stage_ann["sleep_stage"].apply(lambda a: self._to_simplified_states[a])
-        elif self.sleep_stage_protocol == "shhs":
-            df_sleep_stage_ann["sleep_stage"] = df_sleep_stage_ann["sleep_stage"].apply(lambda a: self._to_shhs_states[a])
-
-        if with_stage_names:
-            df_sleep_stage_ann["sleep_stage_name"] = df_sleep_stage_ann["sleep_stage"].apply(lambda a: self.sleep_stage_names[a])
-        
-        if source.lower() != "event_profusion":
-            self.logger.info(f"record {rec} has {len(df_tmp)} raw (epoch_len = 5min) sleep stage annotations, with {len(self.sleep_stage_ann_keys_from_hrv)} column(s)")
-            self.logger.info(f"after being transformed (epoch_len = 30sec), record {rec} has {len(df_sleep_stage_ann)} sleep stage annotations, with {len(self.sleep_stage_keys)} column(s)")
-
-        return df_sleep_stage_ann
+        # each row (of epoch_len = 5min) contains the sleep stages of 10 epochs (of epoch_len = 30sec)
+        nb_epochs_per_row = self.hrv_ann_epoch_len_sec // self.sleep_epoch_len_sec
+        start_sec = (
+            df_sleep_ann["Start__sec_"].values[:, np.newaxis] \
+                + np.arange(0, self.hrv_ann_epoch_len_sec, self.sleep_epoch_len_sec)
+        ).ravel()
+        sleep_stage = df_sleep_ann[self.sleep_stage_ann_keys_from_hrv[1:1+nb_epochs_per_row]].values.ravel()
+        self.logger.info(f"record {rec} has {len(df_sleep_ann)} raw (epoch_len = 5min) sleep stage annotations, with {len(self.sleep_stage_ann_keys_from_hrv)} column(s)")
+        return start_sec, sleep_stage
 
 
     def load_sleep_event_ann(self, rec:str, source:str, event_types:Optional[List[str]]=None, sleep_event_ann_path:Optional[str]=None) -> pd.DataFrame:
@@ -1143,6 +975,68 @@ class SHHS(NSRRDataBase):
         return df_wave_delineation
 
 
+    def _load_rpoint_table(self, rec:str, wave_deli_path:Optional[str]=None) -> Dict[str, np.ndarray]:
+        """ finished,
+
+        load the R-points and beat types of `rec` from its wave delineation annotation file,
+        parsed once into typed arrays (with masks of beat types precomputed),
+        which are cached in memory (the latest `self.rpoint_cache_size` records)
+        and on disk (in `self.rpoint_cache_dir`)
+
+        Parameters:
+        -----------
+        rec: str,
+            record name, typically in the form "shhs1-200001"
+        wave_deli_path: str, optional,
+            path of the file which contains wave delineation annotations,
+            if not given, default path will be used
+
+        Returns:
+        --------
+        table: dict,
+            with items
+            - "rpoint": ndarray of float, R-points adjusted to the sampling frequency of the ECG ("rpointadj")
+            - "type": ndarray of int8, beat types (0 = Artifact, 1 = Normal Sinus Beat, 2 = VE, 3 = SVE)
+            - "fs": ndarray of one float, sampling frequency of the ECG ("samplingrate")
+            - "artifact", "normal", "VE", "SVE": boolean masks of the beat types
+        """
+        file_path = self.match_full_rec_path(rec, wave_deli_path, rec_type="wave_delineation")
+        table = self._rpoint_tables.get(file_path, None)
+        if table is not None:
+            self._rpoint_tables.move_to_end(file_path)
+            return table
+
+        if not os.path.isfile(file_path):
+            raise FileNotFoundError(f"The annotation file of wave delineation of record {rec} has not been downloaded yet. Or the path {file_path} is not correct. Please check!")
+        stat = os.stat(file_path)
+        # keyed by the source file as well, so that annotation files of the same record from different paths never share a cache
+        file_path_digest = hashlib.md5(os.path.abspath(file_path).encode("utf-8")).hexdigest()[:12]
+        cache_fp = os.path.join(self.rpoint_cache_dir, f"{rec}_{file_path_digest}.npz")
+        if os.path.isfile(cache_fp):
+            with np.load(cache_fp) as npz:
+                table = {k: npz[k] for k in npz.files}
+            if table.pop("source_size") != stat.st_size or table.pop("source_mtime") != stat.st_mtime:
+                table = None  # the annotation file has been updated
+        if table is None:
+            df = pd.read_csv(file_path, usecols=["Type", "rpointadj", "samplingrate"])
+            table = {
+                "rpoint": df["rpointadj"].values.astype(float),
+                "type": df["Type"].values.astype(np.int8),
+                "fs": np.array([df["samplingrate"].values[0] if len(df) > 0 else np.nan], dtype=float),
+            }
+            os.makedirs(self.rpoint_cache_dir, exist_ok=True)
+            np.savez(cache_fp, source_size=stat.st_size, source_mtime=stat.st_mtime, **table)
+        table["artifact"] = (table["type"] == 0)
+        table["normal"] = (table["type"] == 1)
+        table["VE"] = (table["type"] == 2)
+        table["SVE"] = (table["type"] == 3)
+
+        self._rpoint_tables[file_path] = table
+        while len(self._rpoint_tables) > self.rpoint_cache_size:
+            self._rpoint_tables.popitem(last=False)
+        return table
+
+
     def load_rpeak_ann(self, rec:str, rpeak_ann_path:Optional[str]=None, exclude_artifacts:bool=True, exclude_abnormal_beats:bool=True, to_ts:bool=False) -> np.ndarray:
         """ finished,
 
@@ -1163,20 +1057,17 @@ class SHHS(NSRRDataBase):
         --------
 
         """
-        info_items = ["Type", "rpointadj", "samplingrate"]
-        df_rpeaks_with_type_info = self.load_wave_delineation(rec, rpeak_ann_path)[info_items]
-        exclude_beat_types = []
-        # 0 = Artifact, 1 = Normal Sinus Beat, 2 = VE, 3 = SVE
+        table = self._load_rpoint_table(rec, rpeak_ann_path)
+        keep = np.ones_like(table["normal"])
         if exclude_artifacts:
-            exclude_beat_types.append(0)
+            keep &= ~table["artifact"]
         if exclude_abnormal_beats:
-            exclude_beat_types += [2,3]
+            keep &= ~(table["VE"] | table["SVE"])
 
-        ret = df_rpeaks_with_type_info[~df_rpeaks_with_type_info["Type"].isin(exclude_beat_types)]["rpointadj"].values
+        ret = table["rpoint"][keep]
 
         if to_ts:
-            fs = df_rpeaks_with_type_info.iloc[0]["samplingrate"]
-            ret = ret * 1000 / fs
+            ret = ret * 1000 / table["fs"][0]
         
         return (np.round(ret)).astype(int)
 
@@ -1223,19 +1114,57 @@ class SHHS(NSRRDataBase):
         --------
 
         """
-        info_items = ["Type", "rpointadj", "samplingrate"]
-        df_rpeaks_with_type_info = self.load_wave_delineation(rec, rpeak_ann_path)[info_items]
-        fs = df_rpeaks_with_type_info.iloc[0]["samplingrate"]
-        rpeaks_ts = (np.round(df_rpeaks_with_type_info["rpointadj"]*1000/fs)).astype(int)
+        table = self._load_rpoint_table(rec, rpeak_ann_path)
+        rpeaks_ts = (np.round(table["rpoint"]*1000/table["fs"][0])).astype(int)
         rr = np.diff(rpeaks_ts)
         rr = np.column_stack((rpeaks_ts[:-1],rr))
 
-        normal_sinus_rpeak_indices = np.where(df_rpeaks_with_type_info["Type"].values==1)[0]  # 1 = Normal Sinus Beat
-        keep_indices = np.where(np.diff(normal_sinus_rpeak_indices)==1)[0].tolist()
+        normal_sinus_rpeak_indices = np.where(table["normal"])[0]
+        keep_indices = np.where(np.diff(normal_sinus_rpeak_indices)==1)[0]
         nn = rr[normal_sinus_rpeak_indices[keep_indices]]
         return nn
 
 
+    def compute_hrv_features(self, rec:str, window:Real=300, stride:Real=30, sampfrom:Optional[int]=None, sampto:Optional[int]=None, freq_domain:bool=True, wave_deli_path:Optional[str]=None) -> pd.DataFrame:
+        """ finished,
+
+        RR-interval and HRV features of `rec` over sliding windows,
+        computed from the (cached) R-points of the wave delineation annotations,
+        with RR intervals adjacent to artifacts and abnormal beats ("VE" and "SVE") excluded
+
+        Parameters:
+        -----------
+        rec: str,
+            record name, typically in the form "shhs1-200001"
+        window: real number, default 300,
+            length of the windows, with units in seconds
+        stride: real number, default 30,
+            stride of the windows, with units in seconds
+        sampfrom: int, optional,
+            start index (at the sampling frequency of the ECG) of the first window
+        sampto: int, optional,
+            end index of the windows
+        freq_domain: bool, default True,
+            whether or not to compute the frequency-domain features (VLF, LF, HF powers and LF/HF)
+        wave_deli_path: str, optional,
+            annotation file path,
+            if not given, default path will be used
+
+        Returns:
+        --------
+        df_hrv: DataFrame,
+            one row for each window, ref. `compute_windowed_hrv`
+        """
+        table = self._load_rpoint_table(rec, wave_deli_path)
+        order = np.argsort(table["rpoint"], kind="stable")
+        df_hrv = compute_windowed_hrv(
+            table["rpoint"][order], table["fs"][0], valid=table["normal"][order],
+            window=window, stride=stride, sampfrom=sampfrom, sampto=sampto,
+            freq_domain=freq_domain,
+        )
+        return df_hrv
+
+
     def locate_artifacts(self, rec:str, wave_deli_path:Optional[str]=None) -> np.ndarray:
         """ finished,
 
@@ -1251,9 +1180,9 @@ class SHHS(NSRRDataBase):
         --------
 
         """
-        df_rpeaks_with_type_info = self.load_wave_delineation(rec, wave_deli_path)[["Type", "rpointadj"]]
+        table = self._load_rpoint_table(rec, wave_deli_path)
 
-        return (np.round( df_rpeaks_with_type_info[df_rpeaks_with_type_info["Type"]==0]["rpointadj"].values )).astype(int)
+        return (np.round(table["rpoint"][table["artifact"]])).astype(int)
 
 
     def locate_abnormal_beats(self, rec:str, wave_deli_path:Optional[str]=None, abnormal_type:Optional[str]=None) -> Dict[str, np.ndarray]:
@@ -1277,25 +1206,30 @@ class SHHS(NSRRDataBase):
         if abnormal_type is not None and abnormal_type not in ["VE", "SVE"]:
             raise ValueError(f"No abnormal type of {abnormal_type} in wave delineation annotation files")
 
-        df_rpeaks_with_type_info = self.load_wave_delineation(rec, wave_deli_path)[["Type", "rpointadj"]]
-
-        # 2 = VE, 3 = SVE
-        ve = (np.round( df_rpeaks_with_type_info[df_rpeaks_with_type_info["Type"]==2]["rpointadj"].values )).astype(int)
-        sve = (np.round( df_rpeaks_with_type_info[df_rpeaks_with_type_info["Type"]==3]["rpointadj"].values )).astype(int)
+        table = self._load_rpoint_table(rec, wave_deli_path)
 
+        types = ["VE", "SVE"] if abnormal_type is None else [abnormal_type]
         abnormal_rpeaks = {
-            "VE": ve,
-            "SVE": sve
+            t: (np.round(table["rpoint"][table[t]])).astype(int) for t in types
         }
 
-        if abnormal_type is None:
-            return abnormal_rpeaks
-        elif abnormal_type in ["VE", "SVE"]:
-            return {abnormal_type: abnormal_rpeaks[abnormal_type]}
+        return abnormal_rpeaks
+
+
+    def _check_eeg_summary_available(self) -> NoReturn:
+        """ finished,
+
+        raise (and log) an error if the EEG spectral summary variables
+        are removed in the current version (`self.current_version`) of the annotations
+        """
+        if tuple(int(v) for v in self.current_version.split(".")) >= (0, 15, 0):
+            msg = f"EEG spectral summary variables are removed in version {self.current_version}"
+            self.logger.warning(msg)
+            raise ValueError(msg)
 
 
     def load_eeg_band_ann(self, rec:str, eeg_band_ann_path:Optional[str]=None) -> pd.DataFrame:
-        """ not finished,
+        """ finished,
 
         Parameters:
         -----------
@@ -1307,16 +1241,20 @@ class SHHS(NSRRDataBase):
         
         Returns:
         --------
+        df_eeg_ann, DataFrame,
+            EEG band summary annotations of `rec`
 
+        NOTE: EEG spectral summary variables are removed since version 0.15.0 (ref. `self.current_version`),
+        in which case a `ValueError` is raised
         """
-        if self.current_version >= "0.15.0":
-            print("EEG spectral summary variables are removed in this version")
-        else:
-            raise NotImplementedError
+        self._check_eeg_summary_available()
+        file_path = self.match_full_rec_path(rec, eeg_band_ann_path, rec_type="eeg_band_summary")
+        df_eeg_ann = self._load_partitioned_csv(file_path, key="nsrrid", value=self.get_nsrrid(rec))
+        return df_eeg_ann
 
 
     def load_eeg_spectral_ann(self, rec:str, eeg_spectral_ann_path:Optional[str]=None) -> pd.DataFrame:
-        """ not finished,
+        """ finished,
 
         Parameters:
         -----------
@@ -1328,12 +1266,16 @@ class SHHS(NSRRDataBase):
         
         Returns:
         --------
+        df_eeg_ann, DataFrame,
+            EEG spectral summary annotations of `rec`
 
+        NOTE: EEG spectral summary variables are removed since version 0.15.0 (ref. `self.current_version`),
+        in which case a `ValueError` is raised
         """
-        if self.current_version >= "0.15.0":
-            print("EEG spectral summary variables are removed in this version")
-        else:
-            raise NotImplementedError
+        self._check_eeg_summary_available()
+        file_path = self.match_full_rec_path(rec, eeg_spectral_ann_path, rec_type="eeg_spectral_summary")
+        df_eeg_ann = self._load_partitioned_csv(file_path, key="nsrrid", value=self.get_nsrrid(rec))
+        return df_eeg_ann
 
 
     # TODO: add more functions for annotation reading
@@ -1386,6 +1328,7 @@ class SHHS(NSRRDataBase):
         """
         import matplotlib.pyplot as plt
         import matplotlib.patches as mpatches
+        import matplotlib.dates as mdates
 
         check = [df_sleep_stage is None, df_sleep_event is None]
         nb_axes = len(check) - np.sum(check)
@@ -1398,10 +1341,8 @@ class SHHS(NSRRDataBase):
         if df_sleep_stage is not None:
             sleep_stages = {}
             for k in self.sleep_stage_names:
-                sleep_stages[k] = intervals_union(
-                    interval_list=[[sec, sec+self.sleep_epoch_len_sec] for sec in df_sleep_stage[df_sleep_stage["sleep_stage"]==self.sleep_stage_name_value_mapping[k]]["start_sec"].values],
-                    join_book_endeds=True
-                )
+                start_secs = df_sleep_stage[df_sleep_stage["sleep_stage"]==self.sleep_stage_name_value_mapping[k]]["start_sec"].values
+                sleep_stages[k] = IntervalArray(start_secs, start_secs + self.sleep_epoch_len_sec)
         
         if df_sleep_event is not None:
             current_legal_events = [
@@ -1431,38 +1372,37 @@ class SHHS(NSRRDataBase):
             ax_stages.set_title("Sleep Stages and Events", fontsize=24)
             ax_events.set_xlabel("Time", fontsize=16)
 
+        def _spans(starts:Sequence[Real], ends:Sequence[Real]) -> List[Tuple[float, float]]:
+            # (start, width) in matplotlib date numbers, for `broken_barh`
+            starts = mdates.date2num([datetime.fromtimestamp(t) for t in starts])
+            ends = mdates.date2num([datetime.fromtimestamp(t) for t in ends])
+            return list(zip(starts.tolist(), (ends - starts).tolist()))
+
+        # one collection (`broken_barh`) for each stage or event type, instead of one patch per interval
         if ax_stages is not None:
             for k,v in sleep_stages.items():
-                for itv in v:
-                    ax_stages.axvspan(datetime.fromtimestamp(itv[0]), datetime.fromtimestamp(itv[1]), color=self.palette[k], alpha=plot_alpha)
+                if len(v) == 0:
+                    continue
+                ax_stages.broken_barh(
+                    _spans(v.starts, v.ends), (0, 1),
+                    transform=ax_stages.get_xaxis_transform(),
+                    color=self.palette[k], alpha=plot_alpha,
+                )
+            ax_stages.xaxis_date()
             ax_stages.legend(handles=[patches[k] for k in self.all_sleep_stage_names if k in sleep_stages.keys()], loc="best")  # keep ordering
             plt.setp(ax_stages.get_yticklabels(), visible=False)
             ax_stages.tick_params(axis="y", which="both", length=0)
             
         if ax_events is not None:
-            for _, row in df_sleep_event.iterrows():
-                ax_events.axvspan(datetime.fromtimestamp(row["event_start"]), datetime.fromtimestamp(row["event_end"]), color=self.palette[row["event_name"]], alpha=plot_alpha)
+            for event_name, df in df_sleep_event.groupby("event_name"):
+                ax_events.broken_barh(
+                    _spans(df["event_start"].values, df["event_end"].values), (0, 1),
+                    transform=ax_events.get_xaxis_transform(),
+                    color=self.palette[event_name], alpha=plot_alpha,
+                )
+            ax_events.xaxis_date()
             ax_events.legend(handles=[patches[k] for k in current_legal_events if k in set(df_sleep_event["event_name"])],loc="best")  # keep ordering
             plt.setp(ax_events.get_yticklabels(), visible=False)
             ax_events.tick_params(axis="y", which="both", length=0)
 
     # def _form_palette(self) -> :
-            
-
-
-    def str_to_real_number(self, s:Union[str,Real]) -> Real:
-        """ finished,
-
-        some columns in the annotations might incorrectly been converted from real number to string, using `xmltodict`.
-
-        Parameters:
-        -----------
-        s: str or real number (NaN)
-        """
-        if isinstance(s,str):
-            if "." in s:
-                return float(s)
-            else:
-                return int(s)
-        else:  # NaN case
-            return s
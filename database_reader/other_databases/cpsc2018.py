@@ -1,11 +1,9 @@
 # -*- coding: utf-8 -*-
 """
 """
-import io
 import os
 import glob
-from datetime import datetime
-from typing import Union, Optional, Any, List, Dict, Tuple, NoReturn
+from typing import Union, Optional, Any, List, Dict, Tuple, Sequence, NoReturn
 from numbers import Real
 
 import numpy as np
@@ -25,7 +23,10 @@ from ..utils.utils_misc.cinc2020_aux_data import (
     dx_mapping_all, dx_mapping_scored, dx_mapping_unscored,
     normalize_class, abbr_to_snomed_ct_code,
 )
-from ..base import OtherDataBase
+from ..base import (
+    OtherDataBase,
+    parse_wfdb_header, parse_wfdb_lead_lines, parse_dx,
+)
 
 
 __all__ = [
@@ -226,38 +227,18 @@ class CPSC2018(OtherDataBase):
         with open(ann_fp, "r") as f:
             header_data = f.read().splitlines()
 
-        ann_dict = {}
-        ann_dict["rec_name"], ann_dict["nb_leads"], ann_dict["fs"], ann_dict["nb_samples"], ann_dict["datetime"], daytime = header_data[0].split(" ")
-
-        ann_dict["nb_leads"] = int(ann_dict["nb_leads"])
-        ann_dict["fs"] = int(ann_dict["fs"])
-        ann_dict["nb_samples"] = int(ann_dict["nb_samples"])
-        ann_dict["datetime"] = datetime.strptime(" ".join([ann_dict["datetime"], daytime]), "%d-%b-%Y %H:%M:%S")
-        try: # see NOTE. 1.
-            ann_dict["age"] = int([l for l in header_data if l.startswith("#Age")][0].split(": ")[-1])
-        except:
-            ann_dict["age"] = np.nan
-        try:
-            ann_dict["sex"] = [l for l in header_data if l.startswith("#Sex")][0].split(": ")[-1]
-        except:
-            ann_dict["sex"] = "Unknown"
-        try:
-            ann_dict["medical_prescription"] = [l for l in header_data if l.startswith("#Rx")][0].split(": ")[-1]
-        except:
-            ann_dict["medical_prescription"] = "Unknown"
-        try:
-            ann_dict["history"] = [l for l in header_data if l.startswith("#Hx")][0].split(": ")[-1]
-        except:
-            ann_dict["history"] = "Unknown"
-        try:
-            ann_dict["symptom_or_surgery"] = [l for l in header_data if l.startswith("#Sx")][0].split(": ")[-1]
-        except:
-            ann_dict["symptom_or_surgery"] = "Unknown"
-
-        l_Dx = [l for l in header_data if l.startswith("#Dx")][0].split(": ")[-1].split(",")
-        ann_dict["diagnosis"], ann_dict["diagnosis_scored"] = self._parse_diagnosis(l_Dx)
-
-        ann_dict["df_leads"] = self._parse_leads(header_data[1:13])
+        header = parse_wfdb_header(header_data, parse_leads=False)
+        ann_dict = {
+            k: header[k] for k in [
+                "rec_name", "nb_leads", "fs", "nb_samples", "datetime",
+                "age", "sex", "medical_prescription", "history", "symptom_or_surgery",
+            ]
+        }
+        ann_dict["diagnosis"], ann_dict["diagnosis_scored"] = self._parse_diagnosis(header["Dx"])
+
+        ann_dict["df_leads"] = self._parse_leads(header_data[1:1+header["nb_leads"]])
+
+        return ann_dict
 
 
     def _parse_diagnosis(self, l_Dx:List[str]) -> Tuple[dict, dict]:
@@ -275,36 +256,7 @@ class CPSC2018(OtherDataBase):
         diag_scored_dict: dict,
             the scored items in `diag_dict`
         """
-        diag_dict, diag_scored_dict = {}, {}
-        try:
-            diag_dict["diagnosis_code"] = [item for item in l_Dx]
-            # selection = dx_mapping_all["SNOMED CT Code"].isin(diag_dict["diagnosis_code"])
-            # diag_dict["diagnosis_abbr"] = dx_mapping_all[selection]["Abbreviation"].tolist()
-            # diag_dict["diagnosis_fullname"] = dx_mapping_all[selection]["Dx"].tolist()
-            diag_dict["diagnosis_abbr"] = \
-                [ dx_mapping_all[dx_mapping_all["SNOMED CT Code"]==dc]["Abbreviation"].values[0] \
-                    for dc in diag_dict["diagnosis_code"] ]
-            diag_dict["diagnosis_fullname"] = \
-                [ dx_mapping_all[dx_mapping_all["SNOMED CT Code"]==dc]["Dx"].values[0] \
-                    for dc in diag_dict["diagnosis_code"] ]
-            scored_indices = np.isin(diag_dict["diagnosis_code"], dx_mapping_scored["SNOMED CT Code"].values)
-            diag_scored_dict["diagnosis_code"] = \
-                [ item for idx, item in enumerate(diag_dict["diagnosis_code"]) \
-                    if scored_indices[idx] ]
-            diag_scored_dict["diagnosis_abbr"] = \
-                [ item for idx, item in enumerate(diag_dict["diagnosis_abbr"]) \
-                    if scored_indices[idx] ]
-            diag_scored_dict["diagnosis_fullname"] = \
-                [ item for idx, item in enumerate(diag_dict["diagnosis_fullname"]) \
-                    if scored_indices[idx] ]
-        except:  # the old version, the Dx"s are abbreviations
-            diag_dict["diagnosis_abbr"] = diag_dict["diagnosis_code"]
-            selection = dx_mapping_all["Abbreviation"].isin(diag_dict["diagnosis_abbr"])
-            diag_dict["diagnosis_fullname"] = dx_mapping_all[selection]["Dx"].tolist()
-        # if not keep_original:
-        #     for idx, d in enumerate(ann_dict["diagnosis_abbr"]):
-        #         if d in ["Normal", "NSR"]:
-        #             ann_dict["diagnosis_abbr"] = ["N"]
+        diag_dict, diag_scored_dict = parse_dx(l_Dx, dx_mapping_all, dx_mapping_scored)
         return diag_dict, diag_scored_dict
 
 
@@ -321,21 +273,61 @@ class CPSC2018(OtherDataBase):
         df_leads: DataFrame,
             infomation of each leads in the format of DataFrame
         """
-        df_leads = pd.read_csv(io.StringIO("\n".join(l_leads_data)), delim_whitespace=True, header=None)
-        df_leads.columns = ["filename", "fmt+byte_offset", "adc_gain+units", "adc_res", "adc_zero", "init_value", "checksum", "block_size", "lead_name",]
-        df_leads["fmt"] = df_leads["fmt+byte_offset"].apply(lambda s: s.split("+")[0])
-        df_leads["byte_offset"] = df_leads["fmt+byte_offset"].apply(lambda s: s.split("+")[1])
-        df_leads["adc_gain"] = df_leads["adc_gain+units"].apply(lambda s: s.split("/")[0])
-        df_leads["adc_units"] = df_leads["adc_gain+units"].apply(lambda s: s.split("/")[1])
-        for k in ["byte_offset", "adc_gain", "adc_res", "adc_zero", "init_value", "checksum",]:
-            df_leads[k] = df_leads[k].apply(lambda s: int(s))
-        df_leads["baseline"] = df_leads["adc_zero"]
-        df_leads = df_leads[["filename", "fmt", "byte_offset", "adc_gain", "adc_units", "adc_res", "adc_zero", "baseline", "init_value", "checksum", "block_size", "lead_name"]]
+        df_leads = pd.DataFrame(parse_wfdb_lead_lines(l_leads_data))
         df_leads.index = df_leads["lead_name"]
         df_leads.index.name = None
         return df_leads
 
 
+    def load_header_index(self, use_cache:bool=True, nb_workers:int=8) -> pd.DataFrame:
+        """ finished, checked,
+
+        load the index of the records from the record lines of all the header files,
+        without opening the signal files,
+        which is cached to a csv file in `self.working_dir`
+
+        Parameters:
+        -----------
+        use_cache: bool, default True,
+            whether or not to use (read and write) the cache file
+        nb_workers: int, default 8,
+            number of threads to read the header files
+
+        Returns:
+        --------
+        df_index: DataFrame,
+            indexed by the record names, with columns "fs", "nb_samples"
+        """
+        return self._load_header_index(
+            self.all_records,
+            header_filepath=lambda rec: os.path.join(self.db_dir, rec + self.ann_ext),
+            use_cache=use_cache, nb_workers=nb_workers,
+        )
+
+
+    def load_batch(self, recs:Sequence[str], nb_workers:int=8) -> Tuple[np.ndarray, np.ndarray]:
+        """ finished, checked,
+
+        load the data of a batch of records (e.g. from `self.get_batches`) using a thread pool,
+        padded (with zeros at the end) to the same length
+
+        Parameters:
+        -----------
+        recs: sequence of str,
+            names of the records
+        nb_workers: int, default 8,
+            number of threads to load the data
+
+        Returns:
+        --------
+        data: ndarray,
+            the padded data, of shape (batch_size, nb_leads, max_length), in the "channels_first" format
+        lengths: ndarray,
+            lengths of the records (before padding)
+        """
+        return self._load_batch(recs, nb_workers=nb_workers, data_format="channels_first")
+
+
     def get_labels(self, rec_no:Union[int,str], keep_original:bool=False) -> List[str]:
         """ finished, checked,
         
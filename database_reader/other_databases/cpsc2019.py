@@ -3,7 +3,8 @@
 """
 import os, json
 from datetime import datetime
-from typing import Union, Optional, Any, List, Dict, Sequence, NoReturn
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union, Optional, Any, List, Tuple, Dict, Sequence, NoReturn
 from numbers import Real
 
 import numpy as np
@@ -109,6 +110,11 @@ class CPSC2019(OtherDataBase):
         self.data_dir = self.rec_dir
         self.ref_dir = self.ann_dir
 
+        # all records and rpeaks in one file, see `self.load_all`
+        self.siglen = 10 * self.fs
+        self.bulk_cache_path = kwargs.get("bulk_cache_path", os.path.join(self.working_dir, f"{self.db_name}_all.npz"))
+        self._bulk = None
+
 
     def _ls_rec(self) -> NoReturn:
         """ finished, checked,
@@ -242,6 +248,61 @@ class CPSC2019(OtherDataBase):
         return self.load_ann(rec=rec, keep_dim=keep_dim)
 
 
+    def load_all(self, nb_workers:int=8, use_cache:bool=True) -> Dict[str, np.ndarray]:
+        """ finished, checked,
+
+        load the data and the rpeaks of all records into memory,
+        the files are read (in parallel) only once, and then cached to `self.bulk_cache_path`
+
+        Parameters:
+        -----------
+        nb_workers: int, default 8,
+            number of threads to read the files
+        use_cache: bool, default True,
+            whether or not to use (read and write) the cache file
+
+        Returns:
+        --------
+        bulk: dict,
+            with items
+            - "records": ndarray of the record names, of shape (n,)
+            - "data": ndarray of float32, the ecg data (in mV) of all records, of shape (n, 5000)
+            - "rpeaks": ndarray of int, the rpeaks of all records, concatenated
+            - "rpeak_offsets": ndarray of int, of shape (n+1,),
+            rpeaks of the i-th record are `rpeaks[rpeak_offsets[i]:rpeak_offsets[i+1]]`
+        """
+        if self._bulk is not None:
+            return self._bulk
+        if use_cache and os.path.isfile(self.bulk_cache_path):
+            with np.load(self.bulk_cache_path) as npz:
+                bulk = {k: npz[k] for k in npz.files}
+            if bulk["records"].tolist() == self.all_records:
+                self._bulk = bulk
+                return bulk
+
+        def _load(rec:str) -> Tuple[np.ndarray, np.ndarray]:
+            return self.load_data(rec, keep_dim=False), self.load_ann(rec, keep_dim=False)
+
+        with ThreadPoolExecutor(max_workers=nb_workers) as executor:
+            loaded = list(executor.map(_load, self.all_records))
+        data = np.zeros((len(loaded), self.siglen), dtype=np.float32)
+        for idx, (d, _) in enumerate(loaded):
+            assert len(d) == self.siglen, f"length of record {self.all_records[idx]} is {len(d)}, rather than {self.siglen}"
+            data[idx] = d
+        rpeak_offsets = np.concatenate(([0], np.cumsum([len(r) for _, r in loaded]))).astype(int)
+        rpeaks = np.concatenate([r for _, r in loaded]).astype(int) if len(loaded) > 0 else np.array([], dtype=int)
+        bulk = {
+            "records": np.array(self.all_records),
+            "data": data,
+            "rpeaks": rpeaks,
+            "rpeak_offsets": rpeak_offsets,
+        }
+        if use_cache:
+            np.savez(self.bulk_cache_path, **bulk)
+        self._bulk = bulk
+        return bulk
+
+
     def _get_rec_name(self, rec:Union[int,str]) -> str:
         """ finished, checked,
 
@@ -347,17 +408,20 @@ class CPSC2019(OtherDataBase):
 
 
 
-def compute_metrics(rpeaks_truth:Sequence[Union[np.ndarray,Sequence[int]]], rpeaks_pred:Sequence[Union[np.ndarray,Sequence[int]]], fs:Real, thr:float=0.075, verbose:int=0) -> float:
+def compute_metrics(rpeaks_truth:Union[Sequence[Union[np.ndarray,Sequence[int]]],np.ndarray], rpeaks_pred:Union[Sequence[Union[np.ndarray,Sequence[int]]],np.ndarray], fs:Real, thr:float=0.075, verbose:int=0, truth_lengths:Optional[Sequence[int]]=None, pred_lengths:Optional[Sequence[int]]=None) -> float:
     """ finished, checked,
 
-    metric (scoring) function modified from the official one, with errors fixed
+    metric (scoring) function modified from the official one, with errors fixed,
+    vectorized over all rpeaks of all records via `np.searchsorted`
 
     Parameters:
     -----------
-    rpeaks_truth: sequence,
-        sequence of ground truths of rpeaks locations from multiple records
-    rpeaks_pred: sequence,
-        predictions of ground truths of rpeaks locations for multiple records
+    rpeaks_truth: sequence or ndarray,
+        sequence of ground truths of rpeaks locations from multiple records,
+        or 2d array of padded ground truths, with actual numbers given by `truth_lengths`
+    rpeaks_pred: sequence or ndarray,
+        predictions of ground truths of rpeaks locations for multiple records,
+        or 2d array of padded predictions, with actual numbers given by `pred_lengths`
     fs: real number,
         sampling frequency of ECG signal
     thr: float, default 0.075,
@@ -365,6 +429,12 @@ def compute_metrics(rpeaks_truth:Sequence[Union[np.ndarray,Sequence[int]]], rpea
         with units in seconds,
     verbose: int, default 0,
         print verbosity
+    truth_lengths: sequence of int, optional,
+        numbers of ground truth rpeaks of the records,
+        if not given, each row of `rpeaks_truth` is used in full
+    pred_lengths: sequence of int, optional,
+        numbers of predicted rpeaks of the records,
+        if not given, each row of `rpeaks_pred` is used in full
 
     Returns:
     --------
@@ -374,47 +444,79 @@ def compute_metrics(rpeaks_truth:Sequence[Union[np.ndarray,Sequence[int]]], rpea
     assert len(rpeaks_truth) == len(rpeaks_pred), \
         f"number of records does not match, truth indicates {len(rpeaks_truth)}, while pred indicates {len(rpeaks_pred)}"
     n_records = len(rpeaks_truth)
-    record_flags = np.ones((len(rpeaks_truth),), dtype=float)
     thr_ = thr * fs
     if verbose >= 1:
         print(f"number of records = {n_records}")
         print(f"threshold in number of sample points = {thr_}")
-    for idx, (truth_arr, pred_arr) in enumerate(zip(rpeaks_truth, rpeaks_pred)):
-        false_negative = 0
-        false_positive = 0
-        true_positive = 0
-        extended_truth_arr = np.concatenate((truth_arr.astype(int), [int(9.5*fs)]))
-        for j, t_ind in enumerate(extended_truth_arr[:-1]):
-            next_t_ind = extended_truth_arr[j+1]
-            loc = np.where(np.abs(pred_arr - t_ind) <= thr_)[0]
-            if j == 0:
-                err = np.where((pred_arr >= 0.5*fs + thr_) & (pred_arr <= t_ind - thr_))[0]
-            else:
-                err = np.array([], dtype=int)
-            err = np.append(
-                err,
-                np.where((pred_arr >= t_ind+thr_) & (pred_arr <= next_t_ind-thr_))[0]
-            )
-
-            false_positive += len(err)
-            if len(loc) >= 1:
-                true_positive += 1
-                false_positive += len(loc) - 1
-            elif len(loc) == 0:
-                false_negative += 1
-
-        if false_negative + false_positive > 1:
-            record_flags[idx] = 0
-        elif false_negative == 1 and false_positive == 0:
-            record_flags[idx] = 0.3
-        elif false_negative == 0 and false_positive == 1:
-            record_flags[idx] = 0.7
-
-        if verbose >= 2:
-            print(f"for the {idx}-th record,\ntrue positive = {true_positive}\nfalse positive = {false_positive}\nfalse negative = {false_negative}")
+    truth, truth_rec = _flatten_rpeaks(rpeaks_truth, truth_lengths)
+    pred, pred_rec = _flatten_rpeaks(rpeaks_pred, pred_lengths)
+
+    # put all records onto one axis, with record `i` occupying [i*span, (i+1)*span),
+    # spaced such that no search interval (of one record) reaches into neighboring records
+    origin = min(0, truth.min(initial=0), pred.min(initial=0))
+    span = max(9.5*fs, truth.max(initial=0), pred.max(initial=0)) - origin + 2*thr_ + 2
+    truth = truth - origin + truth_rec * span
+    pred = np.sort(pred - origin + pred_rec * span)
+
+    def _count(lower:np.ndarray, upper:np.ndarray) -> np.ndarray:
+        """ number of predictions in the closed intervals [lower, upper] """
+        return np.maximum(
+            0, np.searchsorted(pred, upper, side="right") - np.searchsorted(pred, lower, side="left")
+        )
+
+    # the next truth rpeak of each truth rpeak, the last one of each record followed by 9.5s
+    is_last = np.append(truth_rec[1:] != truth_rec[:-1], True) if len(truth) > 0 else np.array([], dtype=bool)
+    is_first = np.append(True, is_last[:-1]) if len(truth) > 0 else np.array([], dtype=bool)
+    next_truth = np.where(is_last, 9.5*fs - origin + truth_rec * span, np.roll(truth, -1))
+    rec_start = 0.5*fs - origin + truth_rec * span
+
+    nb_loc = _count(truth - thr_, truth + thr_)
+    err = _count(truth + thr_, next_truth - thr_)
+    err[is_first] += _count(rec_start[is_first] + thr_, truth[is_first] - thr_)
+
+    true_positive = np.bincount(truth_rec, weights=(nb_loc >= 1), minlength=n_records).astype(int)
+    false_negative = np.bincount(truth_rec, weights=(nb_loc == 0), minlength=n_records).astype(int)
+    false_positive = np.bincount(truth_rec, weights=err + np.maximum(nb_loc - 1, 0), minlength=n_records).astype(int)
+
+    record_flags = np.ones((n_records,), dtype=float)
+    record_flags[(false_negative == 0) & (false_positive == 1)] = 0.7
+    record_flags[(false_negative == 1) & (false_positive == 0)] = 0.3
+    record_flags[false_negative + false_positive > 1] = 0
+
+    if verbose >= 2:
+        for idx in range(n_records):
+            print(f"for the {idx}-th record,\ntrue positive = {true_positive[idx]}\nfalse positive = {false_positive[idx]}\nfalse negative = {false_negative[idx]}")
 
     rec_acc = round(np.sum(record_flags) / n_records, 4)
     print(f"QRS_acc: {rec_acc}")
     print("Scoring complete.")
 
     return rec_acc
+
+
+def _flatten_rpeaks(rpeaks:Union[Sequence[Union[np.ndarray,Sequence[int]]],np.ndarray], lengths:Optional[Sequence[int]]=None) -> Tuple[np.ndarray, np.ndarray]:
+    """ finished, checked,
+
+    flatten rpeaks of multiple records (ragged sequence, or padded 2d array with lengths)
+
+    Parameters:
+    -----------
+    rpeaks: sequence or ndarray,
+        rpeaks of multiple records
+    lengths: sequence of int, optional,
+        actual numbers of rpeaks of the records (rows of `rpeaks`)
+
+    Returns:
+    --------
+    values: ndarray,
+        the flattened rpeaks (in float, to avoid overflow of unsigned dtypes)
+    rec_ids: ndarray,
+        index of the record of each element of `values`
+    """
+    if lengths is None:
+        rows = [np.asarray(r).flatten() for r in rpeaks]
+    else:
+        rows = [np.asarray(r).flatten()[:int(l)] for r, l in zip(rpeaks, lengths)]
+    values = np.concatenate(rows).astype(float) if len(rows) > 0 else np.array([], dtype=float)
+    rec_ids = np.repeat(np.arange(len(rows)), [len(r) for r in rows])
+    return values, rec_ids
@@ -5,6 +5,7 @@ import os
 import random
 import math
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from typing import Union, Optional, Any, List, Tuple, Dict, Sequence, NoReturn
 from numbers import Real
 
@@ -20,11 +21,12 @@ from ..utils.common import (
 )
 from ..utils.utils_misc import PVC, SPB
 from ..utils.utils_universal import get_optimal_covering
-from ..base import OtherDataBase
+from ..base import OtherDataBase, DecimatedSignalView, compute_windowed_hrv
 
 
 __all__ = [
     "CPSC2020",
+    "match_beats",
     "compute_metrics",
 ]
 
@@ -210,6 +212,17 @@ class CPSC2020(OtherDataBase):
 
         self.palette = {"spb": "yellow", "pvc": "red",}
 
+        # the raw `.mat` files are converted (once) to `.npy` files,
+        # which are memory-mapped to serve windows of the 24h recordings
+        self.raw_cache_dir = kwargs.get("raw_cache_dir", os.path.join(self.working_dir, "raw_cache"))
+        self._raw_data = {}
+        # parsed annotations, premature beat intervals and window indices, built once
+        self._ann_cache = {}
+        self._premature_intervals = {}
+        self.window_index_dir = kwargs.get("window_index_dir", os.path.join(self.working_dir, "window_index"))
+        self._window_index = {}
+        self._window_pools = {}  # ref. `self._get_window_pools`
+
 
     @property
     def all_annotations(self):
@@ -281,20 +294,61 @@ class CPSC2020(OtherDataBase):
         Returns:
         --------
         data: ndarray,
-            the ecg data
+            the ecg data,
+            in units of "mV", it is a read-only view of the memory-mapped record,
+            hence should be copied before being modified in place
+
+        NOTE:
+        -----
+        only the window `[sampfrom:sampto]` is read from disk (and converted to "μV" if required),
+        the whole record is decoded only once, via `self._get_raw_data`
         """
-        rec_name = self._get_rec_name(rec)
-        rec_fp = os.path.join(self.data_dir, f"{rec_name}{self.rec_ext}")
-        data = loadmat(rec_fp)["ecg"]
+        raw = self._get_raw_data(rec)
+        sf, st = (sampfrom or 0), (sampto or len(raw))
+        data = raw[sf:st]
         if units.lower() in ["uv", "μv"]:
             data = (1000 * data).astype(int)
-        sf, st = (sampfrom or 0), (sampto or len(data))
-        data = data[sf:st]
-        if not keep_dim:
-            data = data.flatten()
+        if keep_dim:
+            data = data[:, np.newaxis]
         return data
 
 
+    def _get_raw_data(self, rec:Union[int,str]) -> np.ndarray:
+        """ finished, checked,
+
+        get the (flattened) memory-mapped ecg data in units of "mV" of the whole record,
+        the `.mat` file is converted to a `.npy` file in `self.raw_cache_dir` at the first call,
+        and re-converted if the `.mat` file is newer than the `.npy` file
+
+        Parameters:
+        -----------
+        rec: int or str,
+            number of the record, NOTE that rec_no starts from 1,
+            or the record name
+
+        Returns:
+        --------
+        raw: memmap,
+            the read-only ecg data of the whole record, of shape (n,)
+        """
+        rec_name = self._get_rec_name(rec)
+        raw = self._raw_data.get(rec_name, None)
+        if raw is not None:
+            return raw
+        rec_fp = os.path.join(self.data_dir, f"{rec_name}{self.rec_ext}")
+        cache_fp = os.path.join(self.raw_cache_dir, f"{rec_name}.npy")
+        if not os.path.isfile(cache_fp) or os.path.getmtime(cache_fp) < os.path.getmtime(rec_fp):
+            os.makedirs(self.raw_cache_dir, exist_ok=True)
+            data = loadmat(rec_fp)["ecg"].flatten()
+            # write to a temporary file first, in case of interruption
+            tmp_fp = cache_fp.replace(".npy", ".tmp.npy")
+            np.save(tmp_fp, data)
+            os.replace(tmp_fp, cache_fp)
+        raw = np.load(cache_fp, mmap_mode="r")
+        self._raw_data[rec_name] = raw
+        return raw
+
+
     def load_ann(self, rec:Union[int,str], sampfrom:Optional[int]=None, sampto:Optional[int]=None) -> Dict[str, np.ndarray]:
         """ finished, checked,
 
@@ -315,21 +369,18 @@ class CPSC2020(OtherDataBase):
             which record the indices of SPBs and PVCs
         """
         ann_name = self._get_ann_name(rec)
-        ann_fp = os.path.join(self.ann_dir, ann_name + self.ann_ext)
-        ann = loadmat(ann_fp)["ref"]
+        if ann_name not in self._ann_cache:
+            ann_fp = os.path.join(self.ann_dir, ann_name + self.ann_ext)
+            ann = loadmat(ann_fp)["ref"]
+            # drop duplicates (and sort)
+            self._ann_cache[ann_name] = {
+                "SPB_indices": np.unique(ann["S_ref"][0,0].flatten().astype(int)),
+                "PVC_indices": np.unique(ann["V_ref"][0,0].flatten().astype(int)),
+            }
         sf, st = (sampfrom or 0), (sampto or np.inf)
-        spb_indices = ann["S_ref"][0,0].flatten().astype(int)
-        # drop duplicates
-        spb_indices = np.array(sorted(list(set(spb_indices))), dtype=int)
-        spb_indices = spb_indices[np.where( (spb_indices>=sf) & (spb_indices<st) )[0]]
-        pvc_indices = ann["V_ref"][0,0].flatten().astype(int)
-        # drop duplicates
-        pvc_indices = np.array(sorted(list(set(pvc_indices))), dtype=int)
-        pvc_indices = pvc_indices[np.where( (pvc_indices>=sf) & (pvc_indices<st) )[0]]
-        ann = {
-            "SPB_indices": spb_indices,
-            "PVC_indices": pvc_indices,
-        }
+        ann = {}
+        for k, v in self._ann_cache[ann_name].items():
+            ann[k] = v[np.searchsorted(v, sf, side="left"): np.searchsorted(v, st, side="left")].copy()
         return ann
 
 
@@ -438,6 +489,10 @@ class CPSC2020(OtherDataBase):
         premature_intervals: list,
             list of intervals of premature beats
         """
+        rec_name = self._get_rec_name(rec)
+        key = (rec_name, (premature_type or "").upper(), window, sampfrom, sampto)
+        if key in self._premature_intervals:
+            return [list(itv) for itv in self._premature_intervals[key]]
         ann = self.load_ann(rec)
         if premature_type:
             premature_inds = ann[f"{premature_type.upper()}_indices"]
@@ -458,10 +513,212 @@ class CPSC2020(OtherDataBase):
             split_threshold=window*self.fs//1000,
             traceback=False,
         )
+        self._premature_intervals[key] = [list(itv) for itv in premature_intervals]
         return premature_intervals
 
+
+    def compute_hrv_features(self, rec:Union[int,str], rpeaks:np.ndarray, window:Real=300, stride:Real=30, sampfrom:Optional[int]=None, sampto:Optional[int]=None, freq_domain:bool=True, bias_thr:Real=0.15*400) -> pd.DataFrame:
+        """ finished, checked,
+
+        RR-interval and HRV features of `rec` over sliding windows,
+        with RR intervals adjacent to premature beats (SPB, PVC) excluded,
+        i.e. beats lying within `bias_thr` of the annotated premature beats
+
+        Parameters:
+        -----------
+        rec: int or str,
+            number of the record, NOTE that rec_no starts from 1,
+            or the record name
+        rpeaks: ndarray,
+            locations (indices) of the beats (R peaks) of the whole record, e.g. by a QRS detector,
+            since CPSC2020 provides no annotations of the normal beats
+        window: real number, default 300,
+            length of the windows, with units in seconds
+        stride: real number, default 30,
+            stride of the windows, with units in seconds
+        sampfrom: int, optional,
+            start index of the first window
+        sampto: int, optional,
+            end index of the windows
+        freq_domain: bool, default True,
+            whether or not to compute the frequency-domain features (VLF, LF, HF powers and LF/HF)
+        bias_thr: real number, default 0.15*400,
+            tolerance (in number of samples) for a beat to be matched to an annotated premature beat
+
+        Returns:
+        --------
+        df_hrv: DataFrame,
+            one row for each window, ref. `compute_windowed_hrv`
+        """
+        rpeaks = np.sort(np.asarray(rpeaks))
+        ann = self.load_ann(rec)
+        premature = np.sort(np.concatenate([ann["SPB_indices"], ann["PVC_indices"]]))
+        valid = np.ones(len(rpeaks), dtype=bool)
+        if len(rpeaks) > 0:
+            pos, dist = _nearest(premature, rpeaks)
+            valid[pos[dist < bias_thr]] = False
+        df_hrv = compute_windowed_hrv(
+            rpeaks, self.fs, valid=valid,
+            window=window, stride=stride, sampfrom=sampfrom, sampto=sampto,
+            freq_domain=freq_domain,
+        )
+        return df_hrv
+
+
+    def build_window_index(self, rec:Union[int,str], window:int=10000, stride:int=1000) -> Dict[str, np.ndarray]:
+        """ finished, checked,
+
+        build (or load from cache) the index of candidate windows of `rec`,
+        i.e. window starts with the numbers of SPBs and PVCs in each window,
+        which is cached in memory and in `self.window_index_dir`,
+        and rebuilt if the annotation file is newer than the cache file
+
+        Parameters:
+        -----------
+        rec: int or str,
+            number of the record, NOTE that rec_no starts from 1,
+            or the record name
+        window: int, default 10000,
+            window length, with units in ms
+        stride: int, default 1000,
+            stride between starts of consecutive candidate windows, with units in ms
+
+        Returns:
+        --------
+        index: dict,
+            with items (ndarray of the same length)
+            - "sampfrom": start index of each window
+            - "nb_spb": number of SPBs in each window
+            - "nb_pvc": number of PVCs in each window
+        """
+        if window * self.fs // 1000 < 1 or stride * self.fs // 1000 < 1:
+            raise ValueError(f"`window` and `stride` should be at least one sample, i.e. {1000 / self.fs} ms")
+        rec_name = self._get_rec_name(rec)
+        key = (rec_name, window, stride)
+        if key in self._window_index:
+            return self._window_index[key]
+        ann_fp = os.path.join(self.ann_dir, self._get_ann_name(rec) + self.ann_ext)
+        cache_fp = os.path.join(self.window_index_dir, f"{rec_name}_window_{window}_stride_{stride}.npz")
+        if os.path.isfile(cache_fp) and os.path.getmtime(cache_fp) >= os.path.getmtime(ann_fp):
+            with np.load(cache_fp) as npz:
+                index = {k: npz[k] for k in npz.files}
+        else:
+            win_len = window * self.fs // 1000
+            siglen = len(self._get_raw_data(rec))
+            sampfrom = np.arange(0, max(0, siglen - win_len) + 1, stride * self.fs // 1000)
+            ann = self.load_ann(rec)
+            index = {"sampfrom": sampfrom}
+            for k, v in [("nb_spb", ann["SPB_indices"]), ("nb_pvc", ann["PVC_indices"])]:
+                index[k] = (np.searchsorted(v, sampfrom + win_len, side="left") - np.searchsorted(v, sampfrom, side="left")).astype(np.int32)
+            os.makedirs(self.window_index_dir, exist_ok=True)
+            np.savez(cache_fp, **index)
+        self._window_index[key] = index
+        return index
+
+
+    def sample_windows(self, nb_samples:int, recs:Optional[Sequence[Union[int,str]]]=None, class_ratios:Optional[Dict[str, Real]]=None, window:int=10000, stride:int=1000, seed:Optional[int]=None) -> Dict[str, np.ndarray]:
+        """ finished, checked,
+
+        randomly sample training windows with (roughly) given class ratios,
+        from the window indices built by `self.build_window_index`;
+        a window belongs to class "N" if it contains no premature beat,
+        class "S" if it contains SPB(s), class "V" if it contains PVC(s),
+        hence windows containing both SPB(s) and PVC(s) belong to both "S" and "V"
+
+        Parameters:
+        -----------
+        nb_samples: int,
+            number of windows to sample
+        recs: sequence of int or str, optional,
+            the records to sample from, defaults to all records
+        class_ratios: dict, optional,
+            ratios of the classes "N", "S", "V", defaults to equal ratios,
+            classes with no window (in `recs`) are dropped
+        window: int, default 10000,
+            window length, with units in ms
+        stride: int, default 1000,
+            stride between starts of consecutive candidate windows, with units in ms
+        seed: int, optional,
+            seed of the random number generator
+
+        Returns:
+        --------
+        samples: dict,
+            with items (ndarray of length `nb_samples`)
+            - "rec": record name of each window
+            - "sampfrom", "sampto": start and end indices of each window
+            - "label": class ("N", "S", "V") from which each window is sampled
+            - "nb_spb", "nb_pvc": number of SPBs and PVCs in each window
+        """
+        recs = [self._get_rec_name(r) for r in (recs or self.all_records)]
+        class_ratios = class_ratios or {"N": 1, "S": 1, "V": 1}
+        rng = np.random.default_rng(seed)
+        pooled = self._get_window_pools(tuple(recs), window=window, stride=stride)
+        rec_no, sampfrom, nb_spb, nb_pvc = pooled["rec_no"], pooled["sampfrom"], pooled["nb_spb"], pooled["nb_pvc"]
+        pools = pooled["pools"]
+        classes = [c for c, r in class_ratios.items() if r > 0 and len(pools[c]) > 0]
+        if len(classes) == 0:
+            raise ValueError("no window to sample from")
+        probs = np.array([class_ratios[c] for c in classes], dtype=float)
+        nb_per_class = rng.multinomial(nb_samples, probs / probs.sum())
+        labels = np.repeat(np.array(classes), nb_per_class)
+        selected = np.concatenate([
+            pools[c][rng.integers(len(pools[c]), size=n)] for c, n in zip(classes, nb_per_class)
+        ])
+        perm = rng.permutation(nb_samples)
+        labels, selected = labels[perm], selected[perm]
+        samples = {
+            "rec": np.array(recs)[rec_no[selected]],
+            "sampfrom": sampfrom[selected],
+            "sampto": sampfrom[selected] + window * self.fs // 1000,
+            "label": labels,
+            "nb_spb": nb_spb[selected],
+            "nb_pvc": nb_pvc[selected],
+        }
+        return samples
+
+
+    def _get_window_pools(self, recs:Tuple[str, ...], window:int, stride:int) -> Dict[str, Any]:
+        """ finished, checked,
+
+        the concatenated window indices of `recs` and the pools of windows of the classes "N", "S", "V",
+        built once for each `(recs, window, stride)` and cached in memory, ref. `self.sample_windows`
+
+        Parameters:
+        -----------
+        recs: tuple of str,
+            names of the records
+        window: int,
+            window length, with units in ms
+        stride: int,
+            stride between starts of consecutive candidate windows, with units in ms
+
+        Returns:
+        --------
+        pooled: dict,
+            with items "rec_no" (index into `recs`), "sampfrom", "nb_spb", "nb_pvc" of all the windows,
+            and "pools", dict of the indices of the windows of each class
+        """
+        key = (recs, window, stride)
+        if key not in self._window_pools:
+            indices = [self.build_window_index(r, window=window, stride=stride) for r in recs]
+            nb_spb = np.concatenate([idx["nb_spb"] for idx in indices])
+            nb_pvc = np.concatenate([idx["nb_pvc"] for idx in indices])
+            self._window_pools[key] = {
+                "rec_no": np.concatenate([np.full(len(idx["sampfrom"]), i) for i, idx in enumerate(indices)]),
+                "sampfrom": np.concatenate([idx["sampfrom"] for idx in indices]),
+                "nb_spb": nb_spb,
+                "nb_pvc": nb_pvc,
+                "pools": {
+                    "N": np.where((nb_spb == 0) & (nb_pvc == 0))[0],
+                    "S": np.where(nb_spb > 0)[0],
+                    "V": np.where(nb_pvc > 0)[0],
+                },
+            }
+        return self._window_pools[key]
+
     
-    def plot(self, rec:Union[int,str], data:Optional[np.ndarray]=None, ann:Optional[Dict[str, np.ndarray]]=None, ticks_granularity:int=0, sampfrom:Optional[int]=None, sampto:Optional[int]=None, rpeak_inds:Optional[Union[Sequence[int],np.ndarray]]=None) -> NoReturn:
+    def plot(self, rec:Union[int,str], data:Optional[np.ndarray]=None, ann:Optional[Dict[str, np.ndarray]]=None, ticks_granularity:int=0, sampfrom:Optional[int]=None, sampto:Optional[int]=None, rpeak_inds:Optional[Union[Sequence[int],np.ndarray]]=None, **kwargs) -> NoReturn:
         """ finished, checked,
 
         Parameters:
@@ -487,11 +744,22 @@ class CPSC2020(OtherDataBase):
         rpeak_inds: array_like, optional,
             indices of R peaks,
             if `data` is None, then indices should be the absolute indices in the record
+        kwargs: dict,
+            - overview_threshold: real number, default 600,
+              ranges longer than this (in seconds) are plotted in one figure of min/max decimated signal,
+              read lazily for the visible range when zooming and panning, ref. `self._plot_overview`
+            - nb_bins: int, default 2000,
+              number of bins (about the number of pixels) of the overview
         """
         if "plt" not in dir():
             import matplotlib.pyplot as plt
         import matplotlib.patches as mpatches
 
+        sf = sampfrom or 0
+        st = (sampto or len(self._get_raw_data(rec))) if data is None else sf + len(data)
+        if st - sf > kwargs.get("overview_threshold", 600) * self.fs:
+            return self._plot_overview(rec, data, ann, sf, st, nb_bins=kwargs.get("nb_bins", 2000))
+
         patches = {}
 
         if data is None:
@@ -591,10 +859,238 @@ class CPSC2020(OtherDataBase):
             plt.show()
 
 
+
+    def _plot_overview(self, rec:Union[int,str], data:Optional[np.ndarray], ann:Optional[Dict[str, np.ndarray]], sampfrom:int, sampto:int, nb_bins:int=2000) -> DecimatedSignalView:
+        """ finished, checked,
+
+        plot a long range of the signal in one figure,
+        with the signal min/max decimated (about one bin per pixel) and read lazily for the visible range,
+        along with the premature beats
+
+        Parameters:
+        -----------
+        rec: int or str,
+            number of the record, NOTE that rec_no starts from 1,
+            or the record name
+        data: ndarray, optional,
+            ecg signal to plot,
+            if given, data of `rec` will not be used
+        ann: dict, optional,
+            annotations for `data`, "SPB_indices", "PVC_indices" (relative to `sampfrom`)
+        sampfrom: int,
+            start index of the range to plot
+        sampto: int,
+            end index of the range to plot
+        nb_bins: int, default 2000,
+            number of bins for the visible range
+
+        Returns:
+        --------
+        view: DecimatedSignalView,
+            the view of the signal, updated on zooming and panning
+        """
+        import matplotlib.pyplot as plt
+        if data is None:
+            loader = lambda sf, st: self.load_data(rec, units="μV", sampfrom=sf, sampto=st, keep_dim=False)[np.newaxis, :]
+            ann = self.load_ann(rec, sampfrom=sampfrom, sampto=sampto)
+            ann = {k: v - sampfrom for k, v in ann.items()}
+        else:
+            _data = data * 1000 if self._auto_infer_units(data) == "mV" else data
+            loader = lambda sf, st: _data[np.newaxis, sf-sampfrom: st-sampfrom]
+            ann = ann or {"SPB_indices": np.array([], dtype=int), "PVC_indices": np.array([], dtype=int)}
+
+        fig, ax = plt.subplots(figsize=(20, 4))
+        view = DecimatedSignalView([ax], loader, self.fs, sampfrom, sampto, nb_bins=nb_bins)
+        winL, winR = 0.06, 0.08
+        for k, key in [("spb", "SPB_indices"), ("pvc", "PVC_indices")]:
+            if len(ann[key]) == 0:
+                continue
+            # one collection for all the premature beats of the type
+            ax.broken_barh(
+                [(t - winL, winL + winR) for t in (np.asarray(ann[key]) / self.fs).tolist()], (0, 1),
+                transform=ax.get_xaxis_transform(),
+                color=self.palette[k], alpha=0.9, label=k.upper(),
+            )
+        ax.axhline(y=0, linestyle="-", linewidth="1.0", color="red")
+        ax.legend(loc="lower left", prop={"size": 16})
+        ax.set_xlabel("Time [s]")
+        ax.set_ylabel("Voltage [μV]")
+        plt.show()
+        return view
+
+def _greedy_match(rpeaks:np.ndarray, refs:np.ndarray, bias_thr:Real, candidates:Optional[np.ndarray]=None) -> np.ndarray:
+    """ finished, checked,
+
+    one-to-one greedy matching of `rpeaks` to `refs`, as in `_ann_to_beat_ann_epoch_v2`:
+    each R peak (in ascending order) takes the first not yet taken element of `refs`
+    in the open interval (r - bias_thr, r + bias_thr)
+
+    Parameters:
+    -----------
+    rpeaks: ndarray,
+        sorted rpeaks for forming beats
+    refs: ndarray,
+        sorted indices of the premature beats
+    bias_thr: real number,
+        tolerance for the matching
+    candidates: ndarray, optional,
+        boolean mask of the rpeaks that are allowed to be matched,
+        defaults to all rpeaks
+
+    Returns:
+    --------
+    match: ndarray,
+        index (into `refs`) of the element matched to each R peak, -1 for no match
+    """
+    match = np.full(len(rpeaks), -1, dtype=int)
+    if len(rpeaks) == 0 or len(refs) == 0:
+        return match
+    if candidates is None:
+        candidates = np.ones(len(rpeaks), dtype=bool)
+    # first element of `refs` that lies to the right of `r - bias_thr`
+    lower = np.searchsorted(refs, rpeaks - bias_thr, side="right")
+    # elements taken by the greedy procedure are increasing in index,
+    # hence `match[k] = max(lower[k], last_match_before_k + 1)`,
+    # which is solved by fixed-point iteration, converging in very few rounds
+    # since conflicts only happen among R peaks closer than `2 * bias_thr`
+    cand = lower
+    while True:
+        valid = candidates & (cand < len(refs))
+        valid[valid] = refs[cand[valid]] < rpeaks[valid] + bias_thr
+        taken = np.where(valid, cand + 1, 0)
+        next_free = np.maximum.accumulate(np.concatenate(([0], taken[:-1])))
+        new_cand = np.maximum(lower, next_free)
+        if np.array_equal(new_cand, cand):
+            break
+        cand = new_cand
+    match[valid] = cand[valid]
+    return match
+
+
+def match_beats(rpeaks:np.ndarray, ann:Dict[str, np.ndarray], bias_thr:Real, method:str="v3") -> dict:
+    """ finished, checked,
+
+    label beat types of `rpeaks` using annotations provided by the dataset,
+    via sorted search (`np.searchsorted`), in O((n+m)log(m)),
+    with the same semantics as the original loop-based implementations:
+
+    - "v1": a beat is labelled "S" ("V") if there is any SPB (PVC) with distance < `bias_thr`,
+      SPBs take priority over PVCs
+    - "v2": as "v1", but each annotation can be matched to at most one beat,
+      namely the first (earliest) beat that is close enough
+    - "v3": a beat is labelled with the type of the nearest annotation,
+      if the distance is <= `bias_thr` (SPBs take priority when tied)
+
+    Parameters:
+    -----------
+    rpeaks: ndarray,
+        rpeaks for forming beats, in ascending order
+    ann: dict,
+        with items (ndarray) "SPB_indices" and "PVC_indices",
+        which record the indices of SPBs and PVCs, in ascending order (as given by `CPSC2020.load_ann`)
+    bias_thr: real number,
+        tolerance for using annotations (PVC, SPB indices provided by the dataset),
+        to label the type of beats given by `rpeaks`
+    method: str, default "v3",
+        matching method, one of "v1", "v2", "v3"
+
+    Returns:
+    --------
+    retval: dict, with the following items
+        - ann_matched: dict of ndarray,
+            indices of annotations ("SPB_indices" and "PVC_indices")
+            that match some beat from `rpeaks`,
+            for "v1", this term is always the same as `ann`
+        - ann_unmatched: dict of ndarray,
+            indices of annotations that match no beat from `rpeaks`,
+            for "v1", this term is always empty
+        - beat_ann: ndarray,
+            label for each beat from `rpeaks`
+        - beat_match: dict of ndarray,
+            for each beat from `rpeaks`, the position (in `ann["SPB_indices"]` and `ann["PVC_indices"]` resp.)
+            of the annotation it is matched to, -1 for no match
+    """
+    rpeaks = np.asarray(rpeaks)
+    spb = np.asarray(ann["SPB_indices"]).astype(int)
+    pvc = np.asarray(ann["PVC_indices"]).astype(int)
+    beat_ann = np.full(len(rpeaks), "N", dtype="<U1")
+    spb_match = np.full(len(rpeaks), -1, dtype=int)
+    pvc_match = np.full(len(rpeaks), -1, dtype=int)
+
+    if method.lower() == "v2":
+        spb_match = _greedy_match(rpeaks, spb, bias_thr)
+        pvc_match = _greedy_match(rpeaks, pvc, bias_thr, candidates=(spb_match < 0))
+    elif method.lower() in ["v1", "v3",]:
+        spb_pos, spb_dist = _nearest(rpeaks, spb)
+        pvc_pos, pvc_dist = _nearest(rpeaks, pvc)
+        if method.lower() == "v1":
+            is_spb = spb_dist < bias_thr
+            is_pvc = (~is_spb) & (pvc_dist < bias_thr)
+        else:  # ties are resolved in the order of SPB, PVC, none, as `np.argmin` does
+            is_spb = (spb_dist <= pvc_dist) & (spb_dist <= bias_thr)
+            is_pvc = (pvc_dist < spb_dist) & (pvc_dist <= bias_thr)
+        spb_match[is_spb] = spb_pos[is_spb]
+        pvc_match[is_pvc] = pvc_pos[is_pvc]
+    else:
+        raise ValueError(f"method should be one of \"v1\", \"v2\", \"v3\", but got {method}")
+
+    beat_ann[spb_match >= 0] = "S"
+    beat_ann[pvc_match >= 0] = "V"
+    if method.lower() == "v1":
+        ann_matched = {"SPB_indices": spb.copy(), "PVC_indices": pvc.copy()}
+        ann_unmatched = {"SPB_indices": spb[:0], "PVC_indices": pvc[:0]}
+    else:
+        ann_matched, ann_unmatched = {}, {}
+        for k, refs, m in [("SPB_indices", spb, spb_match), ("PVC_indices", pvc, pvc_match)]:
+            ann_matched[k] = refs[m[m >= 0]]
+            matched_mask = np.zeros(len(refs), dtype=bool)
+            matched_mask[m[m >= 0]] = True
+            ann_unmatched[k] = refs[~matched_mask]
+    retval = dict(
+        ann_matched=ann_matched,
+        ann_unmatched=ann_unmatched,
+        beat_ann=beat_ann,
+        beat_match={"SPB_indices": spb_match, "PVC_indices": pvc_match},
+    )
+    return retval
+
+
+def _nearest(x:np.ndarray, refs:np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """ finished, checked,
+
+    find the nearest element of the sorted array `refs` for each element of `x`,
+    ties are resolved to the left (smaller) one, consistent with `np.argmin`
+
+    Parameters:
+    -----------
+    x: ndarray,
+        the query points
+    refs: ndarray,
+        sorted reference points
+
+    Returns:
+    --------
+    pos: ndarray,
+        position of the nearest element in `refs`, -1 if `refs` is empty
+    dist: ndarray,
+        distance to the nearest element, inf if `refs` is empty
+    """
+    if len(refs) == 0:
+        return np.full(len(x), -1, dtype=int), np.full(len(x), np.inf)
+    right = np.clip(np.searchsorted(refs, x, side="left"), 0, len(refs)-1)
+    left = np.clip(right - 1, 0, len(refs)-1)
+    dist_left = np.abs(x - refs[left])
+    dist_right = np.abs(x - refs[right])
+    pos = np.where(dist_left <= dist_right, left, right)
+    dist = np.minimum(dist_left, dist_right).astype(float)
+    return pos, dist
+
+
 def _ann_to_beat_ann_epoch_v1(rpeaks:np.ndarray, ann:Dict[str, np.ndarray], bias_thr:Real) -> dict:
     """ finished, checked,
 
-    the naive method to label beat types using annotations provided by the dataset
+    the naive method to label beat types using annotations provided by the dataset,
+    now a thin wrapper of `match_beats`
     
     Parameters:
     -----------
@@ -616,16 +1112,9 @@ def _ann_to_beat_ann_epoch_v1(rpeaks:np.ndarray, ann:Dict[str, np.ndarray], bias
             for v1, this term is always the same as `ann`, hence useless
         - beat_ann: ndarray,
             label for each beat from `rpeaks`
+        and items "ann_unmatched", "beat_match", see `match_beats`
     """
-    beat_ann = np.array(["N" for _ in range(len(rpeaks))])
-    for idx, r in enumerate(rpeaks):
-        if any([abs(r-p) < bias_thr for p in ann["SPB_indices"]]):
-            beat_ann[idx] = "S"
-        elif any([abs(r-p) < bias_thr for p in ann["PVC_indices"]]):
-            beat_ann[idx] = "V"
-    ann_matched = ann.copy()
-    retval = dict(ann_matched=ann_matched, beat_ann=beat_ann)
-    return retval
+    return match_beats(rpeaks, ann, bias_thr, method="v1")
 
 @DeprecationWarning
 def _ann_to_beat_ann_epoch_v2(rpeaks:np.ndarray, ann:Dict[str, np.ndarray], bias_thr:Real) -> dict:
@@ -635,8 +1124,7 @@ def _ann_to_beat_ann_epoch_v2(rpeaks:np.ndarray, ann:Dict[str, np.ndarray], bias
     for further post-process, adding those beats that are in annotation,
     but not detected by the signal preprocessing algorithms (qrs detection)
 
-    however, the comparison process (the block inside the outer `for` loop)
-    is not quite correct
+    however, the comparison process (first come, first served) is not quite correct
     
     Parameters:
     -----------
@@ -657,41 +1145,9 @@ def _ann_to_beat_ann_epoch_v2(rpeaks:np.ndarray, ann:Dict[str, np.ndarray], bias
             that match some beat from `rpeaks`
         - beat_ann: ndarray,
             label for each beat from `rpeaks`
+        and items "ann_unmatched", "beat_match", see `match_beats`
     """
-    beat_ann = np.array(["N" for _ in range(len(rpeaks))], dtype="<U1")
-    # used to add back those beat that is not detected via proprocess algorithm
-    _ann = {k: v.astype(int).tolist() for k,v in ann.items()}
-    for idx_r, r in enumerate(rpeaks):
-        found = False
-        for idx_a, a in enumerate(_ann["SPB_indices"]):
-            if abs(r-a) < bias_thr:
-                found = True
-                beat_ann[idx_r] = "S"
-                del _ann["SPB_indices"][idx_a]
-                break
-        if found:
-            continue
-        for idx_a, a in enumerate(_ann["PVC_indices"]):
-            if abs(r-a) < bias_thr:
-                found = True
-                beat_ann[idx_r] = "V"
-                del _ann["PVC_indices"][idx_a]
-                break
-    ann_matched = {
-        k: np.array([a for a in v if a not in _ann[k]], dtype=int) for k,v in ann.items()
-    }
-    retval = dict(ann_matched=ann_matched, beat_ann=beat_ann)
-    return retval
-    # _ann["SPB_indices"] = [a for a in _ann["SPB_indices"] if prev_r<a<next_r]
-    # _ann["PVC_indices"] = [a for a in _ann["PVC_indices"] if prev_r<a<next_r]
-    # augmented_rpeaks = np.concatenate((rpeaks, np.array(_ann["SPB_indices"]), np.array(_ann["PVC_indices"])))
-    # beat_ann = np.concatenate((beat_ann, np.array(["S" for _ in _ann["SPB_indices"]], dtype="<U1"), np.array(["V" for _ in _ann["PVC_indices"]], dtype="<U1")))
-    # sorted_indices = np.argsort(augmented_rpeaks)
-    # augmented_rpeaks = augmented_rpeaks[sorted_indices].astype(int)
-    # beat_ann = beat_ann[sorted_indices].astype("<U1")
-
-    # retval = dict(augmented_rpeaks=augmented_rpeaks, beat_ann=beat_ann)
-    # return retval
+    return match_beats(rpeaks, ann, bias_thr, method="v2")
 
 def _ann_to_beat_ann_epoch_v3(rpeaks:np.ndarray, ann:Dict[str, np.ndarray], bias_thr:Real) -> dict:
     """ finished, checked,
@@ -717,32 +1173,13 @@ def _ann_to_beat_ann_epoch_v3(rpeaks:np.ndarray, ann:Dict[str, np.ndarray], bias
             that match some beat from `rpeaks`
         - beat_ann: ndarray,
             label for each beat from `rpeaks`
+        and items "ann_unmatched", "beat_match", see `match_beats`
     """
-    beat_ann = np.array(["N" for _ in range(len(rpeaks))], dtype="<U1")
-    ann_matched = {k: [] for k,v in ann.items()}
-    for idx_r, r in enumerate(rpeaks):
-        dist_to_spb = np.abs(r-ann["SPB_indices"])
-        dist_to_pvc = np.abs(r-ann["PVC_indices"])
-        if len(dist_to_spb) == 0:
-            dist_to_spb = np.array([np.inf])
-        if len(dist_to_pvc) == 0:
-            dist_to_pvc = np.array([np.inf])
-        argmin = np.argmin([np.min(dist_to_spb), np.min(dist_to_pvc), bias_thr])
-        if argmin == 2:
-            pass
-        elif argmin == 1:
-            beat_ann[idx_r] = "V"
-            ann_matched["PVC_indices"].append(ann["PVC_indices"][np.argmin(dist_to_pvc)])
-        elif argmin == 0:
-            beat_ann[idx_r] = "S"
-            ann_matched["SPB_indices"].append(ann["SPB_indices"][np.argmin(dist_to_spb)])
-    ann_matched = {k: np.array(v) for k,v in ann_matched.items()}
-    retval = dict(ann_matched=ann_matched, beat_ann=beat_ann)
-    return retval
+    return match_beats(rpeaks, ann, bias_thr, method="v3")
 
 
 
-def compute_metrics(sbp_true:List[np.ndarray], pvc_true:List[np.ndarray], sbp_pred:List[np.ndarray], pvc_pred:List[np.ndarray], verbose:int=0) -> Union[Tuple[int],dict]:
+def compute_metrics(sbp_true:List[np.ndarray], pvc_true:List[np.ndarray], sbp_pred:List[np.ndarray], pvc_pred:List[np.ndarray], verbose:int=0, bias_thr:Real=0.15*400, nb_workers:int=4) -> Union[Tuple[int],dict]:
     """ finished, checked,
 
     Score Function for all (test) records
@@ -751,6 +1188,11 @@ def compute_metrics(sbp_true:List[np.ndarray], pvc_true:List[np.ndarray], sbp_pr
     -----------
     sbp_true, pvc_true, sbp_pred, pvc_pred: list of ndarray,
     verbose: int
+    bias_thr: real number, default 0.15*400,
+        tolerance (in number of samples) for a predicted beat to match a reference beat,
+        defaults to that of the official scoring function (0.15s at 400 Hz)
+    nb_workers: int, default 4,
+        number of threads to score the records in parallel
 
     Returns:
     --------
@@ -761,61 +1203,79 @@ def compute_metrics(sbp_true:List[np.ndarray], pvc_true:List[np.ndarray], sbp_pr
         - true_positive: number of true positives of each ectopic beat type
         - false_positive: number of false positives of each ectopic beat type
         - false_negative: number of false negatives of each ectopic beat type
+        - record_details: list of dict, the above counts (and scores) of each record
     """
-    s_score = np.zeros([len(sbp_true), ], dtype=int)
-    v_score = np.zeros([len(sbp_true), ], dtype=int)
+    def _score_record(i:int) -> dict:
+        s_tp, s_fp, s_fn = _count_matches(sbp_true[i], sbp_pred[i], bias_thr)
+        v_tp, v_fp, v_fn = _count_matches(pvc_true[i], pvc_pred[i], bias_thr)
+        return dict(
+            s_tp=s_tp, s_fp=s_fp, s_fn=s_fn, v_tp=v_tp, v_fp=v_fp, v_fn=v_fn,
+            s_score=s_fp * (-1) + s_fn * (-5),
+            v_score=v_fp * (-1) + v_fn * (-5),
+        )
+
     ## Scoring ##
-    for i, (s_ref, v_ref, s_pos, v_pos) in enumerate(zip(sbp_true, pvc_true, sbp_pred, pvc_pred)):
-        s_tp = 0
-        s_fp = 0
-        s_fn = 0
-        v_tp = 0
-        v_fp = 0
-        v_fn = 0
-        # SBP
-        if s_ref.size == 0:
-            s_fp = len(s_pos)
-        else:
-            for m, ans in enumerate(s_ref):
-                s_pos_cand = np.where(abs(s_pos-ans) <= BaseCfg.bias_thr)[0]
-                if s_pos_cand.size == 0:
-                    s_fn += 1
-                else:
-                    s_tp += 1
-                    s_fp += len(s_pos_cand) - 1
-        # PVC
-        if v_ref.size == 0:
-            v_fp = len(v_pos)
-        else:
-            for m, ans in enumerate(v_ref):
-                v_pos_cand = np.where(abs(v_pos-ans) <= BaseCfg.bias_thr)[0]
-                if v_pos_cand.size == 0:
-                    v_fn += 1
-                else:
-                    v_tp += 1
-                    v_fp += len(v_pos_cand) - 1
-        # calculate the score
-        s_score[i] = s_fp * (-1) + s_fn * (-5)
-        v_score[i] = v_fp * (-1) + v_fn * (-5)
-
-        if verbose >= 1:
+    nb_records = len(sbp_true)
+    if nb_workers > 1 and nb_records > 1:
+        with ThreadPoolExecutor(max_workers=min(nb_workers, nb_records)) as executor:
+            record_details = list(executor.map(_score_record, range(nb_records)))
+    else:
+        record_details = [_score_record(i) for i in range(nb_records)]
+
+    if verbose >= 1:
+        for i, d in enumerate(record_details):
             print(f"for the {i}-th record")
-            print(f"s_tp = {s_tp}, s_fp = {s_fp}, s_fn = {s_fn}")
-            print(f"v_tp = {v_tp}, v_fp = {v_fp}, s_fn = {v_fn}")
-            print(f"s_score[{i}] = {s_score[i]}, v_score[{i}] = {v_score[i]}")
+            print(f"s_tp = {d['s_tp']}, s_fp = {d['s_fp']}, s_fn = {d['s_fn']}")
+            print(f"v_tp = {d['v_tp']}, v_fp = {d['v_fp']}, v_fn = {d['v_fn']}")
+            print(f"s_score[{i}] = {d['s_score']}, v_score[{i}] = {d['v_score']}")
 
-    Score1 = np.sum(s_score)
-    Score2 = np.sum(v_score)
+    Score1 = int(np.sum([d["s_score"] for d in record_details]))
+    Score2 = int(np.sum([d["v_score"] for d in record_details]))
 
     if verbose >= 1:
+        total = {k: int(np.sum([d[k] for d in record_details])) for k in ["s_tp", "s_fp", "s_fn", "v_tp", "v_fp", "v_fn"]}
         retval = ED(
             total_loss=-(Score1+Score2),
             class_loss={"S":-Score1, "V":-Score2},
-            true_positive={"S":s_tp, "V":v_tp},
-            false_positive={"S":s_fp, "V":v_fp},
-            false_negative={"S":s_fn, "V":v_fn},
+            true_positive={"S":total["s_tp"], "V":total["v_tp"]},
+            false_positive={"S":total["s_fp"], "V":total["v_fp"]},
+            false_negative={"S":total["s_fn"], "V":total["v_fn"]},
+            record_details=record_details,
         )
     else:
         retval = Score1, Score2
 
     return retval
+
+
+def _count_matches(ref:np.ndarray, pred:np.ndarray, bias_thr:Real) -> Tuple[int, int, int]:
+    """ finished, checked,
+
+    count the true positives, false positives, false negatives of one record,
+    following the official scoring function:
+    a reference beat with no prediction within `bias_thr` is a false negative,
+    otherwise it is a true positive, and the other predictions within `bias_thr` are false positives;
+    if there is no reference beat, all predictions are false positives
+
+    Parameters:
+    -----------
+    ref: ndarray,
+        indices of the reference beats
+    pred: ndarray,
+        indices of the predicted beats
+    bias_thr: real number,
+        tolerance for a predicted beat to match a reference beat
+
+    Returns:
+    --------
+    tp, fp, fn: int,
+    """
+    ref = np.asarray(ref).flatten()
+    pred = np.sort(np.asarray(pred).flatten())
+    if ref.size == 0:
+        return 0, len(pred), 0
+    nb_cand = np.searchsorted(pred, ref+bias_thr, side="right") - np.searchsorted(pred, ref-bias_thr, side="left")
+    tp = int(np.count_nonzero(nb_cand))
+    fn = len(ref) - tp
+    fp = int(np.sum(nb_cand)) - tp
+    return tp, fp, fn
@@ -19,8 +19,7 @@ from ..utils.common import (
     DEFAULT_FIG_SIZE_PER_SEC,
     get_record_list_recursive,
 )
-from ..utils.utils_universal import generalized_intervals_intersection
-from ..base import PhysioNetDataBase
+from ..base import PhysioNetDataBase, RhythmIndex, IntervalArray, compute_windowed_hrv
 
 
 __all__ = [
@@ -91,6 +90,7 @@ class AFDB(PhysioNetDataBase):
         self.class_map = ED(
             AFIB=1, AFL=2, J=3, N=0  # an extra isoelectric
         )
+        self._rhythm_index = {}  # ref. `self.get_rhythm_index`
         self.palette = kwargs.get("palette", None)
         if self.palette is None:
             self.palette = ED(
@@ -155,7 +155,7 @@ class AFDB(PhysioNetDataBase):
         return data
 
     
-    def load_ann(self, rec:str, sampfrom:Optional[int]=None, sampto:Optional[int]=None, fmt:str="interval", keep_original:bool=False) -> Union[Dict[str, list], np.ndarray]:
+    def load_ann(self, rec:str, sampfrom:Optional[int]=None, sampto:Optional[int]=None, fmt:str="interval", keep_original:bool=False, mask_fs:Optional[Real]=None) -> Union[Dict[str, list], np.ndarray]:
         """ finished, checked,
 
         load annotations (header) stored in the .hea files
@@ -169,53 +169,100 @@ class AFDB(PhysioNetDataBase):
         sampto: int, optional,
             end index of the annotations to be loaded
         fmt: str, default "interval", case insensitive,
-            format of returned annotation, can also be "mask"
+            format of returned annotation, can also be "mask" (of dtype uint8, covering only [sampfrom, sampto))
         keep_original: bool, default False,
             if True, in the "interval" `fmt`,
             intervals (in the form [a,b]) will keep the same with the annotation file
             otherwise subtract `sampfrom` if specified
+        mask_fs: real number, optional,
+            used only when `fmt` is "mask",
+            if set, the mask will be downsampled to this label rate (e.g. 1, one label per second)
         
         Returns:
         --------
         ann, dict or ndarray,
             the annotations in the format of intervals, or in the format of mask
         """
-        fp = os.path.join(self.db_dir, rec)
-        wfdb_ann = wfdb.rdann(fp, extension=self.ann_ext)
-        header = wfdb.rdheader(fp)
-        sig_len = header.sig_len
+        sig_len = self.get_siglen(rec)
         sf = sampfrom or 0
         st = sampto or sig_len
         assert st > sf, "`sampto` should be greater than `sampfrom`!"
 
-        ann = ED({k:[] for k in self.class_map.keys()})
+        rhythm_index = self.get_rhythm_index(rec)
+        if fmt.lower() == "mask":
+            ann = rhythm_index.to_mask(
+                sf, st,
+                class_values=[self.class_map[k] for k in rhythm_index.classes],
+                fill_value=self.class_map.N,
+                step=self.fs/mask_fs if mask_fs is not None else None,
+            )
+        else:
+            ann = ED(rhythm_index.to_intervals(sf, st, keep_original=keep_original))
+
+        return ann
+
+
+    def get_rhythm_index(self, rec:str) -> RhythmIndex:
+        """ finished, checked,
+
+        the (cached) sorted-array index of the rhythm episodes of `rec`,
+        built from the annotation file at the first call
+
+        Parameters:
+        -----------
+        rec: str,
+            name of the record
+
+        Returns:
+        --------
+        rhythm_index: RhythmIndex,
+            with classes the keys of `self.class_map`
+        """
+        if rec in self._rhythm_index:
+            return self._rhythm_index[rec]
+        fp = os.path.join(self.db_dir, rec)
+        wfdb_ann = wfdb.rdann(fp, extension=self.ann_ext)
+        sig_len = self.get_siglen(rec)
+
         critical_points = wfdb_ann.sample.tolist() + [sig_len]
-        aux_note = wfdb_ann.aux_note
+        aux_note = list(wfdb_ann.aux_note)
         if aux_note[0] == "(N":
             # ref. the doc string of the class
             critical_points[0] = 0
         else:
             critical_points.insert(0, 0)
             aux_note.insert(0, "(N")
+        classes = list(self.class_map.keys())
+        labels = [classes.index(rhythm.replace("(", "")) for rhythm in aux_note]
+        self._rhythm_index[rec] = RhythmIndex(critical_points[:-1], critical_points[1:], labels, classes)
+        return self._rhythm_index[rec]
 
-        for idx, rhythm in enumerate(aux_note):
-            ann[rhythm.replace("(", "")].append([critical_points[idx], critical_points[idx+1]])
-        ann = ED({
-            k: generalized_intervals_intersection(l_itv, [[sf,st]]) \
-                for k, l_itv in ann.items()
-        })
 
-        if fmt.lower() == "mask":
-            tmp = deepcopy(ann)
-            ann = np.full(shape=(st-sf,), fill_value=self.class_map.N, dtype=int)
-            for rhythm, l_itv in tmp.items():
-                for itv in l_itv:
-                    ann[itv[0]-sf: itv[1]-sf] = self.class_map[rhythm]
-        elif not keep_original:
-            for k, l_itv in ann.items():
-                ann[k] = [[itv[0]-sf, itv[1]-sf] for itv in l_itv]
+    def get_rhythm_fraction(self, rec:str, sampfrom:Optional[int]=None, sampto:Optional[int]=None, rhythm:str="AFIB") -> float:
+        """ finished, checked,
 
-        return ann
+        fraction of the window [sampfrom, sampto) of `rec` covered by episodes of `rhythm`,
+        computed via binary search on the rhythm index (ref. `self.get_rhythm_index`)
+
+        Parameters:
+        -----------
+        rec: str,
+            name of the record
+        sampfrom: int, optional,
+            start index of the window
+        sampto: int, optional,
+            end index of the window
+        rhythm: str, default "AFIB",
+            name of the rhythm, one of the keys of `self.class_map`
+
+        Returns:
+        --------
+        frac: float,
+        """
+        sf = sampfrom or 0
+        st = sampto or self.get_siglen(rec)
+        assert st > sf, "`sampto` should be greater than `sampfrom`!"
+        return self.get_rhythm_index(rec).fraction(sf, st, rhythm)
 
 
     def load_beat_ann(self, rec:str, sampfrom:Optional[int]=None, sampto:Optional[int]=None, use_manual:bool=True, keep_original:bool=False) -> np.ndarray:
@@ -243,20 +290,15 @@ class AFDB(PhysioNetDataBase):
         ann, ndarray,
             locations (indices) of the qrs complexes
         """
-        fp = os.path.join(self.db_dir, rec)
         if use_manual and rec in self.qrsc_records:
             ext = self.manual_beat_ann_ext
         else:
             ext = self.auto_beat_ann_ext
-        ann = wfdb.rdann(
-            fp,
-            extension=ext,
-            sampfrom=sampfrom or 0,
-            sampto=sampto,
-        )
-        ann = ann.sample
+        ann, _, _ = self.get_beat_ann_table(rec, ext, sampfrom, sampto)
         if not keep_original and sampfrom is not None:
-            ann -= sampfrom
+            ann = ann - sampfrom
+        else:
+            ann = ann.copy()
         return ann
 
 
@@ -267,6 +309,50 @@ class AFDB(PhysioNetDataBase):
         return self.load_beat_ann(rec, sampfrom, sampto, use_manual, keep_original)
 
 
+    def compute_hrv_features(self, rec:str, window:Real=300, stride:Real=30, sampfrom:Optional[int]=None, sampto:Optional[int]=None, freq_domain:bool=True, use_manual:bool=True) -> pd.DataFrame:
+        """ finished, checked,
+
+        RR-interval and HRV features of `rec` over sliding windows,
+        computed from the (cached) beat annotations,
+        with RR intervals adjacent to beats not labelled normal ("N") excluded
+
+        Parameters:
+        -----------
+        rec: str,
+            name of the record
+        window: real number, default 300,
+            length of the windows, with units in seconds
+        stride: real number, default 30,
+            stride of the windows, with units in seconds
+        sampfrom: int, optional,
+            start index of the first window
+        sampto: int, optional,
+            end index of the windows
+        freq_domain: bool, default True,
+            whether or not to compute the frequency-domain features (VLF, LF, HF powers and LF/HF)
+        use_manual: bool, default True,
+            use manually annotated beat annotations (qrsc) if available,
+            instead of those generated by algorithms
+
+        Returns:
+        --------
+        df_hrv: DataFrame,
+            one row for each window, ref. `compute_windowed_hrv`
+        """
+        if use_manual and rec in self.qrsc_records:
+            ext = self.manual_beat_ann_ext
+        else:
+            ext = self.auto_beat_ann_ext
+        samples, codes, symbols = self.get_beat_ann_table(rec, ext)
+        normal = (codes == self.get_beat_ann_symbol_codes(symbols, ["N"])[0])
+        df_hrv = compute_windowed_hrv(
+            samples, self.fs, valid=normal,
+            window=window, stride=stride, sampfrom=sampfrom, sampto=sampto or self.get_siglen(rec),
+            freq_domain=freq_domain,
+        )
+        return df_hrv
+
+
     def plot(self, rec:str, data:Optional[np.ndarray]=None, ann:Optional[Dict[str, np.ndarray]]=None, rpeak_inds:Optional[Union[Sequence[int],np.ndarray]]=None, ticks_granularity:int=0, leads:Optional[Union[str, List[str]]]=None, sampfrom:Optional[int]=None, sampto:Optional[int]=None, same_range:bool=False, **kwargs) -> NoReturn:
         """ finished, checked,
 
@@ -303,6 +389,11 @@ class AFDB(PhysioNetDataBase):
         same_range: bool, default False,
             if True, forces all leads to have the same y range
         kwargs: dict,
+            - overview_threshold: real number, default 600,
+              ranges longer than this (in seconds) are plotted in one figure of min/max decimated signals,
+              read lazily for the visible range when zooming and panning, ref. `self._plot_rhythm_overview`
+            - nb_bins: int, default 2000,
+              number of bins (about the number of pixels) of the overview
         """
         if "plt" not in dir():
             import matplotlib.pyplot as plt
@@ -316,6 +407,13 @@ class AFDB(PhysioNetDataBase):
         assert all([l in self.all_leads for l in _leads])
 
         lead_indices = [self.all_leads.index(l) for l in _leads]
+        sf = sampfrom or 0
+        st = (sampto or self.get_siglen(rec)) if data is None else sf + data.shape[-1]
+        if st - sf > kwargs.get("overview_threshold", 600) * self.fs:
+            return self._plot_rhythm_overview(
+                rec, data, ann, _leads if data is None else [f"ECG_{idx}" for idx in range(data.shape[0])], sf, st,
+                class_map=self.class_map, excluded_classes=["N", "NOISE"], nb_bins=kwargs.get("nb_bins", 2000),
+            )
         if data is None:
             _data = self.load_data(
                 rec,
@@ -345,7 +443,7 @@ class AFDB(PhysioNetDataBase):
             _ann = ann or ED({k:[] for k in self.class_map.keys()})
         # indices to time
         _ann = {
-            k: [[itv[0]/self.fs, itv[1]/self.fs] for itv in l_itv] \
+            k: IntervalArray.from_list(np.array(l_itv).reshape(-1, 2) / self.fs) \
                 for k, l_itv in _ann.items()
         }
         if rpeak_inds is None and data is None:
@@ -372,8 +470,8 @@ class AFDB(PhysioNetDataBase):
             seg_data = _data[...,seg_idx*line_len: (seg_idx+1)*line_len]
             secs = (np.arange(seg_data.shape[1]) + seg_idx*line_len) / self.fs
             seg_ann = {
-                k: generalized_intervals_intersection(l_itv, [[secs[0], secs[-1]]]) \
-                    for k, l_itv in _ann.items()
+                k: itv_arr.clip(secs[0], secs[-1]).to_list() \
+                    for k, itv_arr in _ann.items()
             }
             seg_rpeaks = _rpeak[np.where((_rpeak>=secs[0]) & (_rpeak<secs[-1]))[0]]
             fig_sz_w = int(round(DEFAULT_FIG_SIZE_PER_SEC * seg_data.shape[1] / self.fs))
@@ -3,8 +3,10 @@
 """
 import os
 import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Union, Optional, Any, List, Tuple, NoReturn
+from typing import Union, Optional, Any, List, Tuple, Dict, Sequence, NoReturn
 from numbers import Real
 
 import numpy as np
@@ -16,7 +18,7 @@ from ..utils.common import (
     ArrayLike,
     get_record_list_recursive,
 )
-from ..base import PhysioNetDataBase
+from ..base import PhysioNetDataBase, IntervalArray, compute_windowed_hrv
 
 
 __all__ = [
@@ -89,6 +91,12 @@ class ApneaECG(PhysioNetDataBase):
         self.apnea_group = [r for r in self.learning_set if "a" in r]
 
         self.sleep_event_keys = ["event_name", "event_start", "event_end", "event_duration"]
+        # per-minute labels, ref. `self.load_minute_labels`
+        self.minute_label_map = {"N": 0, "A": 1}
+        self._minute_labels = {}
+        # per-minute training samples, ref. `self.load_minute_dataset`
+        self.minute_dataset_dir = kwargs.get("minute_dataset_dir", os.path.join(self.working_dir, "minute_dataset"))
+        self.minute_rr_feature_names = ["nb_beats", "mean_nn", "sdnn", "rmssd", "pnn50", "mean_hr"]
         self.palette = {
             "Obstructive Apnea": "yellow",
         }
@@ -150,7 +158,7 @@ class ApneaECG(PhysioNetDataBase):
             print(self.__doc__)
 
 
-    def load_data(self, rec:str, lead:int=0, rec_path:Optional[str]=None) -> np.ndarray:
+    def load_data(self, rec:str, lead:int=0, rec_path:Optional[str]=None, sampfrom:Optional[int]=None, sampto:Optional[int]=None) -> np.ndarray:
         """
 
         Parameters:
@@ -162,36 +170,46 @@ class ApneaECG(PhysioNetDataBase):
         rec_path: str, optional,
             path of the file which contains the ecg data,
             if not given, default path will be used
+        sampfrom: int, optional,
+            start index of the data to be loaded
+        sampto: int, optional,
+            end index of the data to be loaded
+
+        NOTE: only the ECG channel is decoded for the ECG records,
+        and the record is no longer kept in `self.wfdb_rec`
         """
         file_path = rec_path if rec_path is not None else os.path.join(self.db_dir, rec)
-        self.wfdb_rec = wfdb.rdrecord(file_path)
-        sig = self.wfdb_rec.p_signal
-        if not rec.endswith(("r", "er")):
-            sig = sig[:,0]  # flatten ECG signal
+        if rec.endswith(("r", "er")):
+            sig = wfdb.rdrecord(file_path, sampfrom=sampfrom or 0, sampto=sampto).p_signal
+        else:
+            sig = wfdb.rdrecord(file_path, sampfrom=sampfrom or 0, sampto=sampto, channels=[0]).p_signal[:,0]  # flatten ECG signal
         return sig
 
 
-    def load_ecg_data(self, rec:str, lead:int=0, rec_path:Optional[str]=None) -> np.ndarray:
+    def load_ecg_data(self, rec:str, lead:int=0, rec_path:Optional[str]=None, sampfrom:Optional[int]=None, sampto:Optional[int]=None) -> np.ndarray:
         """
         """
         if rec.endswith(("r", "er")):
             raise ValueError(f"{rec} is not a record of ECG signals")
-        return self.load_data(rec=rec, lead=lead, rec_path=rec_path)
+        return self.load_data(rec=rec, lead=lead, rec_path=rec_path, sampfrom=sampfrom, sampto=sampto)
 
 
-    def load_rsp_data(self, rec:str, lead:int=0, channels:Optional[Union[str, List[str], Tuple[str]]]=None, rec_path:Optional[str]=None) -> np.ndarray:
+    def load_rsp_data(self, rec:str, lead:int=0, channels:Optional[Union[str, List[str], Tuple[str]]]=None, rec_path:Optional[str]=None, sampfrom:Optional[int]=None, sampto:Optional[int]=None) -> Dict[str, np.ndarray]:
         """
+
+        only the selected channels are decoded
         """
         if not rec.endswith(("r", "er")):
             raise ValueError(f"{rec} is not a record of RSP signals")
-        sig = self.load_data(rec=rec, lead=lead, rec_path=rec_path)
         if channels is not None:
             chns = [channels] if isinstance(channels, str) else list(channels)
             if any([c not in self.rsp_channels for c in chns]):
                 raise ValueError(f"Invalid channel(s): {[c for c in chns if c not in self.rsp_channels]}")
         else:
             chns = self.rsp_channels
-        sig = {c: sig[:,self.wfdb_rec.sig_name.index(c)] for c in chns}
+        file_path = rec_path if rec_path is not None else os.path.join(self.db_dir, rec)
+        wfdb_rec = wfdb.rdrecord(file_path, sampfrom=sampfrom or 0, sampto=sampto, channel_names=chns)
+        sig = {c: wfdb_rec.p_signal[:,wfdb_rec.sig_name.index(c)] for c in chns}
         return sig
 
 
@@ -214,10 +232,244 @@ class ApneaECG(PhysioNetDataBase):
         file_path = ann_path if ann_path is not None else os.path.join(self.db_dir, rec)
         extension = kwargs.get("extension", "apn")
         self.wfdb_ann = wfdb.rdann(file_path, extension=extension)
-        detailed_ann = [[si//(self.fs*60), sy] for si, sy in zip(self.wfdb_ann.sample, self.wfdb_ann.symbol)]
+        minutes = (self.wfdb_ann.sample // (self.fs*60)).tolist()
+        detailed_ann = [[m, sy] for m, sy in zip(minutes, self.wfdb_ann.symbol)]
         return detailed_ann
 
 
+    def load_minute_labels(self, rec:str, ann_path:Optional[str]=None) -> np.ndarray:
+        """ finished, checked,
+
+        load the per-minute apnea labels of `rec` as an array (cached in memory),
+        the i-th element being the label of the i-th minute
+
+        Parameters:
+        -----------
+        rec: str,
+            record name
+        ann_path: str, optional,
+            path of the file which contains the annotations,
+            if not given, default path will be used
+
+        Returns:
+        --------
+        labels: ndarray,
+            of dtype int8, with values in `self.minute_label_map` (0 for "N", 1 for "A"),
+            and -1 for minutes without annotation
+        """
+        file_path = ann_path if ann_path is not None else os.path.join(self.db_dir, rec)
+        if file_path not in self._minute_labels:
+            wfdb_ann = wfdb.rdann(file_path, extension=self.ann_ext)
+            minutes = wfdb_ann.sample // (self.fs*60)
+            symbols = np.array(wfdb_ann.symbol)
+            labels = np.full(minutes.max()+1 if len(minutes) > 0 else 0, -1, dtype=np.int8)
+            for sy, v in self.minute_label_map.items():
+                labels[minutes[symbols == sy]] = v
+            self._minute_labels[file_path] = labels
+        return self._minute_labels[file_path].copy()
+
+
+    def load_minute_label_matrix(self, recs:Optional[Sequence[str]]=None, nb_workers:int=8) -> Dict[str, np.ndarray]:
+        """ finished, checked,
+
+        load the per-minute apnea labels of multiple records (defaults to the whole learning set) at once,
+        the annotation files being read in parallel
+
+        Parameters:
+        -----------
+        recs: sequence of str, optional,
+            names of the records, defaults to `self.learning_set`
+        nb_workers: int, default 8,
+            number of threads reading the annotation files
+
+        Returns:
+        --------
+        label_matrix: dict,
+            with items
+            - "records": ndarray of str, the records, corr. to the rows of "labels"
+            - "labels": ndarray of int8, of shape (n_records, max_nb_minutes), ref. `self.load_minute_labels`,
+              padded with -1 at the end of the shorter records
+            - "nb_minutes": ndarray of int, number of minutes (annotated) of the records
+        """
+        _recs = list(recs) if recs is not None else list(self.learning_set)
+        with ThreadPoolExecutor(max_workers=max(1, nb_workers)) as executor:
+            l_labels = list(executor.map(self.load_minute_labels, _recs))
+        nb_minutes = np.array([len(labels) for labels in l_labels], dtype=int)
+        labels = np.full((len(_recs), nb_minutes.max(initial=0)), -1, dtype=np.int8)
+        labels[np.arange(labels.shape[1]) < nb_minutes[:, np.newaxis]] = np.concatenate(l_labels + [np.array([], dtype=np.int8)])
+        label_matrix = {
+            "records": np.array(_recs),
+            "labels": labels,
+            "nb_minutes": nb_minutes,
+        }
+        return label_matrix
+
+
+    def load_minute_dataset(self, rec:str, context:int=0, block_minutes:int=60, use_cache:bool=True, rec_path:Optional[str]=None) -> Dict[str, np.ndarray]:
+        """ finished, checked,
+
+        load the per-minute training samples of `rec`,
+        each sample consisting of the ECG segment of one minute (with `context` minutes on both sides),
+        the RR features of the same segment, the respiration signals of the same segment (if any),
+        and the apnea label of the (central) minute
+
+        the signals are read in one streaming pass (in blocks of `block_minutes` minutes) into float32 buffers,
+        from which the segments are gathered at once, and the packed arrays are cached in `self.minute_dataset_dir`
+
+        Parameters:
+        -----------
+        rec: str,
+            name of the ECG record
+        context: int, default 0,
+            number of minutes of context on each side of the labelled minute,
+            minutes without full context (at the two ends of the record) are dropped
+        block_minutes: int, default 60,
+            number of minutes of the signals decoded at a time
+        use_cache: bool, default True,
+            if True, load from the cache if it is not older than the files of the record
+        rec_path: str, optional,
+            path of the record (without file extension),
+            defaults to `rec` in `self.db_dir`
+
+        Returns:
+        --------
+        dataset: dict,
+            with items
+            - "minutes": ndarray of int, indices of the (central) minutes of the samples
+            - "labels": ndarray of int8, labels of the minutes, ref. `self.load_minute_labels`,
+              minutes without annotation are dropped, unless the record has no annotation file (the test set),
+              in which case all labels are -1
+            - "ecg": ndarray of float32, of shape (n_samples, (2*`context`+1) * 60 * `self.fs`)
+            - "rr_features": ndarray of float32, of shape (n_samples, n_features), ref. `compute_windowed_hrv`,
+              NaN if there is no QRS annotation file
+            - "rr_feature_names": ndarray of str, `self.minute_rr_feature_names`
+            - "rsp": ndarray of float32, of shape (n_samples, n_channels, (2*`context`+1) * 60 * `self.fs`),
+              signals of the channels "rsp_channels" in the respiration record (the ECG record name suffixed with "r"),
+              with n_channels being 0 if the record has no respiration record
+            - "rsp_channels": ndarray of str, the respiration channels
+        """
+        if rec.endswith(("r", "er")):
+            raise ValueError(f"{rec} is not a record of ECG signals")
+        rec_path = rec_path or os.path.join(self.db_dir, rec)
+        rsp_rec_path = f"{rec_path}r" if f"{rec}r" in self.rsp_records else None
+        src_files = [
+            f"{p}.{ext}" for p in [rec_path, rsp_rec_path] if p is not None \
+                for ext in ["hea", self.data_ext, self.ann_ext, self.qrs_ann_ext]
+        ]
+        src_files = [fp for fp in src_files if os.path.isfile(fp)]
+        rec_path_digest = hashlib.md5(os.path.abspath(rec_path).encode("utf-8")).hexdigest()[:12]
+        cache_fp = os.path.join(self.minute_dataset_dir, f"{rec.replace(os.sep, '_')}_{rec_path_digest}_context{context}.npz")
+        if use_cache and os.path.isfile(cache_fp) \
+            and os.path.getmtime(cache_fp) >= max([os.path.getmtime(fp) for fp in src_files], default=0):
+            with np.load(cache_fp) as npz:
+                return {k: npz[k] for k in npz.files}
+
+        spm = int(self.fs * 60)  # samples per minute
+        seg_len = (2 * context + 1) * spm
+        nb_minutes = self.get_siglen(rec, rec_path=rec_path) // spm
+        if rsp_rec_path is not None:
+            nb_minutes = min(nb_minutes, self.get_siglen(f"{rec}r", rec_path=rsp_rec_path) // spm)
+
+        labels = np.full(nb_minutes, -1, dtype=np.int8)
+        annotated = os.path.isfile(f"{rec_path}.{self.ann_ext}")
+        if annotated:
+            minute_labels = self.load_minute_labels(rec, ann_path=rec_path)[:nb_minutes]
+            labels[:len(minute_labels)] = minute_labels
+        minutes = np.arange(context, nb_minutes - context)
+        if annotated:
+            minutes = minutes[labels[minutes] >= 0]
+        # row k of the windows below is the segment centered at minute k + `context`
+        rows = minutes - context
+
+        def _read_signals(path:str, channel_names:Optional[List[str]]=None) -> np.ndarray:
+            buffer = np.empty((nb_minutes * spm, len(channel_names or [0])), dtype=np.float32)
+            for b in range(0, nb_minutes, block_minutes):
+                sampfrom, sampto = b * spm, min(b + block_minutes, nb_minutes) * spm
+                if channel_names is None:
+                    buffer[sampfrom:sampto] = wfdb.rdrecord(path, sampfrom=sampfrom, sampto=sampto, channels=[0]).p_signal
+                else:
+                    wfdb_rec = wfdb.rdrecord(path, sampfrom=sampfrom, sampto=sampto, channel_names=channel_names)
+                    buffer[sampfrom:sampto] = wfdb_rec.p_signal[:, [wfdb_rec.sig_name.index(c) for c in channel_names]]
+            return buffer.T
+
+        def _segments(buffer:np.ndarray) -> np.ndarray:
+            if len(rows) == 0:
+                return np.empty((len(buffer), 0, seg_len), dtype=np.float32)
+            windows = np.lib.stride_tricks.sliding_window_view(buffer, seg_len, axis=1)[:, ::spm]
+            return windows[:, rows]
+
+        ecg = np.ascontiguousarray(_segments(_read_signals(rec_path))[0])
+        if rsp_rec_path is not None:
+            rsp_channels = list(self.rsp_channels)
+            rsp = np.ascontiguousarray(_segments(_read_signals(rsp_rec_path, rsp_channels)).transpose(1, 0, 2))
+        else:
+            rsp_channels = []
+            rsp = np.empty((len(rows), 0, seg_len), dtype=np.float32)
+
+        if os.path.isfile(f"{rec_path}.{self.qrs_ann_ext}"):
+            rpeaks, _, _ = self.get_beat_ann_table(rec, self.qrs_ann_ext, rec_path=rec_path)
+            df_hrv = compute_windowed_hrv(
+                rpeaks, self.fs, window=seg_len / self.fs, stride=60,
+                sampfrom=0, sampto=nb_minutes * spm, freq_domain=False,
+            )
+            rr_features = df_hrv[self.minute_rr_feature_names].to_numpy(dtype=np.float32)[rows]
+        else:
+            rr_features = np.full((len(rows), len(self.minute_rr_feature_names)), np.nan, dtype=np.float32)
+
+        dataset = {
+            "minutes": minutes,
+            "labels": labels[minutes],
+            "ecg": ecg,
+            "rr_features": rr_features,
+            "rr_feature_names": np.array(self.minute_rr_feature_names, dtype=str),
+            "rsp": rsp,
+            "rsp_channels": np.array(rsp_channels, dtype=str),
+        }
+        os.makedirs(self.minute_dataset_dir, exist_ok=True)
+        np.savez(cache_fp, **dataset)
+        return dataset
+
+
+    def load_minute_datasets(self, recs:Optional[Sequence[str]]=None, context:int=0, nb_workers:int=4, **kwargs) -> Dict[str, np.ndarray]:
+        """ finished, checked,
+
+        load and concatenate the per-minute training samples of multiple records (defaults to the whole learning set),
+        the records being processed in parallel
+
+        Parameters:
+        -----------
+        recs: sequence of str, optional,
+            names of the ECG records, defaults to `self.learning_set`
+        context: int, default 0,
+            number of minutes of context on each side of the labelled minute
+        nb_workers: int, default 4,
+            number of threads processing the records
+        kwargs: dict,
+            other key word arguments passed to `self.load_minute_dataset`
+
+        Returns:
+        --------
+        datasets: dict,
+            with items of `self.load_minute_dataset` concatenated along the first axis,
+            and an additional item "records", the record of each sample,
+            "rsp" is dropped if not all of the records have respiration signals
+        """
+        _recs = list(recs) if recs is not None else list(self.learning_set)
+        with ThreadPoolExecutor(max_workers=max(1, nb_workers)) as executor:
+            l_datasets = list(executor.map(lambda r: self.load_minute_dataset(r, context=context, **kwargs), _recs))
+        datasets = {
+            "records": np.repeat(np.array(_recs, dtype=str), [len(ds["minutes"]) for ds in l_datasets]),
+            "rr_feature_names": np.array(self.minute_rr_feature_names, dtype=str),
+        }
+        keys = ["minutes", "labels", "ecg", "rr_features"]
+        if len(l_datasets) > 0 and all([len(ds["rsp_channels"]) > 0 for ds in l_datasets]):
+            keys.append("rsp")
+            datasets["rsp_channels"] = l_datasets[0]["rsp_channels"]
+        for k in keys:
+            datasets[k] = np.concatenate([ds[k] for ds in l_datasets]) if len(l_datasets) > 0 else np.array([])
+        return datasets
+
+
     def load_apnea_event_ann(self, rec:str, ann_path:Optional[str]=None) -> pd.DataFrame:
         """
 
@@ -232,40 +484,26 @@ class ApneaECG(PhysioNetDataBase):
         Returns:
         --------
         df_apnea_ann: DataFrame,
-            apnea annotations with columns "event_start","event_end", "event_name", "event_duration"
+            apnea annotations with columns "event_start","event_end", "event_name", "event_duration",
+            "event_start" and "event_end" (in seconds) being the starts of the first and of the last apnea minutes
         """
-        detailed_anno = self.load_ann(rec, ann_path, extension="apn")
-        apnea = np.array([p[0] for p in detailed_anno if p[1] == "A"])
-
-        if len(apnea) > 0:
-            apnea_endpoints = [apnea[0]]
-            # TODO: check if split_indices is correctly computed
-            split_indices = np.where(np.diff(apnea)>1)[0].tolist()
-            for i in split_indices:
-                apnea_endpoints += [apnea[i], apnea[i+1]]
-            apnea_endpoints.append(apnea[-1])
-
-            apnea_periods = []
-            for i in range(len(apnea_endpoints)//2):
-                pe = [apnea_endpoints[2*i], apnea_endpoints[2*i+1]]
-                apnea_periods.append(pe)
-        else:
-            apnea_periods = []
+        # runs of consecutive apnea minutes
+        apnea_itv = IntervalArray.from_mask(self.load_minute_labels(rec, ann_path) == self.minute_label_map["A"])
+        apnea_periods = np.column_stack([apnea_itv.starts, apnea_itv.ends - 1])
         
         if len(apnea_periods) > 0:
-            self.logger.info(f"apnea period(s) (units in minutes) of record {rec} is(are): {apnea_periods}")
+            self.logger.info(f"apnea period(s) (units in minutes) of record {rec} is(are): {apnea_periods.tolist()}")
         else:
             self.logger.info(f"record {rec} has no apnea period")
 
         if len(apnea_periods) == 0:
             return pd.DataFrame(columns=self.sleep_event_keys)
 
-        apnea_periods = np.array([[60*p[0], 60*p[1]] for p in apnea_periods])  # minutes to seconds
-        apnea_periods = np.array(apnea_periods,dtype=int).reshape((len(apnea_periods),2))
+        apnea_periods = (60 * apnea_periods).astype(int)  # minutes to seconds
 
         df_apnea_ann = pd.DataFrame(apnea_periods,columns=["event_start","event_end"])
         df_apnea_ann["event_name"] = "Obstructive Apnea"
-        df_apnea_ann["event_duration"] = df_apnea_ann.apply(lambda row: row["event_end"]-row["event_start"], axis=1)
+        df_apnea_ann["event_duration"] = df_apnea_ann["event_end"] - df_apnea_ann["event_start"]
 
         df_apnea_ann = df_apnea_ann[self.sleep_event_keys]
 
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 """
 """
-import os, io, sys
+import os, sys
 import re
 import json
 import time
@@ -34,7 +34,10 @@ from ..utils.utils_misc.cinc2020_aux_data import (
     equiv_class_dict,
 )
 from ..utils.utils_universal.utils_str import dict_to_str
-from ..base import PhysioNetDataBase
+from ..base import (
+    PhysioNetDataBase,
+    parse_wfdb_header, parse_wfdb_lead_lines, parse_dx,
+)
 
 
 __all__ = [
@@ -588,38 +591,16 @@ class CINC2020(PhysioNetDataBase):
         ann_dict, dict,
             the annotations with items: ref. `self.ann_items`
         """
-        ann_dict = {}
-        ann_dict["rec_name"], ann_dict["nb_leads"], ann_dict["fs"], ann_dict["nb_samples"], ann_dict["datetime"], daytime = header_data[0].split(" ")
-
-        ann_dict["nb_leads"] = int(ann_dict["nb_leads"])
-        ann_dict["fs"] = int(ann_dict["fs"])
-        ann_dict["nb_samples"] = int(ann_dict["nb_samples"])
-        ann_dict["datetime"] = datetime.strptime(" ".join([ann_dict["datetime"], daytime]), "%d-%b-%Y %H:%M:%S")
-        try: # see NOTE. 1.
-            ann_dict["age"] = int([l for l in header_data if l.startswith("#Age")][0].split(": ")[-1])
-        except:
-            ann_dict["age"] = np.nan
-        try:
-            ann_dict["sex"] = [l for l in header_data if l.startswith("#Sex")][0].split(": ")[-1]
-        except:
-            ann_dict["sex"] = "Unknown"
-        try:
-            ann_dict["medical_prescription"] = [l for l in header_data if l.startswith("#Rx")][0].split(": ")[-1]
-        except:
-            ann_dict["medical_prescription"] = "Unknown"
-        try:
-            ann_dict["history"] = [l for l in header_data if l.startswith("#Hx")][0].split(": ")[-1]
-        except:
-            ann_dict["history"] = "Unknown"
-        try:
-            ann_dict["symptom_or_surgery"] = [l for l in header_data if l.startswith("#Sx")][0].split(": ")[-1]
-        except:
-            ann_dict["symptom_or_surgery"] = "Unknown"
-
-        l_Dx = [l for l in header_data if l.startswith("#Dx")][0].split(": ")[-1].split(",")
-        ann_dict["diagnosis"], ann_dict["diagnosis_scored"] = self._parse_diagnosis(l_Dx)
+        header = parse_wfdb_header(header_data, parse_leads=False)
+        ann_dict = {
+            k: header[k] for k in [
+                "rec_name", "nb_leads", "fs", "nb_samples", "datetime",
+                "age", "sex", "medical_prescription", "history", "symptom_or_surgery",
+            ]
+        }
+        ann_dict["diagnosis"], ann_dict["diagnosis_scored"] = self._parse_diagnosis(header["Dx"])
 
-        ann_dict["df_leads"] = self._parse_leads(header_data[1:13])
+        ann_dict["df_leads"] = self._parse_leads(header_data[1:1+header["nb_leads"]])
 
         return ann_dict
 
@@ -639,36 +620,7 @@ class CINC2020(PhysioNetDataBase):
         diag_scored_dict: dict,
             the scored items in `diag_dict`
         """
-        diag_dict, diag_scored_dict = {}, {}
-        try:
-            diag_dict["diagnosis_code"] = [item for item in l_Dx]
-            # selection = dx_mapping_all["SNOMED CT Code"].isin(diag_dict["diagnosis_code"])
-            # diag_dict["diagnosis_abbr"] = dx_mapping_all[selection]["Abbreviation"].tolist()
-            # diag_dict["diagnosis_fullname"] = dx_mapping_all[selection]["Dx"].tolist()
-            diag_dict["diagnosis_abbr"] = \
-                [ dx_mapping_all[dx_mapping_all["SNOMED CT Code"]==dc]["Abbreviation"].values[0] \
-                    for dc in diag_dict["diagnosis_code"] ]
-            diag_dict["diagnosis_fullname"] = \
-                [ dx_mapping_all[dx_mapping_all["SNOMED CT Code"]==dc]["Dx"].values[0] \
-                    for dc in diag_dict["diagnosis_code"] ]
-            scored_indices = np.isin(diag_dict["diagnosis_code"], dx_mapping_scored["SNOMED CT Code"].values)
-            diag_scored_dict["diagnosis_code"] = \
-                [ item for idx, item in enumerate(diag_dict["diagnosis_code"]) \
-                    if scored_indices[idx] ]
-            diag_scored_dict["diagnosis_abbr"] = \
-                [ item for idx, item in enumerate(diag_dict["diagnosis_abbr"]) \
-                    if scored_indices[idx] ]
-            diag_scored_dict["diagnosis_fullname"] = \
-                [ item for idx, item in enumerate(diag_dict["diagnosis_fullname"]) \
-                    if scored_indices[idx] ]
-        except:  # the old version, the Dx"s are abbreviations
-            diag_dict["diagnosis_abbr"] = diag_dict["diagnosis_code"]
-            selection = dx_mapping_all["Abbreviation"].isin(diag_dict["diagnosis_abbr"])
-            diag_dict["diagnosis_fullname"] = dx_mapping_all[selection]["Dx"].tolist()
-        # if not keep_original:
-        #     for idx, d in enumerate(ann_dict["diagnosis_abbr"]):
-        #         if d in ["Normal", "NSR"]:
-        #             ann_dict["diagnosis_abbr"] = ["N"]
+        diag_dict, diag_scored_dict = parse_dx(l_Dx, dx_mapping_all, dx_mapping_scored)
         return diag_dict, diag_scored_dict
 
 
@@ -685,16 +637,7 @@ class CINC2020(PhysioNetDataBase):
         df_leads: DataFrame,
             infomation of each leads in the format of DataFrame
         """
-        df_leads = pd.read_csv(io.StringIO("\n".join(l_leads_data)), delim_whitespace=True, header=None)
-        df_leads.columns = ["filename", "fmt+byte_offset", "adc_gain+units", "adc_res", "adc_zero", "init_value", "checksum", "block_size", "lead_name",]
-        df_leads["fmt"] = df_leads["fmt+byte_offset"].apply(lambda s: s.split("+")[0])
-        df_leads["byte_offset"] = df_leads["fmt+byte_offset"].apply(lambda s: s.split("+")[1])
-        df_leads["adc_gain"] = df_leads["adc_gain+units"].apply(lambda s: s.split("/")[0])
-        df_leads["adc_units"] = df_leads["adc_gain+units"].apply(lambda s: s.split("/")[1])
-        for k in ["byte_offset", "adc_gain", "adc_res", "adc_zero", "init_value", "checksum",]:
-            df_leads[k] = df_leads[k].apply(lambda s: int(s))
-        df_leads["baseline"] = df_leads["adc_zero"]
-        df_leads = df_leads[["filename", "fmt", "byte_offset", "adc_gain", "adc_units", "adc_res", "adc_zero", "baseline", "init_value", "checksum", "block_size", "lead_name"]]
+        df_leads = pd.DataFrame(parse_wfdb_lead_lines(l_leads_data))
         df_leads.index = df_leads["lead_name"]
         df_leads.index.name = None
         return df_leads
@@ -732,11 +675,14 @@ class CINC2020(PhysioNetDataBase):
         labels, list,
             the list of labels
         """
-        ann_dict = self.load_ann(rec)
+        # only the diagnoses are needed, hence parsed directly from the header lines
+        with open(self.get_header_filepath(rec, with_ext=True), "r") as f:
+            header_data = f.read().splitlines()
+        diag_dict, diag_scored_dict = self._parse_diagnosis(parse_wfdb_header(header_data, parse_leads=False)["Dx"])
         if scored_only:
-            labels = ann_dict["diagnosis_scored"]
+            labels = diag_scored_dict
         else:
-            labels = ann_dict["diagnosis"]
+            labels = diag_dict
         if fmt.lower() == "a":
             labels = labels["diagnosis_abbr"]
         elif fmt.lower() == "f":
@@ -750,6 +696,63 @@ class CINC2020(PhysioNetDataBase):
         return labels
 
 
+    def load_header_index(self, use_cache:bool=True, nb_workers:int=8) -> pd.DataFrame:
+        """ finished, checked,
+
+        load the index of the records from the record lines of all the header files,
+        without opening the signal files,
+        which is cached to a csv file in `self.working_dir`
+
+        Parameters:
+        -----------
+        use_cache: bool, default True,
+            whether or not to use (read and write) the cache file
+        nb_workers: int, default 8,
+            number of threads to read the header files
+
+        Returns:
+        --------
+        df_index: DataFrame,
+            indexed by the record names, with columns "tranche", "fs", "nb_samples"
+        """
+        if self._header_index is not None:
+            return self._header_index
+        all_records = [rec for tranche in self.db_tranches for rec in self._all_records[tranche]]
+        return self._load_header_index(
+            all_records,
+            header_filepath=lambda rec: self.get_header_filepath(rec, with_ext=True),
+            extra_columns={"tranche": [self._get_tranche(rec) for rec in all_records]},
+            use_cache=use_cache, nb_workers=nb_workers,
+        )
+
+
+    def load_batch(self, recs:Sequence[str], fs:Optional[Real]=None, units:str="mV", nb_workers:int=8) -> Tuple[np.ndarray, np.ndarray]:
+        """ finished, checked,
+
+        load the data of a batch of records (e.g. from `self.get_batches`) using a thread pool,
+        padded (with zeros at the end) to the same length
+
+        Parameters:
+        -----------
+        recs: sequence of str,
+            names of the records
+        fs: real number, optional,
+            if not None, the loaded data will be resampled to this frequency
+        units: str, default "mV",
+            units of the output signal, can also be "μV", with an alias of "uV"
+        nb_workers: int, default 8,
+            number of threads to load the data
+
+        Returns:
+        --------
+        data: ndarray,
+            the padded data, of shape (batch_size, nb_leads, max_length), in the "channel_first" format
+        lengths: ndarray,
+            lengths of the records (before padding)
+        """
+        return self._load_batch(recs, nb_workers=nb_workers, data_format="channel_first", units=units, fs=fs)
+
+
     def get_fs(self, rec:str) -> Real:
         """ finished, checked,
 
@@ -20,8 +20,7 @@ from ..utils.common import (
     DEFAULT_FIG_SIZE_PER_SEC,
     get_record_list_recursive,
 )
-from ..utils.utils_universal import generalized_intervals_intersection
-from ..base import PhysioNetDataBase
+from ..base import PhysioNetDataBase, RhythmIndex, IntervalArray, compute_windowed_hrv
 
 
 __all__ = [
@@ -91,6 +90,7 @@ class LTAFDB(PhysioNetDataBase):
         self.rhythm_class_map = ED({
             k.replace("(", ""): idx for idx, k in enumerate(self.all_rhythms)
         })
+        self._rhythm_index = {}  # ref. `self.get_rhythm_index`
         self.palette = kwargs.get("palette", None)
         if self.palette is None:
             n_colors = len([k for k in self.rhythm_class_map.keys() if k not in ["N", "NOISE"]])
@@ -179,7 +179,7 @@ class LTAFDB(PhysioNetDataBase):
         return data
 
 
-    def load_ann(self, rec:str, sampfrom:Optional[int]=None, sampto:Optional[int]=None, fmt:str="interval", keep_original:bool=False) -> Union[Dict[str, list], np.ndarray]:
+    def load_ann(self, rec:str, sampfrom:Optional[int]=None, sampto:Optional[int]=None, fmt:str="interval", keep_original:bool=False, mask_fs:Optional[Real]=None) -> Union[Dict[str, list], np.ndarray]:
         """  finished, checked,
 
         load rhythm annotations,
@@ -195,10 +195,13 @@ class LTAFDB(PhysioNetDataBase):
         sampto: int, optional,
             end index of the annotations to be loaded
         fmt: str, default "interval", case insensitive,
-            format of returned annotation, can also be "mask"
+            format of returned annotation, can also be "mask" (of dtype uint8, covering only [sampfrom, sampto))
         keep_original: bool, default False,
             if True, indices will keep the same with the annotation file
             otherwise subtract `sampfrom` if specified
+        mask_fs: real number, optional,
+            used only when `fmt` is "mask",
+            if set, the mask will be downsampled to this label rate (e.g. 1, one label per second)
         
         Returns:
         --------
@@ -207,21 +210,54 @@ class LTAFDB(PhysioNetDataBase):
 
         NOTE that at head and tail of the record, segments named "NOISE" are added
         """
-        fp = os.path.join(self.db_dir, rec)
-        header = wfdb.rdheader(fp)
-        sig_len = header.sig_len
+        sig_len = self.get_siglen(rec)
         sf = sampfrom or 0
         st = sampto or sig_len
         assert st > sf, "`sampto` should be greater than `sampfrom`!"
 
+        rhythm_index = self.get_rhythm_index(rec)
+        if fmt.lower() == "mask":
+            ann = rhythm_index.to_mask(
+                sf, st,
+                class_values=[self.rhythm_class_map[k] for k in rhythm_index.classes],
+                fill_value=self.rhythm_class_map.N,
+                step=self.fs/mask_fs if mask_fs is not None else None,
+            )
+        else:
+            ann = ED(rhythm_index.to_intervals(sf, st, keep_original=keep_original))
+        
+        return ann
+
+
+    def get_rhythm_index(self, rec:str) -> RhythmIndex:
+        """ finished, checked,
+
+        the (cached) sorted-array index of the rhythm episodes of `rec`,
+        built from the simplified annotation file (json) if exists, otherwise from the annotation file
+
+        Parameters:
+        -----------
+        rec: str,
+            name of the record
+
+        Returns:
+        --------
+        rhythm_index: RhythmIndex,
+            with classes the keys of `self.rhythm_class_map`
+        """
+        if rec in self._rhythm_index:
+            return self._rhythm_index[rec]
+        fp = os.path.join(self.db_dir, rec)
+        sig_len = self.get_siglen(rec)
+
         simplified_fp = os.path.join(self.db_dir, f"{rec}_ann.json")
         if os.path.isfile(simplified_fp):
             with open(simplified_fp, "r") as f:
-                ann = ED(json.load(f))
+                ann = json.load(f)
         else:
             wfdb_ann = wfdb.rdann(fp, extension=self.manual_ann_ext)
 
-            ann = ED({k: [] for k in self.rhythm_class_map.keys()})
+            ann = {k: [] for k in self.rhythm_class_map.keys()}
             critical_points = wfdb_ann.sample.tolist()
             aux_note = wfdb_ann.aux_note
             start = 0
@@ -239,22 +275,36 @@ class LTAFDB(PhysioNetDataBase):
 
             with open(simplified_fp, "w") as f:
                 json.dump(ann, f, ensure_ascii=False)
-        
-        ann = ED({
-            k: generalized_intervals_intersection(l_itv, [[sf,st]]) \
-                for k, l_itv in ann.items()
-        })
-        if fmt.lower() == "mask":
-            tmp = deepcopy(ann)
-            ann = np.full(shape=(st-sf,), fill_value=self.rhythm_class_map.N, dtype=int)
-            for rhythm, l_itv in tmp.items():
-                for itv in l_itv:
-                    ann[itv[0]-sf: itv[1]-sf] = self.rhythm_class_map[rhythm]
-        elif not keep_original:
-            for k, l_itv in ann.items():
-                ann[k] = [[itv[0]-sf, itv[1]-sf] for itv in l_itv]
-        
-        return ann
+
+        self._rhythm_index[rec] = RhythmIndex.from_intervals(ann, classes=list(self.rhythm_class_map.keys()))
+        return self._rhythm_index[rec]
+
+
+    def get_rhythm_fraction(self, rec:str, sampfrom:Optional[int]=None, sampto:Optional[int]=None, rhythm:str="AFIB") -> float:
+        """ finished, checked,
+
+        fraction of the window [sampfrom, sampto) of `rec` covered by episodes of `rhythm`,
+        computed via binary search on the rhythm index (ref. `self.get_rhythm_index`)
+
+        Parameters:
+        -----------
+        rec: str,
+            name of the record
+        sampfrom: int, optional,
+            start index of the window
+        sampto: int, optional,
+            end index of the window
+        rhythm: str, default "AFIB",
+            name of the rhythm, one of the keys of `self.rhythm_class_map`
+
+        Returns:
+        --------
+        frac: float,
+        """
+        sf = sampfrom or 0
+        st = sampto or self.get_siglen(rec)
+        assert st > sf, "`sampto` should be greater than `sampfrom`!"
+        return self.get_rhythm_index(rec).fraction(sf, st, rhythm)
 
 
     def load_rhythm_ann(self, rec:str, sampfrom:Optional[int]=None, sampto:Optional[int]=None, fmt:str="interval", keep_original:bool=False) -> Union[Dict[str, list], np.ndarray]:
@@ -287,28 +337,18 @@ class LTAFDB(PhysioNetDataBase):
         ann, dict,
             locations (indices) of the all the beat types ("A", "N", "Q", "V",)
         """
-        fp = os.path.join(self.db_dir, rec)
-        header = wfdb.rdheader(fp)
-        sig_len = header.sig_len
+        sig_len = self.get_siglen(rec)
         sf = sampfrom or 0
         st = sampto or sig_len
         assert st > sf, "`sampto` should be greater than `sampfrom`!"
 
-        wfdb_ann = wfdb.rdann(
-            fp,
-            extension=self.manual_ann_ext,
-            sampfrom=sampfrom or 0,
-            sampto=sampto,
-        )
-        ann = ED({k: [] for k in self.all_beat_types})
-        for idx, bt in zip(wfdb_ann.sample, wfdb_ann.symbol):
-            if bt not in self.all_beat_types:
-                continue
-            ann[bt].append(idx)
+        samples, codes, symbols = self.get_beat_ann_table(rec, self.manual_ann_ext, sampfrom, sampto)
         if not keep_original and sampfrom is not None:
-            ann = ED({k: np.array(v, dtype=int) - sampfrom for k, v in ann.items()})
-        else:
-            ann = ED({k: np.array(v, dtype=int) for k, v in ann.items()})
+            samples = samples - sampfrom
+        ann = ED({
+            bt: samples[codes == code] for bt, code in \
+                zip(self.all_beat_types, self.get_beat_ann_symbol_codes(symbols, self.all_beat_types))
+        })
         return ann
 
 
@@ -339,23 +379,55 @@ class LTAFDB(PhysioNetDataBase):
         ann, ndarray,
             locations (indices) of the all the rpeaks (qrs complexes)
         """
-        fp = os.path.join(self.db_dir, rec)
         if use_manual:
             ext = self.manual_ann_ext
         else:
             ext = self.auto_ann_ext
-        wfdb_ann = wfdb.rdann(
-            fp,
-            extension=ext,
-            sampfrom=sampfrom or 0,
-            sampto=sampto,
-        )
-        rpeak_inds = wfdb_ann.sample[np.isin(wfdb_ann.symbol, self.all_beat_types)]
+        samples, codes, symbols = self.get_beat_ann_table(rec, ext, sampfrom, sampto)
+        rpeak_inds = samples[np.isin(codes, self.get_beat_ann_symbol_codes(symbols, self.all_beat_types))]
         if not keep_original and sampfrom is not None:
             rpeak_inds = rpeak_inds - sampfrom
         return rpeak_inds
 
 
+    def compute_hrv_features(self, rec:str, window:Real=300, stride:Real=30, sampfrom:Optional[int]=None, sampto:Optional[int]=None, freq_domain:bool=True) -> pd.DataFrame:
+        """ finished, checked,
+
+        RR-interval and HRV features of `rec` over sliding windows,
+        computed from the (cached) manual beat annotations,
+        with RR intervals adjacent to non-normal beats ("A", "Q", "V") excluded
+
+        Parameters:
+        -----------
+        rec: str,
+            name of the record
+        window: real number, default 300,
+            length of the windows, with units in seconds
+        stride: real number, default 30,
+            stride of the windows, with units in seconds
+        sampfrom: int, optional,
+            start index of the first window
+        sampto: int, optional,
+            end index of the windows
+        freq_domain: bool, default True,
+            whether or not to compute the frequency-domain features (VLF, LF, HF powers and LF/HF)
+
+        Returns:
+        --------
+        df_hrv: DataFrame,
+            one row for each window, ref. `compute_windowed_hrv`
+        """
+        samples, codes, symbols = self.get_beat_ann_table(rec, self.manual_ann_ext)
+        is_beat = np.isin(codes, self.get_beat_ann_symbol_codes(symbols, self.all_beat_types))
+        normal = (codes == self.get_beat_ann_symbol_codes(symbols, ["N"])[0])
+        df_hrv = compute_windowed_hrv(
+            samples[is_beat], self.fs, valid=normal[is_beat],
+            window=window, stride=stride, sampfrom=sampfrom, sampto=sampto or self.get_siglen(rec),
+            freq_domain=freq_domain,
+        )
+        return df_hrv
+
+
     def plot(self, rec:str, data:Optional[np.ndarray]=None, ann:Optional[Dict[str, np.ndarray]]=None, beat_ann:Optional[Dict[str, np.ndarray]]=None, rpeak_inds:Optional[Union[Sequence[int],np.ndarray]]=None, ticks_granularity:int=0, leads:Optional[Union[int, List[int]]]=None, sampfrom:Optional[int]=None, sampto:Optional[int]=None, same_range:bool=False, **kwargs) -> NoReturn:
         """ finished, checked,
 
@@ -398,6 +470,11 @@ class LTAFDB(PhysioNetDataBase):
         same_range: bool, default False,
             if True, forces all leads to have the same y range
         kwargs: dict,
+            - overview_threshold: real number, default 600,
+              ranges longer than this (in seconds) are plotted in one figure of min/max decimated signals,
+              read lazily for the visible range when zooming and panning, ref. `self._plot_rhythm_overview`
+            - nb_bins: int, default 2000,
+              number of bins (about the number of pixels) of the overview
         """
         if "plt" not in dir():
             import matplotlib.pyplot as plt
@@ -411,6 +488,13 @@ class LTAFDB(PhysioNetDataBase):
         assert all([l in self.all_leads for l in _leads])
 
         lead_indices = [self.all_leads.index(l) for l in _leads]
+        sf = sampfrom or 0
+        st = (sampto or self.get_siglen(rec)) if data is None else sf + data.shape[-1]
+        if st - sf > kwargs.get("overview_threshold", 600) * self.fs:
+            return self._plot_rhythm_overview(
+                rec, data, ann, _leads if data is None else list(range(data.shape[0])), sf, st,
+                class_map=self.rhythm_class_map, excluded_classes=["N", "NOISE"], nb_bins=kwargs.get("nb_bins", 2000),
+            )
         if data is None:
             _data = self.load_data(
                 rec,
@@ -440,7 +524,7 @@ class LTAFDB(PhysioNetDataBase):
             _ann = ann or ED({k: [] for k in self.rhythm_class_map.keys()})
         # indices to time
         _ann = {
-            k: [[itv[0]/self.fs, itv[1]/self.fs] for itv in l_itv] \
+            k: IntervalArray.from_list(np.array(l_itv).reshape(-1, 2) / self.fs) \
                 for k, l_itv in _ann.items()
         }
         if rpeak_inds is None and data is None:
@@ -480,8 +564,8 @@ class LTAFDB(PhysioNetDataBase):
             seg_data = _data[..., seg_idx*line_len: (seg_idx+1)*line_len]
             secs = (np.arange(seg_data.shape[1]) + seg_idx*line_len) / self.fs
             seg_ann = {
-                k: generalized_intervals_intersection(l_itv, [[secs[0], secs[-1]]]) \
-                    for k, l_itv in _ann.items()
+                k: itv_arr.clip(secs[0], secs[-1]).to_list() \
+                    for k, itv_arr in _ann.items()
             }
             seg_rpeaks = _rpeak[np.where((_rpeak>=secs[0]) & (_rpeak<secs[-1]))[0]]
             seg_beat_ann = {
@@ -22,6 +22,7 @@ from ..base import PhysioNetDataBase, ECGWaveForm
 
 __all__ = [
     "LUDB",
+    "compute_delineation_metrics",
 ]
 
 
@@ -184,6 +185,16 @@ class LUDB(PhysioNetDataBase):
         """
         self._symbol_to_wavename = ED(N="qrs", p="pwave", t="twave")
         self._wavename_to_symbol = ED({v:k for k,v in self._symbol_to_wavename.items()})
+        self.wave_table_dtype = np.dtype([
+            ("lead", "U3"), ("wave", "U5"), ("onset", int), ("peak", int), ("offset", int),
+        ])
+        # wave tables decoded from (batched) masks, ref. `self.from_masks_batch`
+        self.mask_wave_table_dtype = np.dtype([
+            ("record", int), ("lead", "U8"), ("wave", "U5"), ("onset", int), ("offset", int), ("duration", float),
+        ])
+        # sorted symbols of the waves, for looking up wave names via `np.searchsorted`
+        self._wave_symbols = np.array(sorted(self._symbol_to_wavename.keys()))
+        self._wave_names = np.array([self._symbol_to_wavename[k] for k in self._wave_symbols])
         self.class_map = ED(
             p=1, N=2, t=3, i=0  # an extra isoelectric
         )
@@ -259,7 +270,7 @@ class LUDB(PhysioNetDataBase):
         return data
 
 
-    def load_ann(self, rec:str, leads:Optional[Sequence[str]]=None, metadata:bool=False) -> dict:
+    def load_ann(self, rec:str, leads:Optional[Sequence[str]]=None, metadata:bool=False, fmt:str="waveform") -> dict:
         """ finished, checked,
 
         load the wave delineation, along with metadata if specified
@@ -272,6 +283,12 @@ class LUDB(PhysioNetDataBase):
             the leads to load
         metadata: bool, default False,
             if True, load metadata from corresponding head file
+        fmt: str, default "waveform", case insensitive,
+            format of the wave delineation ("waves" of the returned dict), can be one of
+            - "waveform": dict of list of `ECGWaveForm`, keyed by the leads
+            - "array": structured ndarray (ref. `self.wave_table_dtype`),
+            with fields "lead", "wave", "onset", "peak", "offset", ordered by leads then by peaks,
+            no `ECGWaveForm` object is created in this format
 
         Returns:
         --------
@@ -283,57 +300,33 @@ class LUDB(PhysioNetDataBase):
         # wave delineation annotations
         _leads = self._normalize_leads(leads, standard_ordering=True, lower_cases=False)
         _ann_ext = [f"atr_{l.lower()}" for l in _leads]
-        ann_dict["waves"] = ED({l:[] for l in _leads})
+        tables = []
         for l, e in zip(_leads, _ann_ext):
             ann = wfdb.rdann(rec_fp, extension=e)
-            df_lead_ann = pd.DataFrame()
             symbols = np.array(ann.symbol)
+            samples = np.asarray(ann.sample)
             peak_inds = np.where(np.isin(symbols, ["p", "N", "t"]))[0]
-            df_lead_ann["peak"] = ann.sample[peak_inds]
-            df_lead_ann["onset"] = np.nan
-            df_lead_ann["offset"] = np.nan
-            for i, row in df_lead_ann.iterrows():
-                peak_idx = peak_inds[i]
-                if peak_idx == 0:
-                    df_lead_ann.loc[i, "onset"] = row["peak"]
-                    if symbols[peak_idx+1] == ")":
-                        df_lead_ann.loc[i, "offset"] = ann.sample[peak_idx+1]
-                    else:
-                        df_lead_ann.loc[i, "offset"] = row["peak"]
-                elif peak_idx == len(symbols) - 1:
-                    df_lead_ann.loc[i, "offset"] = row["peak"]
-                    if symbols[peak_idx-1] == "(":
-                        df_lead_ann.loc[i, "onset"] = ann.sample[peak_idx-1]
-                    else:
-                        df_lead_ann.loc[i, "onset"] = row["peak"]
-                else:
-                    if symbols[peak_idx-1] == "(":
-                        df_lead_ann.loc[i, "onset"] = ann.sample[peak_idx-1]
-                    else:
-                        df_lead_ann.loc[i, "onset"] = row["peak"]
-                    if symbols[peak_idx+1] == ")":
-                        df_lead_ann.loc[i, "offset"] = ann.sample[peak_idx+1]
-                    else:
-                        df_lead_ann.loc[i, "offset"] = row["peak"]
-            # df_lead_ann["onset"] = ann.sample[np.where(symbols=="(")[0]]
-            # df_lead_ann["offset"] = ann.sample[np.where(symbols==")")[0]]
-
-            df_lead_ann["duration"] = (df_lead_ann["offset"] - df_lead_ann["onset"]) * self.spacing
-            
-            df_lead_ann.index = symbols[peak_inds]
-
-            for c in ["peak", "onset", "offset"]:
-                df_lead_ann[c] = df_lead_ann[c].values.astype(int)
-            
-            for _, row in df_lead_ann.iterrows():
-                w = ECGWaveForm(
-                    name=self._symbol_to_wavename[row.name],
-                    onset=int(row.onset),
-                    offset=int(row.offset),
-                    peak=int(row.peak),
-                    duration=row.duration,
-                )
-                ann_dict["waves"][l].append(w)
+            # onset (offset) is the previous (next) annotation if it is "(" (")"),
+            # otherwise the peak itself
+            prev_inds = np.maximum(peak_inds - 1, 0)
+            next_inds = np.minimum(peak_inds + 1, len(symbols) - 1)
+            has_onset = (peak_inds > 0) & (symbols[prev_inds] == "(")
+            has_offset = (peak_inds < len(symbols) - 1) & (symbols[next_inds] == ")")
+            table = np.empty(len(peak_inds), dtype=self.wave_table_dtype)
+            table["lead"] = l
+            table["wave"] = self._wave_names[np.searchsorted(self._wave_symbols, symbols[peak_inds])]
+            table["peak"] = samples[peak_inds]
+            table["onset"] = np.where(has_onset, samples[prev_inds], samples[peak_inds])
+            table["offset"] = np.where(has_offset, samples[next_inds], samples[peak_inds])
+            tables.append(table)
+        wave_table = np.concatenate(tables) if len(tables) > 0 else np.empty(0, dtype=self.wave_table_dtype)
+
+        if fmt.lower() == "array":
+            ann_dict["waves"] = wave_table
+        elif fmt.lower() == "waveform":
+            ann_dict["waves"] = self._wave_table_to_waveforms(wave_table, _leads)
+        else:
+            raise ValueError(f"`fmt` should be one of `waveform`, `array`, but got `{fmt}`")
 
         if metadata:
             header_dict = self._load_header(rec)
@@ -342,6 +335,32 @@ class LUDB(PhysioNetDataBase):
         return ann_dict
 
 
+    def _wave_table_to_waveforms(self, wave_table:np.ndarray, leads:Sequence[str]) -> Dict[str, List[ECGWaveForm]]:
+        """ finished, checked,
+
+        convert the wave delineation from the "array" format into the "waveform" format
+
+        Parameters:
+        -----------
+        wave_table: ndarray,
+            the wave delineation in the "array" format (ref. `self.load_ann`)
+        leads: sequence of str,
+            the leads, keys of the returned dict
+
+        Returns:
+        --------
+        waves: dict,
+            each item value is a list containing the `ECGWaveForm`s corr. to the lead (item key)
+        """
+        waves = ED({l:[] for l in leads})
+        durations = (wave_table["offset"] - wave_table["onset"]) * self.spacing
+        for row, duration in zip(wave_table.tolist(), durations.tolist()):
+            waves[row[0]].append(ECGWaveForm(
+                name=row[1], onset=row[2], offset=row[4], peak=row[3], duration=duration,
+            ))
+        return waves
+
+
     def load_diagnoses(self, rec:str) -> List[str]:
         """ finished, checked,
 
@@ -386,12 +405,12 @@ class LUDB(PhysioNetDataBase):
         """
         _class_map = ED(class_map) if class_map is not None else self.class_map
         _leads = self._normalize_leads(leads, standard_ordering=True, lower_cases=True)
-        data = self.load_data(rec, leads=_leads, data_format="channel_first")
-        masks = np.full_like(data, fill_value=_class_map.i, dtype=int)
-        waves = self.load_ann(rec, leads=_leads, metadata=False)["waves"]
-        for idx, (l, l_w) in enumerate(waves.items()):
-            for w in l_w:
-                masks[idx, w.onset: w.offset] = _class_map[self._wavename_to_symbol[w.name]]
+        # only the shape of the signal is needed, which is read from the header
+        masks = np.full((len(_leads), self.get_siglen(rec)), fill_value=_class_map.i, dtype=int)
+        wave_table = self.load_ann(rec, leads=_leads, metadata=False, fmt="array")["waves"]
+        lead_inds = {l: idx for idx, l in enumerate(self._normalize_leads(_leads, standard_ordering=True, lower_cases=False))}
+        for l, w, onset, offset in zip(wave_table["lead"].tolist(), wave_table["wave"].tolist(), wave_table["onset"].tolist(), wave_table["offset"].tolist()):
+            masks[lead_inds[l], onset: offset] = _class_map[self._wavename_to_symbol[w]]
         if mask_format.lower() not in ["channel_first", "lead_first",]:
             masks = masks.T
         return masks
@@ -431,7 +450,7 @@ class LUDB(PhysioNetDataBase):
             if mask_format.lower() not in ["channel_first", "lead_first",]:
                 _masks = masks.T
             else:
-                _masks = masks.copy()
+                _masks = masks
         else:
             raise ValueError(f"masks should be of dim 1 or 2, but got a {masks.ndim}d array")
 
@@ -441,36 +460,136 @@ class LUDB(PhysioNetDataBase):
             _leads = [f"lead_{idx+1}" for idx in range(_masks.shape[0])]
         assert len(_leads) == _masks.shape[0]
 
-        _class_map = ED(class_map) if class_map is not None else self.class_map
+        wave_table = self.from_masks_batch(
+            _masks[np.newaxis,...], mask_format="channel_first", leads=leads, class_map=class_map, fs=fs,
+        )
+        waves = self.mask_wave_table_to_waveforms(wave_table, record=0, leads=_leads)
+        return waves
+
+
+    def from_masks_batch(self, masks:np.ndarray, mask_format:str="channel_first", leads:Optional[Sequence[str]]=None, class_map:Optional[Dict[str, int]]=None, fs:Optional[Real]=None, lengths:Optional[Sequence[int]]=None) -> np.ndarray:
+        """ finished, checked,
+
+        convert a batch of masks (e.g. model outputs) into one columnar wave table,
+        via run-length encoding of the whole batch in one vectorized pass
+
+        Parameters:
+        -----------
+        masks: ndarray,
+            wave delineation in the form of masks,
+            of shape (batch_size, n_leads, seq_len) or (batch_size, seq_len, n_leads), or (batch_size, seq_len)
+        mask_format: str, default "channel_first",
+            format of the mask, used only when `masks.ndim = 3`
+            "channel_last" (alias "lead_last"), or
+            "channel_first" (alias "lead_first")
+        leads: str or list of str, optional,
+            names of the leads (channels) of the masks,
+            if not set, "lead_1", "lead_2", ... will be used
+        class_map: dict, optional,
+            custom class map,
+            if not set, `self.class_map` will be used
+        fs: real number, optional,
+            sampling frequency of the signal corresponding to the `masks`,
+            if is None, `self.fs` will be used, to compute `duration` of the ecg waveforms
+        lengths: sequence of int, optional,
+            valid lengths of the records in the batch (for zero-padded batches),
+            waves starting beyond the valid length are dropped, and those crossing it are truncated
+
+        Returns:
+        --------
+        wave_table: ndarray,
+            structured array of dtype `self.mask_wave_table_dtype`,
+            with fields "record" (index in the batch), "lead", "wave", "onset", "offset" and "duration" (ms),
+            sorted by record, lead (in the order of the channels), and onset
+        """
+        if masks.ndim == 2:
+            _masks = masks[:, np.newaxis, :]
+        elif masks.ndim == 3:
+            if mask_format.lower() not in ["channel_first", "lead_first",]:
+                _masks = masks.transpose(0, 2, 1)
+            else:
+                _masks = masks
+        else:
+            raise ValueError(f"masks should be of dim 2 or 3, but got a {masks.ndim}d array")
+        batch_size, nb_leads, seq_len = _masks.shape
 
+        if leads is not None:
+            _leads = self._normalize_leads(leads, standard_ordering=False, lower_cases=False)
+        else:
+            _leads = [f"lead_{idx+1}" for idx in range(nb_leads)]
+        assert len(_leads) == nb_leads
+
+        _class_map = ED(class_map) if class_map is not None else self.class_map
         _fs = fs if fs is not None else self.fs
 
-        waves = ED({lead_name:[] for lead_name in _leads})
-        for channel_idx, lead_name in enumerate(_leads):
-            current_mask = _masks[channel_idx,...]
-            for wave_symbol, wave_number in _class_map.items():
-                if wave_symbol not in ["p", "N", "t",]:
-                    continue
-                wave_name = self._symbol_to_wavename[wave_symbol]
-                current_wave_inds = np.where(current_mask==wave_number)[0]
-                if len(current_wave_inds) == 0:
-                    continue
-                np.where(np.diff(current_wave_inds)>1)
-                split_inds = np.where(np.diff(current_wave_inds)>1)[0].tolist()
-                split_inds = sorted(split_inds+[i+1 for i in split_inds])
-                split_inds = [0] + split_inds + [len(current_wave_inds)-1]
-                for i in range(len(split_inds)//2):
-                    itv_start = current_wave_inds[split_inds[2*i]]
-                    itv_end = current_wave_inds[split_inds[2*i+1]]+1
-                    w = ECGWaveForm(
-                        name=wave_name,
-                        onset=itv_start,
-                        offset=itv_end,
-                        peak=np.nan,
-                        duration=1000*(itv_end-itv_start)/_fs,  # ms
-                    )
-                    waves[lead_name].append(w)
-            waves[lead_name].sort(key=lambda w: w.onset)
+        if batch_size * nb_leads * seq_len == 0:
+            return np.empty(0, dtype=self.mask_wave_table_dtype)
+
+        # run-length encoding of all the rows (record, lead) at once,
+        # a run starts at the first sample of a row or where the class changes
+        rows = _masks.reshape(batch_size * nb_leads, seq_len)
+        changes = rows[:, 1:] != rows[:, :-1]
+        is_start = np.concatenate([np.ones((rows.shape[0], 1), dtype=bool), changes], axis=1)
+        is_end = np.concatenate([changes, np.ones((rows.shape[0], 1), dtype=bool)], axis=1)
+        run_rows, onsets = np.nonzero(is_start)
+        offsets = np.nonzero(is_end)[1] + 1
+        values = rows[run_rows, onsets]
+
+        # keep only the runs of the waves ("p", "N", "t"), dropping the isoelectric and other classes
+        wave_symbols = [k for k in _class_map.keys() if k in self._symbol_to_wavename]
+        wave_numbers = np.array([_class_map[k] for k in wave_symbols])
+        wave_names = np.array([self._symbol_to_wavename[k] for k in wave_symbols])
+        keep = np.isin(values, wave_numbers)
+        run_rows, onsets, offsets, values = run_rows[keep], onsets[keep], offsets[keep], values[keep]
+        records, lead_inds = np.divmod(run_rows, nb_leads)
+
+        if lengths is not None:
+            valid_lengths = np.asarray(lengths, dtype=int)[records]
+            keep = onsets < valid_lengths
+            records, lead_inds, onsets, offsets, values = \
+                records[keep], lead_inds[keep], onsets[keep], np.minimum(offsets, valid_lengths)[keep], values[keep]
+
+        order = np.argsort(wave_numbers, kind="stable")
+        wave_table = np.empty(len(onsets), dtype=self.mask_wave_table_dtype)
+        wave_table["record"] = records
+        wave_table["lead"] = np.array(_leads, dtype=self.mask_wave_table_dtype["lead"])[lead_inds]
+        wave_table["wave"] = wave_names[order][np.searchsorted(wave_numbers[order], values)]
+        wave_table["onset"] = onsets
+        wave_table["offset"] = offsets
+        wave_table["duration"] = 1000 * (offsets - onsets) / _fs  # ms
+        return wave_table
+
+
+    def mask_wave_table_to_waveforms(self, wave_table:np.ndarray, record:int=0, leads:Optional[Sequence[str]]=None) -> Dict[str, List[ECGWaveForm]]:
+        """ finished, checked,
+
+        view of one record of the wave table decoded from masks (ref. `self.from_masks_batch`),
+        in the form of lists of waveforms, as returned by `self.from_masks`
+
+        Parameters:
+        -----------
+        wave_table: ndarray,
+            the wave table returned by `self.from_masks_batch`
+        record: int, default 0,
+            index of the record in the batch
+        leads: sequence of str, optional,
+            the leads, keys of the returned dict,
+            if not set, the leads appearing in the records of `wave_table` will be used
+
+        Returns:
+        --------
+        waves: dict,
+            each item value is a list containing the `ECGWaveForm`s corr. to the lead (item key)
+        """
+        lo, hi = np.searchsorted(wave_table["record"], [record, record+1])
+        rec_table = wave_table[lo:hi]
+        if leads is None:
+            leads = list(dict.fromkeys(rec_table["lead"].tolist()))
+        waves = ED({l:[] for l in leads})
+        for l, w, onset, offset, duration in zip(rec_table["lead"].tolist(), rec_table["wave"].tolist(), rec_table["onset"].tolist(), rec_table["offset"].tolist(), rec_table["duration"].tolist()):
+            waves[l].append(ECGWaveForm(
+                name=w, onset=onset, offset=offset, peak=np.nan, duration=duration,
+            ))
         return waves
 
 
@@ -489,8 +608,7 @@ class LUDB(PhysioNetDataBase):
         header_dict: dict,
         """
         header_dict = ED({})
-        rec_fp = os.path.join(self.db_dir, rec)
-        header_reader = wfdb.rdheader(rec_fp)
+        header_reader = self.get_wfdb_header(rec)
         header_dict["units"] = header_reader.units
         header_dict["baseline"] = header_reader.baseline
         header_dict["adc_gain"] = header_reader.adc_gain
@@ -700,3 +818,243 @@ class LUDB(PhysioNetDataBase):
         """
         """
         print(self.__doc__)
+
+
+_DELINEATION_TABLE_DTYPE = np.dtype([
+    ("record", int), ("lead", "U8"), ("wave", "U5"), ("onset", float), ("peak", float), ("offset", float),
+])
+_DELINEATION_POINTS = ["onset", "peak", "offset",]
+
+
+def compute_delineation_metrics(truth_waves:Union[dict,np.ndarray,Sequence[Union[dict,np.ndarray]]], pred_waves:Union[dict,np.ndarray,Sequence[Union[dict,np.ndarray]]], fs:Real=500, tol:float=0.15, truth_batch_sizes:Optional[Sequence[int]]=None, pred_batch_sizes:Optional[Sequence[int]]=None, verbose:int=0) -> ED:
+    """ finished, checked,
+
+    metrics of wave delineation, computed per wave and lead, for the onsets, peaks and offsets,
+    vectorized over all records via `np.searchsorted`
+
+    reference points and predicted points of the same type (of the same wave, lead and record) are matched one-to-one within `tol`,
+    by repeatedly pairing mutually nearest points, so that one reference point can not absorb several predicted points;
+    a reference point is detected (true positive) and a predicted point is correct if they are matched,
+    errors (prediction - reference, in ms) are computed over the matched pairs
+
+    Parameters:
+    -----------
+    truth_waves: dict, or ndarray, or sequence of dict or ndarray,
+        the reference wave delineation, in one of the following forms:
+        - dict of lists of `ECGWaveForm`s, as returned by `LUDB.from_masks`, or the "waves" of `LUDB.load_ann`,
+        - structured array, as returned by `LUDB.from_masks_batch`, or the "waves" of `LUDB.load_ann` with `fmt="array"`,
+        - sequence of the above, one for each record (or each batch of records),
+          the record indices of each item being offset by the number of records in the preceding items,
+          ref. `truth_batch_sizes`
+    pred_waves: dict, or ndarray, or sequence of dict or ndarray,
+        the predicted wave delineation, of the same forms as `truth_waves`,
+        names of the leads should be consistent with `truth_waves`
+    fs: real number, default 500,
+        sampling frequency of the signals
+    tol: float, default 0.15,
+        tolerance for a predicted point to be matched to a reference point,
+        with units in seconds
+    truth_batch_sizes: sequence of int, optional,
+        numbers of records of the items of `truth_waves` when it is a sequence,
+        required if it contains batch tables (as returned by `LUDB.from_masks_batch`),
+        since records without any wave are absent in these tables,
+        defaults to one record for each of the other items
+    pred_batch_sizes: sequence of int, optional,
+        numbers of records of the items of `pred_waves` when it is a sequence, ref. `truth_batch_sizes`
+    verbose: int, default 0,
+        print verbosity
+
+    Returns:
+    --------
+    metrics: ED,
+        metrics[wave][lead][point] (point in "onset", "peak", "offset") is an ED with items
+        "sensitivity", "precision", "f1_score", "mean_error", "standard_deviation" (errors in ms),
+        and "nb_truths", "nb_preds", "nb_tp", "nb_correct_preds";
+        points absent in both `truth_waves` and `pred_waves` (e.g. peaks from masks) are omitted
+    """
+    truth = _to_delineation_table(truth_waves, batch_sizes=truth_batch_sizes)
+    pred = _to_delineation_table(pred_waves, batch_sizes=pred_batch_sizes)
+    tol_ = tol * fs
+
+    # groups of (lead, wave) pairs
+    groups, inv = np.unique(
+        np.concatenate([np.char.add(np.char.add(truth["wave"], "/"), truth["lead"]), np.char.add(np.char.add(pred["wave"], "/"), pred["lead"])]),
+        return_inverse=True,
+    )
+    inv = inv.ravel()
+    truth_group, pred_group = inv[:len(truth)], inv[len(truth):]
+    nb_groups = len(groups)
+    truth_record, pred_record = truth["record"], pred["record"]
+    nb_records = int(max(truth_record.max(initial=-1), pred_record.max(initial=-1))) + 1
+    if verbose >= 1:
+        print(f"number of records = {nb_records}, number of (wave, lead) groups = {nb_groups}")
+        print(f"tolerance in number of sample points = {tol_}")
+
+    # put all the (group, record) pairs onto one global axis, far enough from each other
+    max_pos = np.nanmax(np.concatenate([
+        truth[k] for k in _DELINEATION_POINTS] + [pred[k] for k in _DELINEATION_POINTS] + [[0]]
+    ))
+    span = max_pos + 2 * tol_ + 1
+
+    metrics = ED()
+    for g in groups.tolist():
+        wave, lead = g.split("/", 1)
+        if wave not in metrics:
+            metrics[wave] = ED()
+        metrics[wave][lead] = ED()
+    for point in _DELINEATION_POINTS:
+        t_valid, p_valid = ~np.isnan(truth[point]), ~np.isnan(pred[point])
+        if not (t_valid.any() or p_valid.any()):
+            continue
+        t_group, p_group = truth_group[t_valid], pred_group[p_valid]
+        t_pos = (t_group * nb_records + truth_record[t_valid]) * span + truth[point][t_valid]
+        p_pos = (p_group * nb_records + pred_record[p_valid]) * span + pred[point][p_valid]
+        t_matched, p_matched = _match_one_to_one(t_pos, p_pos, tol_)
+
+        nb_truths = np.bincount(t_group, minlength=nb_groups)
+        nb_preds = np.bincount(p_group, minlength=nb_groups)
+        nb_tp = np.bincount(t_group[t_matched], minlength=nb_groups)
+        nb_correct = np.bincount(p_group[p_matched], minlength=nb_groups)
+        err_ms = (p_pos[p_matched] - t_pos[t_matched]) * 1000 / fs
+        err_sum = np.bincount(t_group[t_matched], weights=err_ms, minlength=nb_groups)
+        err_sq_sum = np.bincount(t_group[t_matched], weights=err_ms**2, minlength=nb_groups)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sensitivity = nb_tp / nb_truths
+            precision = nb_correct / nb_preds
+            f1_score = 2 * sensitivity * precision / (sensitivity + precision)
+            mean_error = err_sum / nb_tp
+            standard_deviation = np.sqrt(np.maximum(err_sq_sum / nb_tp - mean_error**2, 0))
+
+        for idx, g in enumerate(groups.tolist()):
+            wave, lead = g.split("/", 1)
+            metrics[wave][lead][point] = ED(
+                sensitivity=sensitivity[idx],
+                precision=precision[idx],
+                f1_score=f1_score[idx],
+                mean_error=mean_error[idx],
+                standard_deviation=standard_deviation[idx],
+                nb_truths=int(nb_truths[idx]),
+                nb_preds=int(nb_preds[idx]),
+                nb_tp=int(nb_tp[idx]),
+                nb_correct_preds=int(nb_correct[idx]),
+            )
+            if verbose >= 2:
+                print(f"{wave:<6}{lead:<9}{point:<7}Se = {sensitivity[idx]:.4f}, PPV = {precision[idx]:.4f}, error = {mean_error[idx]:.2f} ± {standard_deviation[idx]:.2f} ms")
+
+    return metrics
+
+
+def _to_delineation_table(waves:Union[dict,np.ndarray,Sequence[Union[dict,np.ndarray]]], record_offset:int=0, batch_sizes:Optional[Sequence[int]]=None) -> np.ndarray:
+    """ finished, checked,
+
+    convert wave delineation of various forms (ref. `compute_delineation_metrics`)
+    into a structured array of dtype `_DELINEATION_TABLE_DTYPE`
+
+    Parameters:
+    -----------
+    waves: dict, or ndarray, or sequence of dict or ndarray,
+        the wave delineation
+    record_offset: int, default 0,
+        offset added to the record indices, the index of the record being 0 when `waves` has no "record" field
+    batch_sizes: sequence of int, optional,
+        numbers of records of the items of `waves` when it is a sequence,
+        required for the items with a "record" field, defaults to 1 for the other items
+
+    Returns:
+    --------
+    table: ndarray,
+        the wave delineation as a structured array, with NaN for the missing points (e.g. peaks)
+    """
+    if isinstance(waves, np.ndarray):
+        table = np.empty(len(waves), dtype=_DELINEATION_TABLE_DTYPE)
+        table["record"] = record_offset + (waves["record"] if "record" in waves.dtype.names else 0)
+        table["lead"] = waves["lead"]
+        table["wave"] = waves["wave"]
+        for k in _DELINEATION_POINTS:
+            table[k] = waves[k] if k in waves.dtype.names else np.nan
+        return table
+    if isinstance(waves, dict):
+        rows = [
+            (record_offset, lead, w.name, w.onset, w.peak, w.offset) \
+                for lead, lead_waves in waves.items() for w in lead_waves
+        ]
+        return np.array(rows, dtype=_DELINEATION_TABLE_DTYPE)
+    if batch_sizes is not None and len(batch_sizes) != len(waves):
+        raise ValueError(f"`batch_sizes` should have one number for each of the {len(waves)} items, but got {len(batch_sizes)}")
+    tables, record_offset = [], 0
+    for idx, w in enumerate(waves):
+        is_batch = isinstance(w, np.ndarray) and "record" in w.dtype.names
+        if is_batch and batch_sizes is None:
+            raise ValueError("the number of records of each batch table should be given via the batch sizes")
+        nb_records = int(batch_sizes[idx]) if batch_sizes is not None else 1
+        if is_batch and w["record"].max(initial=-1) >= nb_records:
+            raise ValueError(f"item {idx} has records beyond its batch size {nb_records}")
+        tables.append(_to_delineation_table(w, record_offset=record_offset))
+        record_offset += nb_records
+    if len(tables) == 0:
+        return np.empty(0, dtype=_DELINEATION_TABLE_DTYPE)
+    return np.concatenate(tables)
+
+
+def _nearest_index(x:np.ndarray, refs:np.ndarray) -> np.ndarray:
+    """ finished, checked,
+
+    index of the nearest element in `refs` of each element of `x`, the left one in case of ties
+
+    Parameters:
+    -----------
+    x: ndarray,
+        the query points
+    refs: ndarray,
+        the reference points, sorted in ascending order, non-empty
+
+    Returns:
+    --------
+    idx: ndarray,
+        indices into `refs`
+    """
+    idx = np.searchsorted(refs, x)
+    right = np.minimum(idx, len(refs)-1)
+    left = np.maximum(idx-1, 0)
+    use_left = (idx == len(refs)) | ((idx > 0) & (x - refs[left] <= refs[right] - x))
+    return np.where(use_left, left, right)
+
+
+def _match_one_to_one(truth_pos:np.ndarray, pred_pos:np.ndarray, tol:Real) -> Tuple[np.ndarray, np.ndarray]:
+    """ finished, checked,
+
+    one-to-one matching of the reference points and the predicted points within `tol`,
+    by repeatedly pairing the (unmatched) points that are the nearest to each other,
+    each round being vectorized via `np.searchsorted`
+
+    Parameters:
+    -----------
+    truth_pos: ndarray,
+        positions of the reference points
+    pred_pos: ndarray,
+        positions of the predicted points
+    tol: real number,
+        maximum distance of the matched points
+
+    Returns:
+    --------
+    truth_matched, pred_matched: ndarray,
+        indices into `truth_pos` and into `pred_pos` of the matched pairs
+    """
+    t_left, p_left = np.arange(len(truth_pos)), np.arange(len(pred_pos))
+    l_t_matched, l_p_matched = [np.array([], dtype=int)], [np.array([], dtype=int)]
+    while len(t_left) > 0 and len(p_left) > 0:
+        t, p = truth_pos[t_left], pred_pos[p_left]
+        t_order, p_order = np.argsort(t, kind="stable"), np.argsort(p, kind="stable")
+        t_nearest = p_order[_nearest_index(t, p[p_order])]  # indices into `p`
+        p_nearest = t_order[_nearest_index(p, t[t_order])]  # indices into `t`
+        # the closest pair among the unmatched points is always mutually nearest, hence the loop terminates
+        mutual = np.flatnonzero((p_nearest[t_nearest] == np.arange(len(t))) & (np.abs(p[t_nearest] - t) <= tol))
+        if len(mutual) == 0:
+            break
+        l_t_matched.append(t_left[mutual])
+        l_p_matched.append(p_left[t_nearest[mutual]])
+        t_left = np.delete(t_left, mutual)
+        p_left = np.delete(p_left, t_nearest[mutual])
+    return np.concatenate(l_t_matched), np.concatenate(l_p_matched)